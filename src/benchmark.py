@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Jun 20 15:47:31 2021
+
+Benchmark of the backtesting engine on a synthetic market of configurable size.
+Every run is appended to a history file (one JSON record per line) and compared
+with the previous run made with the same parameters, to detect regressions.
+The cold start (import of the engine in a fresh interpreter) is also timed and
+checked against a budget.
+
+Usage (from the src folder):
+    python benchmark.py --symbols 100 --bars 1000 --frequency 1D
+    python benchmark.py --imports-only --import-budget 1.0 --fail-on-regression
+
+@author: Antho
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from btengine.backtestengine import BacktestEngine
+from btengine.datamanager import DataManager
+from btengine.profiler import Profiler
+from btengine.synthetic import generateMarket
+from strategy_example import Momentum
+from market_benchmark import MarketBenchmark
+from most_traded_benchmark import MostTraded
+
+# Dependencies which are slow to import, and must only be imported when used
+HEAVY_MODULES = ("scipy", "numba", "matplotlib", "yfinance", "pandas_datareader", "statsmodels")
+
+
+def gitCommit():
+    """Short hash of the current commit ("unknown" outside of a git repository)."""
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"],
+                                       stderr = subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return "unknown"
+
+
+def importTime(statement = "from btengine.backtestengine import BacktestEngine", repeat = 5):
+    """
+    Times a statement in fresh interpreters (cold start).
+
+    Returns
+    -------
+    wall : float
+        Median wall time (seconds) of the statement.
+    heavy : list
+        Heavy dependencies (see HEAVY_MODULES) imported by the statement.
+    """
+
+    code  = ("import json, sys, time\n"
+             "t = time.perf_counter()\n" + statement + "\n"
+             "print(json.dumps([time.perf_counter() - t, [x for x in %r if x in sys.modules]]))" % (HEAVY_MODULES,))
+    runs  = [json.loads(subprocess.check_output([sys.executable, "-c", code],
+                                                cwd = os.path.dirname(os.path.abspath(__file__))).decode())
+             for _ in range(repeat)]
+
+    return float(np.median([x[0] for x in runs])), runs[0][1]
+
+
+def runBenchmark(symbols, bars, frequency, rebalance_bars, trials, ndays, seed):
+    """
+    Generates a synthetic market and times every stage of a backtest.
+
+    Returns
+    -------
+    timings : dict
+        Wall time (seconds) of each stage.
+    """
+
+    profiler = Profiler()
+    folder   = tempfile.mkdtemp()
+    out      = os.path.join(folder, "out", "")
+    os.makedirs(out)
+
+    try:
+        quotes_file, returns_folder = generateMarket(folder, symbols, bars, frequency, seed = seed)
+
+        dm    = DataManager(quotes_file, returns_folder = returns_folder, frequency = frequency,
+                            verbose = False, profiler = profiler)
+        index = dm.data["returns"].index
+        start = index[max(len(index) - rebalance_bars, 0)].to_pydatetime()
+        end   = index[-1].to_pydatetime()
+
+        # Indicators (timed by the profiler of the DataManager)
+        rules = MostTraded(dm)
+        for method in ("computeMomentum", "computeSD", "computeVaR", "computeSTD"):
+            getattr(rules, method)(ndays, index[0].to_pydatetime(), end)
+
+        # Strategies, one engine each
+        strategies = {"Momentum"        : lambda: Momentum(dm, momentum_days = ndays, max_stocks = 25,
+                                                           name = "Momentum", precalculated_folder = None),
+                      "MarketBenchmark" : lambda: MarketBenchmark(dm),
+                      "MostTraded"      : lambda: MostTraded(dm)}
+
+        for name, strategy in strategies.items():
+            with profiler.phase(name + ":init"):
+                strategy = strategy()
+
+            be = BacktestEngine(folder = out)
+            be.addSelectionRules(strategy)
+
+            with profiler.phase(name + ":rebalance"):
+                be.rebalance(start, end)
+            
+            # A strategy which does not trade would time an empty backtest
+            if len(be.transactions[0]) == 0:
+                raise ValueError("[-] " + name + " made no transaction between " + str(start) + " and " + str(end) + ".")
+            with profiler.phase(name + ":computeReturns"):
+                be.computeReturns(start, end, plot = False, save = False)
+            with profiler.phase(name + ":forward_backtesting"):
+                be.forward_backtesting(days_to_forecast = 10, simulation_trials = trials)
+
+    finally:
+        shutil.rmtree(folder, ignore_errors = True)
+
+    return {name : stats["wall"] for name, stats in profiler.report().phases.items()}
+
+
+def compare(record, history, tolerance, noise = 0.05):
+    """
+    Compares a record with the last record of the history made with the same
+    parameters.
+
+    Returns
+    -------
+    regressions : list
+        Stages slower than (1 + tolerance) times the previous run (and by more
+        than noise seconds).
+    """
+
+    previous = [x for x in history if x["parameters"] == record["parameters"]]
+    if len(previous) == 0:
+        print("[-] No previous run with these parameters.")
+        return []
+
+    previous    = previous[-1]
+    regressions = []
+    print("%-35s %10s %10s %8s" % ("Stage", "Previous", "Current", "Ratio"))
+    for stage, current in record["timings"].items():
+        before = previous["timings"].get(stage, np.nan)
+        ratio  = current / before if before > 0 else np.nan
+        flag   = ""
+        if ratio > 1 + tolerance and current - before > noise:
+            regressions.append(stage)
+            flag = "  <- REGRESSION"
+        print("%-35s %10.3f %10.3f %8.2f%s" % (stage, before, current, ratio, flag))
+
+    print("[-] Compared with commit", previous["commit"], "of", previous["date"])
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Benchmark of the backtesting engine on synthetic data.")
+    parser.add_argument("--symbols",        type = int,   default = 100,    help = "Number of symbols")
+    parser.add_argument("--bars",           type = int,   default = 1000,   help = "Number of bars")
+    parser.add_argument("--frequency",      type = str,   default = "1D",   help = "Pandas frequency of the bars")
+    parser.add_argument("--rebalance-bars", type = int,   default = 250,    help = "Number of bars rebalanced")
+    parser.add_argument("--trials",         type = int,   default = 100,    help = "Monte Carlo trials")
+    parser.add_argument("--ndays",          type = int,   default = 14,     help = "Window of the indicators")
+    parser.add_argument("--seed",           type = int,   default = 0,      help = "Seed of the synthetic market")
+    parser.add_argument("--history",        type = str,   default = "../out/benchmarks.jsonl",
+                        help = "History file (one JSON record per line)")
+    parser.add_argument("--tolerance",      type = float, default = 0.25,   help = "Tolerated slowdown (0.25 = 25%%)")
+    parser.add_argument("--fail-on-regression", action = "store_true",    help = "Exit with code 1 on regression")
+    parser.add_argument("--import-budget",  type = float, default = 1.0,    help = "Budget of the cold start (seconds)")
+    parser.add_argument("--imports-only",   action = "store_true",          help = "Only time the cold start")
+    args = parser.parse_args()
+
+    # Cold start
+    import_time, heavy = importTime()
+    print("[-] Cold start: %.3f s (budget %.3f s)" % (import_time, args.import_budget))
+    if len(heavy) > 0:
+        print("[-] Heavy dependencies imported at startup:", ", ".join(heavy))
+
+    startup_regressions = ["import:BacktestEngine"] if import_time > args.import_budget else []
+    if args.imports_only:
+        sys.exit(1 if startup_regressions and args.fail_on_regression else 0)
+
+    parameters = {"symbols" : args.symbols, "bars" : args.bars, "frequency" : args.frequency,
+                  "rebalance_bars" : args.rebalance_bars, "trials" : args.trials,
+                  "ndays" : args.ndays, "seed" : args.seed}
+
+    timings = runBenchmark(**parameters)
+    timings["import:BacktestEngine"] = import_time
+
+    record  = {"date"       : datetime.now().isoformat(timespec = "seconds"),
+               "commit"     : gitCommit(),
+               "python"     : platform.python_version(),
+               "numpy"      : np.__version__,
+               "pandas"     : pd.__version__,
+               "parameters" : parameters,
+               "timings"    : timings}
+
+    history = []
+    if os.path.isfile(args.history):
+        with open(args.history) as file:
+            history = [json.loads(line) for line in file if line.strip()]
+
+    regressions = compare(record, history, args.tolerance) + startup_regressions
+
+    with open(args.history, "a") as file:
+        file.write(json.dumps(record) + "\n")
+
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Jun  6 16:42:10 2021
+
+This script contains Analyzer class, used to compute the performance statistics
+of the strategies once their track records have been computed.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy`, `pandas` be installed within
+the Python environment you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * Analyzer - Computes performance statistics for every strategy at once.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+import numpy as np
+import pandas as pd
+
+
+class Analyzer():
+    """Computes performance statistics for all the track records at once. Every
+    statistic is computed on the (dates x strategies) matrix of equity values,
+    and intermediate results (returns, log returns, running maximum, drawdowns)
+    are only computed once.
+
+    Attributes
+    ----------
+    equity : pd.Dataframe
+        Equity curves of the strategies (one column per strategy)
+    transactions : dict(pd.Dataframe)
+        Transactions of the strategies, indexed by strategy name
+    periods_per_year : int
+        Number of periods in a year, used for annualization
+    risk_free : float
+        Annual risk free rate
+
+    Methods
+    -------
+    summary
+        Dataframe containing every statistic for every strategy.
+    sharpe
+        Annualized Sharpe ratio.
+    sortino
+        Annualized Sortino ratio.
+    maxDrawdown
+        Maximum drawdown.
+    drawdownDuration
+        Longest period spent under a previous maximum (in periods).
+    calmar
+        Annualized return over maximum drawdown.
+    turnover
+        Annualized traded weight, computed from the transactions.
+    hitRate
+        Share of periods with a positive return.
+    exposure
+        Average invested weight, computed from the transactions.
+    """
+
+    def __init__(self, equity, transactions = None, periods_per_year = 252, risk_free = 0.0):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        equity : pd.Dataframe
+            Equity curves of the strategies (one column per strategy), as
+            returned by BacktestEngine.computeReturns.
+        transactions : dict(pd.Dataframe), optional
+            Transactions of the strategies, indexed by strategy name. Strategies
+            without transactions get NaN turnover and exposure. The default is None.
+        periods_per_year : int, optional
+            Number of periods in a year. The default is 252.
+        risk_free : float, optional
+            Annual risk free rate. The default is 0.0.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.equity           = equity
+        self.transactions     = transactions if transactions is not None else {}
+        self.periods_per_year = periods_per_year
+        self.risk_free        = risk_free
+        self._cache           = {}
+
+
+    def _cached(self, key, function):
+        if key not in self._cache:
+            self._cache[key] = function()
+        return self._cache[key]
+
+
+    @property
+    def values(self):
+        """Equity matrix (dates x strategies)."""
+        return self._cached("values", lambda: self.equity.to_numpy(dtype = float))
+
+
+    @property
+    def returns(self):
+        """Simple returns matrix."""
+        def compute():
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                return self.values[1:] / self.values[:-1] - 1
+        return self._cached("returns", compute)
+
+
+    @property
+    def log_returns(self):
+        """Log returns matrix."""
+        return self._cached("log_returns", lambda: np.log1p(self.returns))
+
+
+    @property
+    def running_max(self):
+        """Running maximum of the equity curves (NaNs are skipped)."""
+        def compute():
+            x = np.where(np.isnan(self.values), -np.inf, self.values)
+            return np.maximum.accumulate(x, axis = 0)
+        return self._cached("running_max", compute)
+
+
+    @property
+    def drawdowns(self):
+        """Drawdowns matrix (0 at a new maximum, negative otherwise)."""
+        def compute():
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                return self.values / self.running_max - 1
+        return self._cached("drawdowns", compute)
+
+
+    def _series(self, values):
+        return pd.Series(values, index = self.equity.columns)
+
+
+    def sharpe(self):
+        """Annualized Sharpe ratio."""
+        excess = self.returns - self.risk_free / self.periods_per_year
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            ratio = np.nanmean(excess, axis = 0) / np.nanstd(self.returns, axis = 0, ddof = 1)
+        return self._series(ratio * self.periods_per_year**0.5)
+
+
+    def sortino(self):
+        """Annualized Sortino ratio (downside deviation computed against 0)."""
+        excess   = self.returns - self.risk_free / self.periods_per_year
+        downside = np.sqrt(np.nanmean(np.minimum(self.returns, 0)**2, axis = 0))
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            ratio = np.nanmean(excess, axis = 0) / downside
+        return self._series(ratio * self.periods_per_year**0.5)
+
+
+    def maxDrawdown(self):
+        """Maximum drawdown (negative number)."""
+        return self._series(np.nanmin(self.drawdowns, axis = 0))
+
+
+    def drawdownDuration(self):
+        """Longest number of consecutive periods spent under a previous maximum."""
+        def compute():
+            underwater = self.drawdowns < 0
+            position   = np.arange(len(underwater))[:, None]
+            last_max   = np.maximum.accumulate(np.where(underwater, -1, position), axis = 0)
+            return (position - last_max).max(axis = 0, initial = 0)
+        return self._series(self._cached("drawdown_duration", compute))
+
+
+    def annualizedReturn(self):
+        """Compounded annual growth rate."""
+        def compute():
+            log_returns = np.nan_to_num(self.log_returns)
+            periods     = np.isfinite(self.log_returns).sum(axis = 0)
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                return np.expm1(log_returns.sum(axis = 0) * self.periods_per_year / periods)
+        return self._series(self._cached("annualized_return", compute))
+
+
+    def calmar(self):
+        """Annualized return over the absolute value of the maximum drawdown."""
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            return self.annualizedReturn() / self.maxDrawdown().abs()
+
+
+    def hitRate(self):
+        """Share of periods with a positive return (periods without returns are ignored)."""
+        traded = (self.returns != 0) & np.isfinite(self.returns)
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            return self._series((self.returns > 0).sum(axis = 0) / traded.sum(axis = 0))
+
+
+    @property
+    def positions(self):
+        """Positions of every strategy, one row per opening transaction. The
+        first and last (excluded) periods held are given as integers."""
+        def compute():
+            names   = [name for name in self.equity.columns if name in self.transactions]
+            if len(names) == 0:
+                return pd.DataFrame(columns = ["strategy", "symbol", "weight", "start", "end"])
+
+            ledger  = pd.concat([self.transactions[name] for name in names], keys = names,
+                                names = ["strategy", None]).reset_index(level = 0)
+            opens   = ledger[ledger.action == "OPEN"]
+            closes  = ledger[ledger.action == "CLOSE"][["strategy", "TR_POS", "date"]]
+            opens   = opens.merge(closes, how = "left", on = ["strategy", "TR_POS"], suffixes = ("", "_close"))
+
+            index   = self.equity.index
+            start   = index.searchsorted(pd.to_datetime(opens.date))
+            end     = np.where(opens.date_close.isnull(), len(index),
+                               index.searchsorted(pd.to_datetime(opens.date_close)))
+
+            return pd.DataFrame({"strategy" : opens.strategy.values, "symbol" : opens.symbol.values,
+                                 "weight" : opens.weight.values.astype(float),
+                                 "start" : start, "end" : np.maximum(start, end)})
+        return self._cached("positions", compute)
+
+
+    def turnover(self):
+        """Annualized traded weight. Closing and reopening the same symbol on
+        the same period (rebalancing) only counts the weight difference."""
+        positions = self.positions
+        trades    = pd.concat([positions[["strategy", "symbol", "start"]].rename(columns = {"start" : "period"})
+                                  .assign(weight = positions.weight),
+                               positions[["strategy", "symbol", "end"]].rename(columns = {"end" : "period"})
+                                  .assign(weight = -positions.weight)])
+        trades    = trades[trades.period < len(self.equity.index)]
+
+        traded    = trades.groupby(["strategy", "symbol", "period"], observed = True).weight.sum().abs().groupby(level = 0).sum()
+        periods   = np.isfinite(self.values).sum(axis = 0)
+
+        return traded.reindex(self.equity.columns) * self.periods_per_year / self._series(periods)
+
+
+    def exposure(self):
+        """Average invested weight over the periods of the track record."""
+        positions = self.positions
+        invested  = (positions.weight * (positions.end - positions.start)).groupby(positions.strategy).sum()
+        periods   = np.isfinite(self.values).sum(axis = 0)
+
+        return invested.reindex(self.equity.columns) / self._series(periods)
+
+
+    def summary(self):
+        """
+        Computes every statistic for every strategy.
+
+        Returns
+        -------
+        pd.Dataframe
+            Statistics (rows) for every strategy (columns).
+
+        """
+
+        return pd.DataFrame({"Annualized return"  : self.annualizedReturn(),
+                             "Sharpe"             : self.sharpe(),
+                             "Sortino"            : self.sortino(),
+                             "Max drawdown"       : self.maxDrawdown(),
+                             "Drawdown duration"  : self.drawdownDuration(),
+                             "Calmar"             : self.calmar(),
+                             "Turnover"           : self.turnover(),
+                             "Hit rate"           : self.hitRate(),
+                             "Exposure"           : self.exposure()}).T
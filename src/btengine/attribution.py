@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Jun 12 10:21:37 2021
+
+This script contains the functions used to attribute the returns of the assets
+to a strategy, given its transactions.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy`, `pandas` be installed within
+the Python environment you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * positionEvents - Converts transactions into arrays of positions.
+    * streamReturns  - Yields the strategy returns chunk by chunk.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+import numpy as np
+import pandas as pd
+
+
+def positionEvents(transactions, index):
+    """
+    Converts a dataframe of transactions into arrays describing every position.
+    A position holds the returns of the periods between its opening date
+    (included) and its closing date (excluded).
+
+    Parameters
+    ----------
+    transactions : pd.Dataframe
+        List of transactions.
+    index : pd.DatetimeIndex
+        Dates of the returns.
+
+    Returns
+    -------
+    events : dict(np.array)
+        symbols    : traded symbols (unique)
+        id         : TR_POS of each position
+        symbol     : position of the symbol of each position in symbols
+        start      : first period held
+        end        : first period not held (len(index) if the position is open)
+        closed     : whether the position is closed
+        weight     : weight of the position
+        fees_coeff : fees coefficient of the opening transaction
+        close_fees_coeff : fees coefficient of the closing transaction (1 if open)
+    """
+
+    opens   = transactions[transactions.action == "OPEN"]
+    closes  = transactions[transactions.action == "CLOSE"].drop_duplicates(subset = "TR_POS")
+    opens   = opens.merge(closes[["TR_POS", "date", "fees_coeff"]], how = "left", on = "TR_POS", suffixes = ("", "_close"))
+
+    if isinstance(opens.symbol.dtype, pd.CategoricalDtype):
+        # Interned symbols: unique integer codes
+        codes, symbol = np.unique(opens.symbol.cat.codes.values, return_inverse = True)
+        symbols = np.asarray(opens.symbol.cat.categories[codes]).astype(str)
+    else:
+        symbols, symbol = np.unique(opens.symbol.values.astype(str), return_inverse = True)
+    closed  = opens.date_close.notnull().values
+    start   = index.searchsorted(pd.to_datetime(opens.date.values))
+    end     = np.full(len(opens), len(index))
+    end[closed] = index.searchsorted(pd.to_datetime(opens.date_close.values[closed]))
+
+    # Positions holding no period are ignored
+    held    = end > start
+
+    return {"symbols"          : symbols,
+            "id"               : opens.TR_POS.values[held],
+            "symbol"           : symbol[held],
+            "start"            : start[held],
+            "end"              : end[held],
+            "closed"           : closed[held],
+            "weight"           : opens.weight.values.astype(float)[held],
+            "fees_coeff"       : opens.fees_coeff.values.astype(float)[held],
+            "close_fees_coeff" : opens.fees_coeff_close.fillna(1.0).values.astype(float)[held]}
+
+
+def streamReturns(events, returns, costs = None, start = 0, chunk_size = 10000):
+    """
+    Yields the returns of a strategy chunk by chunk. Only chunk_size rows of the
+    (dates x symbols) matrix of positions are held in memory: the weights held
+    at the end of a chunk are carried to the next one.
+
+    Transaction costs are taken on the first period of a position, and on its
+    last period if it is closed. So are the corrections of the returns of
+    these periods when the positions are not filled at the closes (optional
+    entry_adjustment and exit_adjustment of events, see execution.ExecutionRules).
+
+    Parameters
+    ----------
+    events : dict(np.array)
+        Positions, as returned by positionEvents.
+    returns : pd.Dataframe
+        Returns of the assets (dates x symbols), with the index used by positionEvents.
+    costs : tuple(np.array), optional
+        Costs of opening and of closing every position, in fraction of the
+        capital (see costmodels.positionCosts). The default is None (no costs).
+    start : int, optional
+        First period to compute. The default is 0.
+    chunk_size : int, optional
+        Number of periods computed at once. The default is 10000.
+
+    Yields
+    ------
+    index : pd.DatetimeIndex
+        Dates of the chunk.
+    strategy_returns : np.array
+        Returns of the strategy for each date of the chunk.
+    """
+
+    symbol, first, last, weight = events["symbol"], events["start"], events["end"], events["weight"]
+    if costs is None:
+        costs = (np.zeros(len(weight)), np.zeros(len(weight)))
+    open_costs, close_costs = costs
+    columns = returns.columns.get_indexer(events["symbols"])
+
+    # Weights held before the first period
+    state   = np.zeros(len(events["symbols"]))
+    before  = (first < start) & (last >= start)
+    np.add.at(state, symbol[before], weight[before])
+
+    for a in range(start, len(returns.index), chunk_size):
+        b = min(a + chunk_size, len(returns.index))
+
+        # Changes of weights within the chunk, carried from the previous state
+        delta    = np.zeros((b - a, len(state)))
+        opening  = (first >= a) & (first < b)
+        closing  = (last >= a) & (last < b)
+        np.add.at(delta, (first[opening] - a, symbol[opening]), weight[opening])
+        np.add.at(delta, (last[closing] - a, symbol[closing]), -weight[closing])
+
+        weights  = state + np.cumsum(delta, axis = 0)
+        state    = weights[-1]
+
+        chunk    = returns.iloc[a:b, columns].to_numpy(dtype = float)
+        strategy_returns = np.nansum(weights * chunk, axis = 1)
+
+        # Transaction costs at the opening and the closing of the positions
+        np.add.at(strategy_returns, first[opening] - a, -open_costs[opening])
+        closing  = events["closed"] & (last - 1 >= a) & (last - 1 < b)
+        np.add.at(strategy_returns, last[closing] - 1 - a, -close_costs[closing])
+
+        # Fills at other prices than the closes
+        if "entry_adjustment" in events:
+            np.add.at(strategy_returns, first[opening] - a, events["entry_adjustment"][opening])
+            np.add.at(strategy_returns, last[closing] - 1 - a, events["exit_adjustment"][closing])
+
+        yield returns.index[a:b], strategy_returns
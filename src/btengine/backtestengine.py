@@ -28,10 +28,20 @@ ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
 
 
 # Imports
-from datetime import timedelta
+from datetime import datetime, timedelta
+import os
+import numpy as np
 import pandas as pd
-from btengine.selectionrules import SelectionRules
-from btengine.visualizer import plotReturns
+from btengine.analyzer import Analyzer
+from btengine.attribution import positionEvents, streamReturns
+from btengine.costmodels import MarketData, ProportionalFee, positionCosts
+from btengine.execution import ExecutionRules
+from btengine.framebuffer import FrameBuffer
+from btengine.portfolio import optimizePortfolio
+from btengine.profiler import Profiler
+from btengine.resultstore import ResultStore
+from btengine.selectionrules import SelectionRules, exportTransactions, newTransactions
+from btengine.visualizer import plotReturns, plotReturnsAsync
 from pandas.tseries.offsets import BDay
 from tqdm import tqdm
 import btengine.my_utils as my_utils
@@ -53,6 +63,14 @@ class BacktestEngine():
     ----------
     broker_fees : float
         The fees of your own broker.(default is 0.0)
+    cost_model : CostModel
+        Transaction costs model (default: ProportionalFee(broker_fees))
+    execution : ExecutionRules
+        Fills against the OHLC bars (default: None, fills at the closes)
+    fills : dict(pd.Dataframe)
+        Fills of the positions of every strategy, by name (execution only)
+    cache : ResultCache
+        Cache of the ledgers and track records (None if disabled)
     selectionRules : SelectionRules
         The selection class designed using an SelectionRules child-class
     transactions : list
@@ -60,23 +78,41 @@ class BacktestEngine():
     performance_daily: Dataframe
         Dataframe containing daily returns for the strategy and the benchmark
     analyzer: Analyzer
-        Analyzer module, initialized after modules computation
+        Analyzer module, initialized after returns computation
+    profiler: Profiler
+        Phase timers, latencies and counters (see profiler.report())
+    store: ResultStore
+        Binary dataset of results (None if results are saved as csv)
+    run: str
+        Name of the run in the store
+    portfolio_weights: Dataframe
+        Target weights of the merged strategies at every rebalancing (see mergeStrategies)
 
     Methods
     -------
     computeReturns(start_date, end_date, plot = True, save = True)
         Computes the portfolio returns between two dates. Requires a rebalancing
-        to be run.
+        to be run. Initializes the analyzer.
     rebalance(start_date, end_date)
         Rebalance the portfolio between two dates. Needs addArtemisSelectionRules
         to be called first.
     addSelectionRules
         Add selection rules for the rebalancing
+    mergeStrategies
+        Combines the strategies with fixed or optimized weights.
     forward_backtesting
-        Not done yet !
+        Forecasts the track records (GBM or block bootstrap simulations).
+    flushPlots
+        Renders deferred graphs and waits for background ones.
+    saveResults
+        Saves the track records and trades (csv or binary store).
+    step(prices, volume = None)
+        Processes new bars only (live or paper trading).
     """
     
-    def __init__(self, broker_fees = 0.0, capital = 1, folder = "../out/"):
+    def __init__(self, broker_fees = 0.0, capital = 1, folder = "../out/", plot_mode = "sync", plot_preview = False,
+                 profiler = None, output = "csv", run = None, cost_model = None, execution = None,
+                 cache = None):
         """
         Constructor.
 
@@ -88,6 +124,41 @@ class BacktestEngine():
             Base capital (keep 1 if you only want to see the performance). The default is 1.0.
         folder : string, optional
             Path to the output folder. The default is "../out/".
+        plot_mode : string, optional
+            When graphs are rendered: "sync" (immediately), "async" (in a 
+            background worker) or "deferred" (when flushPlots is called). 
+            The default is "sync".
+        plot_preview : boolean, optional
+            Renders smaller, low resolution graphs. The default is False.
+        profiler : Profiler, optional
+            Profiler timing the phases of the backtest. Give the same profiler
+            to the DataManager to include the loading. The default is None (disabled).
+        output : string, optional
+            Format of the saved results: "csv" (one file per strategy) or 
+            "binary" (partitioned dataset in <folder>results/, see ResultStore,
+            faster to write and to load back for many runs). The default is "csv".
+        run : string, optional
+            Name of the run in the binary dataset. The default is None (current time).
+        cost_model : CostModel, optional
+            Transaction costs (see costmodels: proportional and fixed fees, 
+            slippage, spread, or their sum). The default is None, broker_fees
+            in % of the transactions (ProportionalFee).
+        execution : ExecutionRules, optional
+            Fills at the open, limit orders, stop-loss and take-profit, 
+            evaluated on the OHLC bars of the data (requires DataManager(ohlc = True)).
+            Only used by computeReturns. The default is None (positions filled
+            at the closes).
+        cache : ResultCache, optional
+            Memoizes the ledger of every strategy (rebalance) and its track 
+            record (computeReturns). Identical reruns are loaded from the 
+            cache; runs extended to a later end date only compute the new
+            dates. The default is None (no cache).
+            
+        Raises
+        ------
+        ValueError
+            If plot_mode or output is unknown, or if execution is not an
+            ExecutionRules.
 
         Returns
         -------
@@ -95,14 +166,34 @@ class BacktestEngine():
 
         """
 
+        if plot_mode not in ("sync", "async", "deferred"):
+            raise ValueError("[-] Unknown plot mode " + str(plot_mode) + ", expected 'sync', 'async' or 'deferred'.")
+        if output not in ("csv", "binary"):
+            raise ValueError("[-] Unknown output " + str(output) + ", expected 'csv' or 'binary'.")
+        if execution is not None and not isinstance(execution, ExecutionRules):
+            raise ValueError("[-] execution must be an ExecutionRules, got " + type(execution).__name__ + ".")
+
         self.broker_fees    = broker_fees
+        self.cost_model     = cost_model if cost_model is not None else ProportionalFee(broker_fees)
+        self.execution      = execution
+        self.fills          = {}
+        self.cache          = cache
+        self.cache_keys     = None
         self.capital        = capital
         self.folder         = folder
+        self.plot_mode      = plot_mode
+        self.plot_preview   = plot_preview
+        self.pending_plots  = []
+        self.profiler       = profiler if profiler is not None else Profiler(enabled = False)
+        self.store          = ResultStore(folder + "results/") if output == "binary" else None
+        self.run            = run if run is not None else datetime.now().strftime("%Y%m%d_%H%M%S_%f")
         self.selectionRules = []
         self.transactions   = None
         self.returns        = None
+        self.analyzer       = None
+        self.live           = None
 
-    def computeReturns(self, start_date, end_date, plot = True, save = True):
+    def computeReturns(self, start_date, end_date, plot = True, save = True, chunk_size = None):
         """Computes the portfolio returns between two dates. Requires a rebalancing
         to be run.
 
@@ -118,6 +209,10 @@ class BacktestEngine():
         save : boolean, optional
             Default: True, saves the performances in a csv format in script's directory.
             
+        chunk_size : int, optional
+            Default: None. If set, the returns are computed in streaming mode,
+            chunk_size periods at a time (see streamTrackRecord).
+            
         Raises
         ------
         NotImplementedError
@@ -136,91 +231,244 @@ class BacktestEngine():
             
             # Load and save (if option enabled) trades history
             transactions_strat = self.transactions[i]
-            if(save):
-                transactions_strat.to_csv(self.folder + self.selectionRules[0].name + "_trades" + ".csv")
-                    
-                
-            quotes = transactions_strat.symbol.unique()
+            if(save and self.store is None):
+                with self.profiler.phase("computeReturns:save"):
+                    exportTransactions(transactions_strat).to_csv(self.folder + self.selectionRules[i].name + "_trades" + ".csv")
             
-            # Initialize strategy track record
-            track_record = pd.DataFrame(index=self.selectionRules[i].data_manager.data["returns"].index,
-                                        columns = self.selectionRules[i].data_manager.data["returns"].columns)
-            track_record = track_record[track_record.index.date >= start_date]
-            
-            # Fetch transactions for every quote
-            for quote in quotes:
-                
-                quote_transactions = transactions_strat[transactions_strat.symbol == quote]
-                daily_returns      = self.selectionRules[i].data_manager.data["returns"][quote]
-                returns_trans      = []
-                
-                # Process of each opening transaction.
-                for index, quote_transaction in quote_transactions[quote_transactions.action == "OPEN"].iterrows():
-                    
-                    # Process of each closing transaction.
-                    quote_close = quote_transactions[
-                        (quote_transactions.action == "CLOSE") & 
-                        (quote_transactions.TR_POS == quote_transaction.TR_POS)
-                        ]
-                    
-                    # Work with closed positions
-                    if not quote_close.empty:
-                        returns_period = daily_returns[
-                            (daily_returns.index.date >= quote_transaction.date) & 
-                            (daily_returns.index.date < quote_close.date.values[0])
-                            ]
-                        
-                        returns_period[-1] = returns_period[-1] - self.broker_fees *  quote_transaction.fees_coeff
-       
-                    # Open positions (computing to the last datapoint)
-                    else:
-                        returns_period = daily_returns[
-                            daily_returns.index.date >= quote_transaction.date
-                            ]
-            
-                    # Weight of the transaction in the total capital - broker fees (at open & close)
-                    # TODO: REWORK BROKER FEES WITH PRICE
-                    if not returns_period.empty:                   
-                        returns_period[0]  = returns_period[0]  - self.broker_fees *  quote_transaction.fees_coeff
-                         
-                    returns_period =  returns_period * quote_transaction.weight
-            
-                    # Adding the applicable period to the list
-                    returns_trans.append(returns_period)
-                        
-                # Regroupement des daily returns
-                quote_returns_pos = pd.concat(returns_trans)
-                quote_returns_pos = quote_returns_pos.groupby(quote_returns_pos.index).sum()
-            
-                track_record[quote] = quote_returns_pos
-            
-            track_record = track_record.fillna(0)
-            track_record_strategy = track_record.sum(axis = 1)
-            track_record_strategy = ((1 + track_record.sum(axis = 1)).cumprod()) * self.capital
-            track_record_strategy.name = self.selectionRules[i].name  
+            # Returns are attributed on integer bars. In streaming mode, they are
+            # computed chunk by chunk and saved progressively.
+            with self.profiler.phase("computeReturns:attribution"):
+                if chunk_size is None and self.cache_keys is not None:
+                    track_record_strategy = self.cachedTrackRecord(i, start_date)
+                elif chunk_size is None:
+                    bars = len(self.selectionRules[i].data_manager.index)
+                    track_record_strategy = self.streamTrackRecord(i, start_date, max(bars, 1), save = False)
+                else:
+                    track_record_strategy = self.streamTrackRecord(i, start_date, chunk_size, 
+                                                                   save and self.store is None)
             
             self.returns = pd.concat([self.returns, track_record_strategy], axis=1)
         
         
+        self.analyzer = Analyzer(self.returns, 
+                                 {self.selectionRules[i].name : self.transactions[i] for i in range(len(self.transactions))},
+                                 self.selectionRules[0].data_manager.bars_per_year)
+        
         if(plot):
-            plotReturns(self.returns, self.selectionRules[0].name)
+            with self.profiler.phase("computeReturns:plot"):
+                self.schedulePlot(self.returns, self.selectionRules[0].name)
         
         if(save):
-            self.returns.to_csv(self.folder + self.selectionRules[0].name + ".csv")
+            with self.profiler.phase("computeReturns:save"):
+                self.saveResults(self.selectionRules[0].name, trades = True)
         
         print("[-] Backtest finished...")
         return self.returns
     
     
     
-    def mergeStrategies(self, weights, name = "Portfolio", columns = "all", plot = True, save = True):
+    def streamTrackRecord(self, i, start_date, chunk_size = 10000, save = True, value = None):
+        """Computes the equity curve of a strategy chunk by chunk. The weights
+        of the positions and the equity are carried from one chunk to the next,
+        so that the memory used depends on chunk_size and not on the length of
+        the history. If enabled, the equity curve is appended to
+        <folder><strategy name>_equity.csv after each chunk.
+
+        Parameters
+        ----------
+        i : int
+            Position of the strategy in selectionRules.
+        start_date : datetime.date
+            The start date
+        chunk_size : int, optional
+            Number of periods computed at once. The default is 10000.
+        save : boolean, optional
+            Wether the equity curve should be written progressively. The default is True.
+        value : float, optional
+            Equity before start_date. The default is None (capital).
+
+        Returns
+        -------
+        pd.Series
+            Equity curve of the strategy.
+
         """
-        Merge existing strategies into a single strategy
+        
+        manager = self.selectionRules[i].data_manager
+        name    = self.selectionRules[i].name
+        events  = positionEvents(self.transactions[i], manager.index)
+        returns = manager.getPanel("returns", events["symbols"])
+        start   = returns.index.searchsorted(pd.Timestamp(start_date))
+        
+        market  = MarketData(manager, events["symbols"], self.capital)
+        
+        # Fills against the OHLC bars: entry and exit bars and prices of every position
+        if self.execution is not None:
+            with self.profiler.phase("computeReturns:execution"):
+                events, self.fills[name] = self.execution.apply(events, market)
+        
+        # Transaction costs of every position, computed in bulk
+        with self.profiler.phase("computeReturns:costs"):
+            costs = positionCosts(events, self.cost_model, market)
+        
+        equity  = []
+        value   = self.capital if value is None else value
+        for index, strategy_returns in streamReturns(events, returns, costs, start, chunk_size):
+            
+            chunk = pd.Series(value * (1 + strategy_returns).cumprod(), index = index, name = name)
+            value = chunk.iloc[-1]
+            
+            if(save):
+                chunk.to_csv(self.folder + name + "_equity.csv", mode = "w" if len(equity) == 0 else "a",
+                             header = len(equity) == 0)
+            equity.append(chunk)
+            
+        return pd.concat(equity) if len(equity) > 0 else pd.Series(dtype = float, name = name)
+    
+    
+    def cachedTrackRecord(self, i, start_date):
+        """Equity curve of a strategy, memoized in the cache with the costs
+        settings. If the cache holds the curve of the same ledger ending at an 
+        earlier date, on the same data up to this date, only the bars from this
+        date are computed: transactions added after it change the returns from 
+        the bar before their date (closing costs) onwards.
 
         Parameters
         ----------
-        weights : list
-            List of weights for the selected strategies.
+        i : int
+            Position of the strategy in selectionRules.
+        start_date : datetime.date
+            The start date
+
+        Returns
+        -------
+        pd.Series
+            Equity curve of the strategy.
+
+        """
+        
+        manager  = self.selectionRules[i].data_manager
+        name     = self.selectionRules[i].name
+        key      = self.cache.key("equity", self.cache_keys[i], pd.Timestamp(start_date), self.capital,
+                                  self.broker_fees, self.cost_model, self.execution)
+        full     = self.cache.dataFingerprint(manager)
+        
+        with self.profiler.phase("computeReturns:cache"):
+            end, content = self.cache.lookup(key, manager, self.rebalance_end)
+        
+        if content is not None and end == pd.Timestamp(self.rebalance_end) and content["data"] == full:
+            self.profiler.count("cache:hit:equity", 1)
+            if content["fills"] is not None:
+                self.fills[name] = content["fills"]
+            return content["equity"]
+        
+        if content is not None:
+            # Bars before the first one which new transactions can change
+            self.profiler.count("cache:prefix:equity", 1)
+            resume   = max(manager.barIndex(end, True) - 1, manager.barIndex(start_date))
+            kept     = content["equity"][content["equity"].index < manager.index[resume]]
+            value    = kept.iloc[-1] if len(kept) > 0 else None
+            recent   = self.streamTrackRecord(i, manager.index[resume], max(len(manager.index), 1), 
+                                              save = False, value = value)
+            equity   = pd.concat([kept, recent])
+        else:
+            equity   = self.streamTrackRecord(i, start_date, max(len(manager.index), 1), save = False)
+        
+        self.cache.store(key, manager, self.rebalance_end, 
+                         {"equity" : equity, "fills" : self.fills.get(name), "data" : full})
+        return equity
+    
+    
+    
+    def saveResults(self, name, trades = False):
+        """
+        Saves the track records (and the trades of every strategy if asked),
+        as csv files in folder or in the binary store (one partition per run).
+
+        Parameters
+        ----------
+        name : str
+            Name of the csv file of the track records.
+        trades : boolean, optional
+            Whether the trades are saved too. The default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+        
+        if self.store is None:
+            self.returns.to_csv(self.folder + name + ".csv")
+            return
+        
+        self.store.write("equity", self.run, self.returns)
+        if trades:
+            names  = [self.selectionRules[i].name for i in range(len(self.transactions))]
+            ledger = pd.concat([exportTransactions(x) for x in self.transactions], keys = names, names = ["strategy", None])
+            self.store.write("trades", self.run, ledger.reset_index(level = 0).reset_index(drop = True))
+    
+    
+    
+    def schedulePlot(self, returns, subtext):
+        """
+        Renders a graph of the returns according to plot_mode.
+
+        Parameters
+        ----------
+        returns : pd.Dataframe
+            Dataframe containing the returns to plot.
+        subtext : str
+            Text to be displayed below the graph.
+
+        Returns
+        -------
+        None.
+
+        """
+        
+        if self.plot_mode == "sync":
+            plotReturns(returns, subtext, preview = self.plot_preview)
+        elif self.plot_mode == "async":
+            self.pending_plots.append(plotReturnsAsync(returns, subtext, preview = self.plot_preview))
+        else:
+            self.pending_plots.append((returns.copy(), subtext))
+            
+            
+    def flushPlots(self):
+        """
+        Renders the deferred graphs and waits for the ones rendered in background.
+        To be called at the end of a batch of backtests.
+
+        Returns
+        -------
+        None.
+
+        """
+        
+        pending, self.pending_plots = self.pending_plots, []
+        with self.profiler.phase("flushPlots"):
+            for plot in pending:
+                if isinstance(plot, tuple):
+                    plotReturns(*plot, preview = self.plot_preview)
+                else:
+                    plot.result()
+    
+    
+    
+    def mergeStrategies(self, weights, name = "Portfolio", columns = "all", plot = True, save = True,
+                        every = None, window = 60, risk_aversion = 1.0, long_only = True):
+        """
+        Merge existing strategies into a single strategy: a portfolio investing
+        in the strategies with fixed weights, or with weights optimized on the
+        returns of the strategies (see portfolio.optimalWeights). Every 
+        optimization window is solved at once.
+
+        Parameters
+        ----------
+        weights : list or str
+            List of weights for the selected strategies, or optimization method:
+            "min_variance", "mean_variance" or "risk_parity".
         name : string, optional
             Name of the macrostrategy created. The default is "Portfolio".
         columns : string or list, optional
@@ -229,6 +477,17 @@ class BacktestEngine():
             Wether the program should plot the results. The default is True.
         save : TYPE, optional
             Wether the program should save the results. The default is True.
+        every : int, optional
+            Number of bars between two rebalancings of the portfolio to its 
+            target weights. The default is None: fixed weights are never 
+            rebalanced (buy and hold), optimized weights every window bars.
+        window : int, optional
+            Number of bars of returns used by every optimization (optimized 
+            weights are equal until the first one). The default is 60.
+        risk_aversion : float, optional
+            Risk aversion of mean_variance. The default is 1.0.
+        long_only : boolean, optional
+            Whether the optimized weights are positive. The default is True.
 
         Raises
         ------
@@ -244,7 +503,8 @@ class BacktestEngine():
 
         """
         
-        if not (1 + 1e-6 > sum(weights) and 1 - 1e-6 < sum(weights)):
+        optimized = isinstance(weights, str)
+        if not optimized and not (1 + 1e-6 > sum(weights) and 1 - 1e-6 < sum(weights)):
             print("[-] Warning: weights do not sum to 1; meaning you are either leveraged or have non-invested capital")
         
         if isinstance(columns, str):
@@ -254,30 +514,34 @@ class BacktestEngine():
             else:
                 raise TypeError("Variable 'columns' must be either 'all' or a list of existing strategies.")
     
-        if len(weights) != len(self.returns.columns):
+        if not optimized and len(weights) != len(columns):
             raise ValueError("Length of 'weights' list does not correspond to the number of selected strategies.")
                     
-            
-        self.portfolio_strat      = self.returns[columns]
-        for i in range(0, len(columns)):
-            self.portfolio_strat[columns[i]] = self.portfolio_strat[columns[i]] * weights[i]
+        equity = self.returns[columns].ffill().to_numpy(dtype = float)
+        with self.profiler.phase("mergeStrategies"):
+            starts, target, value = optimizePortfolio(equity, None if optimized else weights, 
+                                                      weights if optimized else None, every, window,
+                                                      risk_aversion, long_only, self.capital)
         
-        self.portfolio_strat      = self.portfolio_strat.sum(axis = 1)
-        self.portfolio_strat.name = name
+        self.portfolio_weights    = pd.DataFrame(target, index = self.returns.index[starts], columns = columns)
+        self.portfolio_strat      = pd.Series(value, index = self.returns.index, name = name)
 
         self.returns = pd.concat([self.returns, self.portfolio_strat], axis = 1)
+        
+        if self.analyzer is not None:
+            self.analyzer = Analyzer(self.returns, self.analyzer.transactions, self.analyzer.periods_per_year)
                   
         if(plot):
-            plotReturns(self.returns, name)
+            self.schedulePlot(self.returns, name)
         
         if(save):
-            self.returns.to_csv(self.folder + name + ".csv")
+            self.saveResults(name)
             
         return self.returns
             
     
         
-    def rebalance(self, start_date, end_date, showstate = True):
+    def rebalance(self, start_date, end_date, showstate = True, checkpoint = None):
         """Rebalance the portfolio between two dates. Needs addSelectionRules
         to be called first.
 
@@ -287,6 +551,18 @@ class BacktestEngine():
             The rebalancing start date
         end_date : datetime.date
             The rebalancing end date
+        checkpoint : Checkpointer, optional
+            Saves the transactions and the states of the strategies every 
+            checkpoint.every dates. If the checkpoint file comes from an
+            interrupted rebalancing of the same strategies from the same start
+            date, the rebalancing resumes after its last checkpoint. The default
+            is None.
+            
+        If the engine has a cache, the ledger and the state of every strategy 
+        are loaded from the latest cached run of the same strategy (from the 
+        same start date, on the same data) ending at most at end_date, and only
+        the later dates are rebalanced. The cache is not read when resuming 
+        from a checkpoint.
             
         Raises
         ------
@@ -301,20 +577,240 @@ class BacktestEngine():
             raise NotImplementedError("[-] No selection method found. Please call addArtemisSelectionRules before calling this function")
         
         # Portfolio & Historical portfolio
-        self.transactions = list(pd.DataFrame(columns =['TR_POS', 'symbol', 'date', 'weight', 'action', 'fees_coeff', 'label']) for x in range(0,len(self.selectionRules)))
+        self.transactions = [newTransactions(x.data_manager) for x in self.selectionRules]
+        dates             = list(self.selectionRules[0].data_manager.rebalanceDates(start_date, end_date))
+        
+        # Resume from the cached runs (latest date rebalanced for every strategy)
+        cached = [None] * len(self.selectionRules)
+        if self.cache is not None:
+            with self.profiler.phase("rebalance:cache"):
+                self.cache_keys    = [self.cache.strategyKey(x, start_date) for x in self.selectionRules]
+                self.rebalance_end = end_date
+                for i, rules in enumerate(self.selectionRules if checkpoint is None else []):
+                    last_date, content = self.cache.lookup(self.cache_keys[i], rules.data_manager, end_date)
+                    if last_date is not None:
+                        print("[-]", rules.name, "loaded from cache up to", last_date)
+                        self.profiler.count("cache:hit:ledger", 1)
+                        self.transactions[i] = content["transactions"]
+                        rules.setState(content["state"])
+                        cached[i] = last_date
+            if all(x is not None for x in cached):
+                dates = [x for x in dates if pd.Timestamp(x) > min(cached)]
         
-        # Rebalancing
-        for selection_date in my_utils.daterange(start_date, end_date + timedelta(1)):
-            #print(selection_date)
-            for i in range(0, len(self.selectionRules)):
-                self.transactions[i] = self.selectionRules[i].compute_selection(selection_date, self.transactions[i].copy())
-                if(self.transactions[i].empty):
-                    print("Warning: the portfolio has not been updated. Please ensure that your SelectionRules return a dataframe.")
+        # Resume from the last checkpoint
+        if checkpoint is not None:
+            last_date, transactions, states = checkpoint.start([x.name for x in self.selectionRules], start_date)
+            if last_date is not None:
+                print("[-] Resuming from checkpoint of", last_date)
+                for i in range(0, len(self.selectionRules)):
+                    self.transactions[i] = pd.concat([self.transactions[i], transactions[i]], ignore_index = True)
+                    self.selectionRules[i].setState(states[i])
+                dates = [x for x in dates if pd.Timestamp(x) > last_date]
+        
+        # Rebalancing (every day, or every bar for intraday data)
+        with self.profiler.phase("rebalance"):
+            for n, selection_date in enumerate(dates):
+                #print(selection_date)
+                with self.profiler.latency("rebalance:day"):
+                    for i in range(0, len(self.selectionRules)):
+                        if cached[i] is not None and pd.Timestamp(selection_date) <= cached[i]:
+                            continue
+                        with self.profiler.latency("compute_selection:" + self.selectionRules[i].name):
+                            transactions = self.selectionRules[i].compute_selection(selection_date, self.transactions[i].copy())
+                        
+                        # Ledger operations made by the strategy
+                        if self.profiler.enabled:
+                            for action, count in transactions.action.iloc[len(self.transactions[i]):].astype(str).value_counts().items():
+                                self.profiler.count("ledger:" + self.selectionRules[i].name + ":" + action, count)
+                                
+                        self.transactions[i] = transactions
+                        if(self.transactions[i].empty):
+                            print("Warning: the portfolio has not been updated. Please ensure that your SelectionRules return a dataframe.")
+                
+                if checkpoint is not None and ((n + 1) % checkpoint.every == 0 or n == len(dates) - 1):
+                    with self.profiler.latency("rebalance:checkpoint"):
+                        checkpoint.save(selection_date, self.transactions, [x.getState() for x in self.selectionRules])
+        
+        # Runs extended or computed are added to the cache
+        if self.cache is not None:
+            for i, rules in enumerate(self.selectionRules):
+                if cached[i] is None or cached[i] < pd.Timestamp(end_date):
+                    self.cache.store(self.cache_keys[i], rules.data_manager, end_date,
+                                     {"transactions" : self.transactions[i], "state" : rules.getState()})
 
         print("[-] Rebalancing finished.")
         
         
         
+    def step(self, prices, volume = None, save = False):
+        """Processes new bars only, for live or paper trading: the bars are
+        appended to the DataManager, the strategies update their indicators 
+        (SelectionRules.update) and select on the date of each new bar, and 
+        the equity curves are extended by one row per bar. The cost of a step
+        does not depend on the length of the history.
+        
+        The engine continues from its last rebalancing and computeReturns if
+        any, from an empty portfolio otherwise. Fees are taken on the bar at 
+        which a position is opened or closed (computeReturns takes the closing
+        fees on the last bar held), computed by the cost model of the engine.
+
+        Parameters
+        ----------
+        prices : pd.Dataframe
+            Adjusted close prices of the new bars (dates x symbols).
+        volume : pd.Dataframe, optional
+            Volumes of the new bars. The default is None.
+        save : boolean, optional
+            Appends the new rows of the track records to the csv file 
+            <folder><first strategy name>.csv. The default is False.
+
+        Raises
+        ------
+        NotImplementedError
+            If no selection rules have been added.
+
+        Returns
+        -------
+        pd.Dataframe
+            Rows of the track records for the new bars.
+        """
+        
+        if(len(self.selectionRules) == 0):
+            raise NotImplementedError("[-] No selection method found. Please call addSelectionRules before calling this function")
+        
+        data_manager = self.selectionRules[0].data_manager
+        names        = [x.name for x in self.selectionRules]
+        
+        with self.profiler.phase("step"):
+            index = data_manager.append(prices, volume)
+            self.cache_keys = None
+            if len(index) == 0:
+                return pd.DataFrame(columns = names)
+            
+            for rules in self.selectionRules:
+                with self.profiler.phase("step:update:" + rules.name):
+                    rules.update(index)
+                    
+            if self.live is None:
+                self.startLive()
+                
+            returns  = data_manager.data["returns"]
+            first    = len(returns.index) - len(index)
+            daily    = my_utils.isDaily(data_manager.frequency)
+            rows     = np.zeros((len(index), len(names)))
+            
+            for k, bar in enumerate(index):
+                selection_date = bar.date() if daily else bar.to_pydatetime()
+                bar_returns    = returns.iloc[first + k]
+                
+                for i, rules in enumerate(self.selectionRules):
+                    n = len(self.transactions[i])
+                    with self.profiler.latency("compute_selection:" + rules.name):
+                        self.transactions[i] = rules.compute_selection(selection_date, self.transactions[i].copy())
+                    rows[k, i] = self.liveReturn(i, self.transactions[i].iloc[n:], bar_returns, first + k)
+            
+            # Equity curves, carried from the last known values
+            equity = self.live["value"] * np.cumprod(1 + rows, axis = 0)
+            self.live["value"] = equity[-1]
+            self.live["equity"].append(index, equity)
+            
+            self.returns  = self.live["equity"].frame
+            self.analyzer = Analyzer(self.returns, dict(zip(names, self.transactions)), data_manager.bars_per_year)
+            
+            new_rows = self.returns.iloc[-len(index):]
+            if save and self.store is None:
+                path = self.folder + names[0] + ".csv"
+                new_rows.to_csv(path, mode = "a", header = not os.path.isfile(path))
+        
+        return new_rows
+    
+    
+    def startLive(self):
+        """
+        Initializes the state used by step from the current transactions and
+        track records: open positions and last equity value of every strategy.
+
+        Returns
+        -------
+        None.
+
+        """
+        
+        names = [x.name for x in self.selectionRules]
+        if self.transactions is None:
+            self.transactions = [newTransactions(x.data_manager) for x in self.selectionRules]
+        
+        positions = []
+        for transactions in self.transactions:
+            opens = SelectionRules.getOpenPositions(transactions)
+            opens = opens[opens.action == "OPEN"]
+            positions.append({row.TR_POS : (row.symbol, float(row.weight), float(row.fees_coeff))
+                              for row in opens.itertuples()})
+        
+        if self.returns is not None and all(x in self.returns.columns for x in names) and len(self.returns.index) > 0:
+            equity = self.returns[names]
+            value  = equity.ffill().iloc[-1].fillna(self.capital).to_numpy(dtype = float)
+        else:
+            equity = pd.DataFrame(columns = names, index = pd.DatetimeIndex([], name = "Date"), dtype = float)
+            value  = np.full(len(names), float(self.capital))
+        
+        self.live = {"positions" : positions, "value" : value, "equity" : FrameBuffer(equity)}
+        
+        
+    def liveReturn(self, i, transactions, bar_returns, bar):
+        """
+        Updates the open positions of a strategy with its new transactions and
+        computes its return on a bar.
+
+        Parameters
+        ----------
+        i : int
+            Position of the strategy in selectionRules.
+        transactions : pd.Dataframe
+            Transactions made on the bar.
+        bar_returns : pd.Series
+            Returns of the assets on the bar.
+        bar : int
+            Position of the bar in the data.
+
+        Returns
+        -------
+        float
+            Return of the strategy, net of fees.
+        """
+        
+        positions = self.live["positions"][i]
+        trades    = []
+        opened    = set()
+        
+        for row in transactions.itertuples():
+            if row.action == "OPEN":
+                positions[row.TR_POS] = (row.symbol, float(row.weight), float(row.fees_coeff))
+                opened.add(row.TR_POS)
+                trades.append(positions[row.TR_POS] + (1.0,))
+            elif row.TR_POS in positions:
+                # A position closed on the bar it was opened holds nothing (no costs)
+                if row.TR_POS in opened:
+                    trades.append(positions[row.TR_POS] + (-1.0,))
+                else:
+                    trades.append(positions[row.TR_POS][:2] + (float(row.fees_coeff), 1.0))
+                del positions[row.TR_POS]
+        
+        # Costs of the trades of the bar
+        fees = 0.0
+        if len(trades) > 0:
+            symbols, symbol = np.unique([x[0] for x in trades], return_inverse = True)
+            market = MarketData(self.selectionRules[i].data_manager, symbols, self.capital, 
+                                max(bar - self.cost_model.lookback, 0))
+            costs  = self.cost_model.costs(symbol, np.full(len(trades), bar - market.start), 
+                                           np.array([x[1] for x in trades]), np.array([x[2] for x in trades]), market)
+            fees   = float(np.sum(np.broadcast_to(costs, (len(trades),)) * np.array([x[3] for x in trades])))
+        
+        held = sum(weight * bar_returns.get(symbol, 0.0) for symbol, weight, _ in positions.values()
+                   if np.isfinite(bar_returns.get(symbol, 0.0)))
+        return held - fees
+    
+    
     def addSelectionRules(self, selectionObject):
         """Add selection rules for the rebalancing
 
@@ -335,76 +831,130 @@ class BacktestEngine():
             
             
     def forward_backtesting(self, days_to_forecast = 25, simulation_trials = 1000, vol_multiplier = 1,
-                            confidence = 0.75):
+                            confidence = 0.75, method = "gbm", block = 5, seed = None, chunk_size = 1000, workers = 1):
+        """
+        Forecasts the track record of every strategy from its open positions,
+        with simulated price paths of the symbols held (simulated once for all
+        the strategies). The lower and upper bounds of the confidence interval
+        and the mean forecast are added to the returns. With the bootstrap, 
+        the bounds are paths of the strategy itself (its positions on one 
+        joint scenario of the symbols); with gbm, the symbols are simulated 
+        independently and the bounds are the weighted bounds of the symbols.
+
+        Parameters
+        ----------
+        days_to_forecast : int, optional
+            Number of bars forecasted. The default is 25.
+        simulation_trials : int, optional
+            Number of simulated paths. The default is 1000.
+        vol_multiplier : float, optional
+            Volatility multiplier (gbm). The default is 1.
+        confidence : float, optional
+            Confidence of the interval. The default is 0.75.
+        method : str, optional
+            "gbm" (lognormal paths of every symbol, see simulationfunctions.simulate),
+            "stationary" or "circular" (block bootstrap of the historical 
+            returns, jointly across symbols, see simulationfunctions.block_bootstrap).
+            The default is "gbm".
+        block : float, optional
+            (Mean) length of the bootstrapped blocks. The default is 5.
+        seed : int, optional
+            Master seed of the simulations. Every work unit (a symbol for gbm,
+            a chunk of paths for the bootstrap) has its own seed derived from
+            it, so that the forecasts do not depend on the number of workers.
+            The default is None (random).
+        chunk_size : int, optional
+            Number of bootstrapped paths per work unit. The default is 1000.
+        workers : int, optional
+            Number of processes running the work units. The default is 1.
+
+        Returns
+        -------
+        pd.Dataframe
+            Returns, with the forecasts of every strategy.
+        """
         
         lower_range = int(simulation_trials * (1 - confidence) / 2)
         upper_range = simulation_trials - lower_range
 
-        # 1. Simulating the data
+        # 1. Simulating the data: for every strategy, lower, upper and mean
+        # cumulative growth of its open positions (bars x 3)
         self.simulation_per_strat = {}
+        seed                      = sim.master_seed(seed)
         
-        # Each strategy can have its own data manager, thus the iterations
+        # Each strategy can have its own data manager: the symbols held by the
+        # strategies sharing a data manager are simulated once for all of them,
+        # with the weights of their open positions (symbols x strategies)
+        groups = {}
         for i in range(len(self.selectionRules)):
-            returns     = self.selectionRules[i].data_manager.data["prices"]
-            indices     = pd.date_range(returns.index[-1] + timedelta(1),
-                                        returns.index[-1] + timedelta(days_to_forecast * 2), 
-                                        freq=BDay())[:days_to_forecast + 1]
-    
-            simulations = {}
-            for ticker in tqdm(list(returns.columns)):
-                y = sim.simulate(returns[ticker], 
-                                 days_to_forecast + 1, 
-                                 simulation_trials, 
-                                 'log', 
-                                 vol_multiplier = 1)
+            data_manager = self.selectionRules[i].data_manager
+            group        = groups.setdefault(id(data_manager), {"data_manager" : data_manager, "names" : [], "weights" : []})
+            positions    = SelectionRules.getOpenPositions(self.transactions[i])
+            
+            # Nothing to forecast without open positions
+            if positions.empty:
+                continue
+            
+            group["names"].append(self.selectionRules[i].name)
+            group["weights"].append(positions.weight.astype(float).groupby(positions.symbol.astype(str).values).sum())
+        
+        with self.profiler.phase("forward_backtesting:simulation"):
+            for group in groups.values():
+                data_manager = group["data_manager"]
+                if len(group["names"]) == 0:
+                    continue
                 
-                y = pd.concat([pd.DataFrame([pd.Series([returns[ticker][-1]] * simulation_trials)]), y], 
-                              ignore_index=True)
+                weights = pd.concat(group["weights"], axis = 1).fillna(0.0).sort_index()
+                tickers = list(weights.index)
+                weights = weights.to_numpy()
                 
-                # TODO DEPLACER CE BLOC PLUS BAS
-                y       = (1 + y.pct_change()).cumprod()
-                #y       = y * returns[ticker][-1]
-                y       = y.iloc[1:]
-                y       = y.sort_values(y.last_valid_index(), axis=1)
-
-                y.index = indices
-                     
-                simulations[ticker] = y
+                last  = data_manager.index[-1]
+                dtype = data_manager.dtype
+                if my_utils.isDaily(data_manager.frequency):
+                    indices = pd.date_range(last + timedelta(1), last + timedelta(days_to_forecast * 2), 
+                                            freq=BDay())[:days_to_forecast + 1]
+                else:
+                    indices = pd.date_range(last + my_utils.barLength(data_manager.frequency),
+                                            periods = days_to_forecast + 1, freq = data_manager.frequency)
                 
-            self.simulation_per_strat[self.selectionRules[i].name] = simulations
-
-        # 2. Getting the portfolios performances
-        # Better option in newer version of the script
-        for i in range(len(self.selectionRules)):
-            strat_name  = self.selectionRules[i].name
-            positions   = SelectionRules.getOpenPositions(self.transactions[i])
-
-            lb_perfs = []
-            ub_perfs = []
-            mean_perfs = []
-
-            for index, row in positions.iterrows():
-                lb_perfs.append(self.simulation_per_strat[strat_name][row.symbol].iloc[:, [lower_range]] * row.weight)
-                ub_perfs.append(self.simulation_per_strat[strat_name][row.symbol].iloc[:, [upper_range]] * row.weight)
-                mean_perfs.append(self.simulation_per_strat[strat_name][row.symbol].mean(axis = 1) * row.weight)
+                ranks = (lower_range, min(upper_range, simulation_trials - 1))
                 
-            lb_perfs   = pd.concat(lb_perfs, axis=1).sum(axis = 1)   * self.returns[self.selectionRules[i].name][-1]
-            ub_perfs   = pd.concat(ub_perfs, axis=1).sum(axis = 1)   * self.returns[self.selectionRules[i].name][-1]
-            mean_perfs = pd.concat(mean_perfs, axis=1).sum(axis = 1) * self.returns[self.selectionRules[i].name][-1]
-            
-            lb_perfs.rename("Lower CR  "  + self.selectionRules[i].name, inplace = True)
-            ub_perfs.rename("Upper CR  "  + self.selectionRules[i].name, inplace = True)
-            mean_perfs.rename("Mean  "  + self.selectionRules[i].name,   inplace = True)
-            
-            self.returns = pd.merge(self.returns, lb_perfs, how='outer', 
-                                   left_index=True, 
-                                   right_index = True)
+                if method == "gbm":
+                    # One work unit per symbol, reduced to its bands by the worker:
+                    # the symbols are independent, the bands of a strategy are the
+                    # weighted bands of its symbols
+                    prices  = data_manager.getPanel("prices", tickers)
+                    units   = [(prices[ticker], days_to_forecast, simulation_trials, ranks, vol_multiplier, dtype,
+                                sim.unit_seed(seed, str(ticker))) for ticker in tickers]
+                    results = list(tqdm(sim.run_units(sim.gbm_bands, units, workers), total = len(units)))
+                    mean    = np.column_stack([x[0] for x in results]) @ weights
+                    paths   = [np.column_stack([x[1][k] for x in results]) @ weights for k in range(len(ranks))]
+                else:
+                    # The paths of every strategy are ranked on its own growth
+                    history = data_manager.getPanel("returns", tickers)[tickers]
+                    mean, paths = sim.block_bootstrap(history, days_to_forecast, simulation_trials, ranks, block,
+                                                      method, seed, chunk_size, dtype, workers, weights)
+                
+                # Paths start from the last bar (growth of 1 of every symbol)
+                start = weights.sum(axis = 0, keepdims = True)
+                lower, upper, mean = [np.vstack([start, x]) for x in paths + [mean]]
+                
+                for j, name in enumerate(group["names"]):
+                    self.simulation_per_strat[name] = pd.DataFrame({"lower" : lower[:, j], "upper" : upper[:, j],
+                                                                    "mean" : mean[:, j]}, index = indices)
+
+        # 2. Getting the portfolios performances, from the last value of their
+        # track record (read before the forecasts extend the returns)
+        last = self.returns.iloc[-1]
+        for rules in self.selectionRules:
+            name = rules.name
+            if name not in self.simulation_per_strat:
+                continue
             
-            self.returns = pd.merge(self.returns, ub_perfs, how='outer', 
-                                   left_index=True, 
-                                   right_index = True)
+            performances = self.simulation_per_strat[name] * last[name]
+            performances.columns = ["Lower CR  " + name, "Upper CR  " + name, "Mean  " + name]
             
-            self.returns = pd.merge(self.returns, mean_perfs, how='outer', 
+            self.returns = pd.merge(self.returns, performances, how='outer', 
                                    left_index=True, 
                                    right_index = True)
             
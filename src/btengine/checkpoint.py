@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Jun 22 18:03:26 2021
+
+This script contains Checkpointer class, used to save the state of a
+rebalancing regularly so that it can be resumed after a failure.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `pandas` be installed within the Python environment
+you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * Checkpointer - Append-only checkpoints of a rebalancing.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+import os
+import pickle
+import pandas as pd
+
+
+class Checkpointer():
+    """Saves the state of a rebalancing in an append-only file. The file starts
+    with a header (strategies and start date of the rebalancing), followed by
+    one frame per checkpoint containing only the transactions added since the
+    previous checkpoint and the state of every strategy (see
+    SelectionRules.getState). A checkpoint therefore costs the size of the new
+    transactions, not the size of the ledger.
+
+    A frame interrupted while being written (ex: the process was killed) is
+    ignored, the rebalancing resumes from the previous one.
+
+    Attributes
+    ----------
+    path : str
+        Path of the checkpoint file.
+    every : int
+        Number of rebalancing dates between two checkpoints.
+
+    Methods
+    -------
+    start(names, start_date)
+        Prepares the file for a rebalancing, returns the state to resume from.
+    save(selection_date, transactions, states)
+        Appends a checkpoint.
+    clear
+        Deletes the checkpoint file.
+    """
+
+    def __init__(self, path, every = 30):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        path : str
+            Path of the checkpoint file.
+        every : int, optional
+            Number of rebalancing dates between two checkpoints. The default is 30.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.path    = path
+        self.every   = every
+        self.lengths = None
+
+
+    def read(self):
+        """
+        Reads the checkpoint file.
+
+        Returns
+        -------
+        header : dict
+            Header of the file (None if there is no valid file).
+        frames : list(dict)
+            Complete checkpoints.
+        size : int
+            Size of the valid part of the file (in bytes).
+        """
+
+        header, frames, size = None, [], 0
+        if not os.path.isfile(self.path):
+            return header, frames, size
+
+        with open(self.path, "rb") as file:
+            try:
+                header = pickle.load(file)
+                size   = file.tell()
+                while True:
+                    frames.append(pickle.load(file))
+                    size = file.tell()
+            except (EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+                pass
+
+        return header, frames, size
+
+
+    def start(self, names, start_date):
+        """
+        Prepares the checkpoint file for a rebalancing. If the file was written
+        by a rebalancing of the same strategies from the same date, returns the
+        state of its last checkpoint. Otherwise, a new file is started.
+
+        Parameters
+        ----------
+        names : list(str)
+            Names of the strategies.
+        start_date : datetime.date
+            Start date of the rebalancing.
+
+        Returns
+        -------
+        last_date : pd.Timestamp
+            Date of the last checkpoint (None if nothing to resume).
+        transactions : list(pd.Dataframe)
+            Transactions of every strategy at the last checkpoint.
+        states : list
+            States of every strategy at the last checkpoint.
+        """
+
+        header = {"names" : list(names), "start_date" : pd.Timestamp(start_date)}
+        saved, frames, size = self.read()
+
+        if saved != header or len(frames) == 0:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok = True)
+            with open(self.path, "wb") as file:
+                pickle.dump(header, file, protocol = pickle.HIGHEST_PROTOCOL)
+            self.lengths = [0] * len(names)
+            return None, None, None
+
+        # Drops an interrupted frame before appending new ones
+        with open(self.path, "r+b") as file:
+            file.truncate(size)
+
+        transactions = [pd.concat([frame["rows"][i] for frame in frames], ignore_index = True)
+                        for i in range(len(names))]
+        self.lengths = [len(x) for x in transactions]
+
+        return frames[-1]["date"], transactions, frames[-1]["states"]
+
+
+    def save(self, selection_date, transactions, states):
+        """
+        Appends a checkpoint containing the transactions added since the
+        previous one.
+
+        Parameters
+        ----------
+        selection_date : datetime.date
+            Last rebalancing date processed.
+        transactions : list(pd.Dataframe)
+            Transactions of every strategy.
+        states : list
+            States of every strategy.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        frame = {"date"   : pd.Timestamp(selection_date),
+                 "rows"   : [x.iloc[n:] for x, n in zip(transactions, self.lengths)],
+                 "states" : states}
+
+        with open(self.path, "ab") as file:
+            pickle.dump(frame, file, protocol = pickle.HIGHEST_PROTOCOL)
+            file.flush()
+            os.fsync(file.fileno())
+
+        self.lengths = [len(x) for x in transactions]
+
+
+    def clear(self):
+        """Deletes the checkpoint file."""
+        if os.path.isfile(self.path):
+            os.remove(self.path)
+        self.lengths = None
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Jun 26 10:48:19 2021
+
+This script contains the transaction cost models. A cost model computes the
+cost of every trade of a ledger at once, with array operations, as a fraction
+of the capital to subtract from the return of the strategy.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy` be installed within the Python environment
+you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * MarketData      - Market data of the traded symbols, loaded on first use.
+    * CostModel       - Base class of the cost models.
+    * ProportionalFee - Fees in % of the traded weight (broker fees).
+    * FixedFee        - Fixed amount per trade.
+    * VolumeSlippage  - Market impact depending on the traded volume.
+    * SpreadCost      - Half bid-ask spread, fixed or estimated (Roll).
+    * CompositeCost   - Sum of several cost models.
+    * positionCosts   - Costs of opening and closing every position of a ledger.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+import numpy as np
+
+
+class MarketData():
+    """Market data (bars x traded symbols) given to the cost models. Columns
+    are read from the DataManager on first use only, so that models which do
+    not need market data (ex: ProportionalFee) cost nothing.
+
+    Attributes
+    ----------
+    capital : float
+        Capital of the strategy, used to convert amounts into fractions.
+    start : int
+        First bar of the data (bars given to the models are relative to it).
+    """
+
+    def __init__(self, data_manager, symbols, capital = 1.0, start = 0):
+        self.data_manager = data_manager
+        self.symbols      = list(symbols)
+        self.capital      = capital
+        self.start        = start
+        self.columns      = {}
+
+
+    def __getitem__(self, column):
+        """Array (bars x symbols) of a column of the data (prices, volume, returns,
+        or open, high, low if the OHLC prices are loaded)."""
+        if column not in self.columns:
+            panel = self.data_manager.getPanel(column, self.symbols)
+            self.columns[column] = panel.iloc[self.start:].reindex(columns = self.symbols).to_numpy(dtype = float)
+        return self.columns[column]
+
+
+
+class CostModel():
+    """Base class of the cost models. A cost model computes the cost of many
+    trades at once.
+
+    Attributes
+    ----------
+    lookback : int
+        Number of bars before a trade needed to compute its cost.
+
+    Methods
+    -------
+    costs(symbol, bar, weight, fees_coeff, market)
+        Cost of every trade, in fraction of the capital.
+    """
+
+    lookback = 0
+
+
+    def costs(self, symbol, bar, weight, fees_coeff, market):
+        """
+        Cost of every trade.
+
+        Parameters
+        ----------
+        symbol : np.array
+            Position of the symbol of each trade in market.symbols.
+        bar : np.array
+            Bar of each trade (relative to market.start).
+        weight : np.array
+            Traded weight (fraction of the capital).
+        fees_coeff : np.array
+            Fees coefficient of each trade (see SelectionRules).
+        market : MarketData
+            Market data of the traded symbols.
+
+        Returns
+        -------
+        np.array
+            Cost of each trade, in fraction of the capital.
+        """
+
+        return np.zeros(len(weight))
+
+
+    def __add__(self, other):
+        return CompositeCost([self, other])
+
+
+
+class ProportionalFee(CostModel):
+    """Fees in % of the traded weight, multiplied by the fees coefficient of
+    the transaction (broker fees)."""
+
+    def __init__(self, rate = 0.0):
+        self.rate = rate
+
+
+    def costs(self, symbol, bar, weight, fees_coeff, market):
+        return self.rate * fees_coeff * np.abs(weight)
+
+
+
+class FixedFee(CostModel):
+    """Fixed amount per trade (in the currency of the capital)."""
+
+    def __init__(self, amount = 0.0):
+        self.amount = amount
+
+
+    def costs(self, symbol, bar, weight, fees_coeff, market):
+        return np.where(weight != 0, self.amount / market.capital, 0.0)
+
+
+
+class VolumeSlippage(CostModel):
+    """Market impact: the price moves against the trade by
+    coefficient * participation ** exponent, where participation is the traded
+    amount over the amount traded on the market during the previous bar
+    (capped at 1). The traded amount is computed on the capital."""
+
+    def __init__(self, coefficient = 0.1, exponent = 0.5):
+        self.coefficient = coefficient
+        self.exponent    = exponent
+        self.lookback    = 1
+
+
+    def costs(self, symbol, bar, weight, fees_coeff, market):
+        previous = np.maximum(bar - 1, 0)
+        traded   = market["volume"][previous, symbol] * market["prices"][previous, symbol]
+        amount   = np.abs(weight) * market.capital
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            participation = np.where(traded > 0, np.minimum(amount / traded, 1.0), 1.0)
+        return np.abs(weight) * self.coefficient * participation**self.exponent
+
+
+
+class SpreadCost(CostModel):
+    """Half of the bid-ask spread, paid on every trade. The spread is either
+    fixed, or estimated with the Roll estimator on the returns of the window
+    bars before the trade: 2 * sqrt(-cov(r(t), r(t-1))), 0 when the covariance
+    is positive."""
+
+    def __init__(self, spread = None, window = 20):
+        self.spread   = spread
+        self.window   = window
+        self.lookback = window + 1 if spread is None else 0
+
+
+    def costs(self, symbol, bar, weight, fees_coeff, market):
+        if self.spread is not None:
+            return np.abs(weight) * self.spread / 2
+
+        # Rolling sums of the traded symbols, read at the bars of the trades
+        returns  = np.nan_to_num(market["returns"])
+        x, y     = returns[1:], returns[:-1]
+        sums     = [np.vstack([np.zeros((1, returns.shape[1])), np.cumsum(z, axis = 0)]) for z in (x, y, x * y)]
+
+        last     = np.clip(bar - 1, 0, len(x))
+        first    = np.clip(last - self.window, 0, len(x))
+        n        = np.maximum(last - first, 1)
+        sx, sy, sxy = [(s[last, symbol] - s[first, symbol]) for s in sums]
+
+        covariance = sxy / n - sx * sy / n**2
+        spread     = 2 * np.sqrt(np.maximum(-covariance, 0))
+        return np.abs(weight) * spread / 2
+
+
+
+class CompositeCost(CostModel):
+    """Sum of several cost models."""
+
+    def __init__(self, models):
+        self.models   = list(models)
+        self.lookback = max([model.lookback for model in self.models] + [0])
+
+
+    def costs(self, symbol, bar, weight, fees_coeff, market):
+        return sum(model.costs(symbol, bar, weight, fees_coeff, market) for model in self.models)
+
+
+
+def positionCosts(events, model, market):
+    """
+    Costs of opening and closing every position of a ledger, in bulk.
+
+    Parameters
+    ----------
+    events : dict(np.array)
+        Positions, as returned by attribution.positionEvents.
+    model : CostModel
+        The cost model.
+    market : MarketData
+        Market data of events["symbols"].
+
+    Returns
+    -------
+    open_costs, close_costs : np.array
+        Cost of opening and of closing (0 if still open) every position.
+    """
+
+    n      = len(events["weight"])
+    legs   = model.costs(np.concatenate([events["symbol"], events["symbol"]]),
+                         np.concatenate([events["start"], events["end"]]) - market.start,
+                         np.concatenate([events["weight"], events["weight"]]),
+                         np.concatenate([events["fees_coeff"], events["close_fees_coeff"]]),
+                         market)
+    legs   = np.broadcast_to(legs, (2 * n,))
+
+    return legs[:n], np.where(events["closed"], legs[n:], 0.0)
@@ -21,25 +21,38 @@ This file can also be imported as a module and contains the following
 methods:
 
     * DataManager - Builds an environment to use data.
+    * LazyPanel   - Dictionnary of dataframes loading symbols on demand.
+    * yahooReader - Yahoo Finance reader (imported on first use).
     
 THIS FILE IS PROTECTED BY GNU General Public License v3.0
 ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
 """
 
 # Imports
+import numpy as np
+import os
 import pandas as pd
+from collections.abc import Mapping
 from datetime import date, timedelta 
-from pandas_datareader import data as pdr
-import yfinance as yf
 from tqdm import tqdm
 import sys
 from btengine.custom_errors import IncoherentDateRange, MissingColumn
+from btengine.framebuffer import FrameBuffer
+import btengine.my_utils as my_utils
+from btengine.profiler import Profiler
+from btengine.sharedpanel import SharedPanel
 
-# Override pandas datareader for compatibility issues
-yf.pdr_override()
+params = {"SymbolColumn" : "Symbol"}
 
+# Columns of the data dictionnary
+COLUMNS = ("returns", "volume", "prices")
 
-params = {"SymbolColumn" : "Symbol"}
+# Fields of the OHLC array (last axis of DataManager.ohlc)
+OHLC_FIELDS = ("open", "high", "low", "close")
+
+# Yahoo Finance intervals corresponding to pandas frequencies
+intervals = {"1min" : "1m", "2min" : "2m", "5min" : "5m", "15min" : "15m", "30min" : "30m",
+             "1H" : "1h", "1h" : "1h", "1D" : "1d", "D" : "1d"}
 
 
 class DataManager():
@@ -48,11 +61,54 @@ class DataManager():
     Attributes
     ----------
     quotes : list
-        List of strings corresponding to Tickers
+        List of strings corresponding to Tickers. The position of a symbol in
+        quotes is its integer code (see symbolType)
         
     data : dict(DataFrame)
         Dictionnary containing dataframes of financial data
         
+    frequency : str
+        Pandas frequency string of the bars (ex: "1D", "1H", "1min"). 
+        Default: "1D"
+        
+    days_per_year : int
+        Number of trading days in a year, 365 for assets traded 24/7.
+        Default: 252
+        
+    bars_per_year : float
+        Number of bars in a year, used for annualization
+        
+    profiler : Profiler
+        Profiler timing the loading (disabled by default)
+        
+    lazy : boolean
+        If True, only a metadata pass (dates and volumes) is made at 
+        initialization and the symbols are loaded on first access (see
+        LazyPanel and getPanel). Default: False
+        
+    metadata : pd.DataFrame
+        First and last dates, number of bars and total volume of every symbol
+        (lazy mode only)
+        
+    membership : dict
+        Point-in-time membership index: packed bitmap (bars x symbols / 8) of
+        the bars with a valid price, built on first use (see universeAt)
+        
+    shared : SharedPanel
+        Shared memory holding the data once published (see share)
+        
+    dtype : np.dtype
+        Floating type of the panels (returns, volume, prices). float32 halves
+        the memory and the bandwidth of the indicators and of the simulations
+        for large sweeps; accumulations (cumulative returns, equity curves) 
+        are still computed in float64. Default: float64
+        
+    ohlc : np.array
+        Adjusted open, high, low and close prices (dates x symbols x 
+        OHLC_FIELDS), aligned on the dates and symbols of the data, in dtype.
+        Loaded only if requested (see execution.ExecutionRules), None 
+        otherwise. Not available in lazy mode, nor for appended bars.
+        
     Returns
     -------
     quotes.Symbol.to_list() : list[string]
@@ -69,17 +125,129 @@ class DataManager():
                  feed_start     = date.today() - timedelta(365) * 10,
                  feed_end       = date.today(),
                  returns_folder = "../data/financial/",
-                 verbose        = True
+                 verbose        = True,
+                 frequency      = "1D",
+                 days_per_year  = 252,
+                 profiler       = None,
+                 lazy           = False,
+                 dtype          = "float64",
+                 ohlc           = False
                  ):
         
-        self.quotes = self.getQuotes(quotes_file)
+        self.profiler      = profiler if profiler is not None else Profiler(enabled = False)
+        self.quotes        = self.getQuotes(quotes_file)
+        self.frequency     = frequency
+        self.days_per_year = days_per_year
+        self.bars_per_year = my_utils.barsPerYear(frequency, days_per_year)
+        self.buffers       = None
+        self.lazy          = lazy
+        self.metadata      = None
+        self.membership    = None
+        self.shared        = None
+        self.dtype         = np.dtype(dtype)
+        self.ohlc          = None
+        
+        if self.dtype.kind != "f":
+            raise ValueError("[-] The dtype of the data must be a floating type, got " + str(self.dtype) + ".")
+        if lazy and ohlc:
+            raise ValueError("[-] OHLC prices are not available in lazy mode.")
         
         # Updating Data        
         if update_data:
-            for quote in self.quotes:
-                self.getData(quote, feed_start, feed_end)
+            with self.profiler.phase("DataManager.getData"):
+                for quote in self.quotes:
+                    self.getData(quote, feed_start, feed_end)
 
-        self.data   = self.load(self.quotes, returns_folder)
+        with self.profiler.phase("DataManager.load"):
+            if lazy:
+                self.metadata, self.calendar, self.dates = self.loadMetadata(self.quotes, returns_folder)
+                self.data   = LazyPanel(self, returns_folder)
+            else:
+                self.data   = self.load(self.quotes, returns_folder, ohlc = ohlc)
+        
+    def share(self):
+        """Publishes the data into shared memory, so that worker processes can
+        use it without copy. The data of this DataManager becomes a view on
+        the shared memory. Once shared, a DataManager (or a strategy holding 
+        it) sent to a worker process is pickled as a small handle and attached
+        to the shared memory in the worker.
+        
+        Returns
+        -------
+        handle : dict
+            Handle to give to DataManager.attach in the workers.
+        """
+        
+        if self.shared is None:
+            with self.profiler.phase("DataManager.share"):
+                self.shared  = SharedPanel.publish({column : self.data[column] for column in COLUMNS}, self.dtype)
+                self.data    = self.shared.data
+                self.buffers = None
+        return self.handle()
+    
+    
+    def handle(self):
+        """Handle of the shared data (see share)."""
+        return {"panel"         : self.shared.handle,
+                "quotes"        : self.quotes,
+                "frequency"     : self.frequency,
+                "days_per_year" : self.days_per_year,
+                "dtype"         : self.dtype.str}
+    
+    
+    @classmethod
+    def attach(cls, handle, profiler = None):
+        """Builds a DataManager viewing data shared by another process.
+        
+        Parameters
+        ----------
+        handle : dict
+            Handle returned by share.
+        profiler : Profiler, optional
+            Profiler of the worker (Default: None, disabled).
+        """
+        
+        data_manager = cls.__new__(cls)
+        data_manager.__setstate__({"profiler" : profiler if profiler is not None else Profiler(enabled = False),
+                                   "shared"   : handle})
+        return data_manager
+    
+    
+    def unshare(self):
+        """Copies the shared data back into the memory of this process and 
+        frees the shared memory (to be called once the workers are done)."""
+        if self.shared is not None:
+            self.data   = {column : x.copy() for column, x in self.data.items()}
+            owner, self.shared = self.shared, None
+            owner.close()
+    
+    
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        if self.shared is not None:
+            # Workers attach to the shared memory instead of receiving the data
+            state.update({"shared" : self.handle(), "data" : None, "buffers" : None})
+        return state
+    
+    
+    def __setstate__(self, state):
+        if isinstance(state.get("shared"), dict):
+            handle = state["shared"]
+            state  = dict(state)
+            state.update({"quotes"        : handle["quotes"],
+                          "frequency"     : handle["frequency"],
+                          "days_per_year" : handle["days_per_year"],
+                          "bars_per_year" : my_utils.barsPerYear(handle["frequency"], handle["days_per_year"]),
+                          "dtype"         : np.dtype(handle["dtype"]),
+                          "shared"        : SharedPanel.attach(handle["panel"]),
+                          "buffers"       : None})
+            state.setdefault("lazy", False)
+            state.setdefault("metadata", None)
+            state.setdefault("membership", None)
+            state.setdefault("ohlc", None)
+            state["data"] = state["shared"].data
+        self.__dict__.update(state)
+        
         
     def getQuotes(self, file = "../data/named/quotes.csv"):
         """Get tickers from a csv file.
@@ -137,7 +305,8 @@ class DataManager():
             raise IncoherentDateRange(start, end)
         
         try:
-            data = pdr.get_data_yahoo(quote, start = start, end = end)
+            data = yahooReader().get_data_yahoo(quote, start = start, end = end, 
+                                                interval = intervals.get(self.frequency, "1d"))
             data.to_csv(folder + quote + ".csv")
         except:
             print("Unexpected error for quote" , quote, ":", sys.exc_info()[0])
@@ -145,7 +314,60 @@ class DataManager():
         
         
         
-    def load(self, quotes, folder = "../data/financial/", verbose = False):
+    def readQuote(self, quote, folder = "../data/financial/", ohlc = False):
+        """Reads the file of a quote; drops NAs and duplicated rows.
+        
+        Parameters
+        ----------
+        quote : string
+            The quote
+        folder : string
+            Folder inwhich all returns files are contained.
+        ohlc : boolean, optional
+            Whether to also return the OHLC prices (Default: False).
+            
+        Returns
+        -------
+        volume, prices, returns : pd.Series
+            Volume, adjusted close and percent change of the quote, named 
+            after the quote.
+        bars : pd.Dataframe
+            Open, high, low and close prices (OHLC_FIELDS), adjusted with the
+            ratio of the adjusted close to the close (ohlc only).
+        """
+        
+        x = pd.read_csv(folder + quote.strip() + ".csv")
+        x = x.dropna()
+        
+        # Daily files have a Date column, intraday files a Datetime column
+        x.index = pd.to_datetime(x["Date" if "Date" in x.columns else "Datetime"], utc = True).dt.tz_localize(None)
+        x = x[~x.index.duplicated(keep='last')]
+        
+        # Volume
+        volume         = x['Volume']
+        volume.name    = quote
+                
+        # Prices
+        price_close      = x["Adj Close"]
+        price_close.name = quote
+        
+        # Returns
+        close           = x["Adj Close"].pct_change()
+        close.name      = quote
+        close.iloc[0]   = 0.0
+        
+        if ohlc:
+            factor = x["Adj Close"] / x["Close"]
+            bars   = pd.DataFrame({"open"  : x["Open"] * factor,
+                                   "high"  : x["High"] * factor,
+                                   "low"   : x["Low"] * factor,
+                                   "close" : x["Adj Close"]})
+            return volume, price_close, close, bars
+        
+        return volume, price_close, close
+    
+    
+    def load(self, quotes, folder = "../data/financial/", verbose = False, ohlc = False):
         """Load return files; drop NAs, remove duplicated rows, set Date as the index
         and converts it to percent change.
         /!\ Keep in mind: Those are day-to-day percent change, NOT CUMULATIVE RETURNS.
@@ -158,6 +380,8 @@ class DataManager():
             Folder inwhich all returns files are contained.
         verbose : boolean
             Errors printing (T/F).
+        ohlc : boolean
+            Whether to also load the OHLC prices into self.ohlc.
             
         Returns
         -------
@@ -165,56 +389,222 @@ class DataManager():
             Dictionnary of dataframes containing financial datapoints.
         """
         
-        data = {'returns' : pd.DataFrame(), 'volume' : pd.DataFrame(), 'prices' : pd.DataFrame()}
+        columns = {'returns' : [], 'volume' : [], 'prices' : []}
+        fields  = {field : [] for field in OHLC_FIELDS}
         
         for quote in tqdm(quotes):
             
             try:
-                x = pd.read_csv(folder + quote.strip() + ".csv")
-                x = x.dropna()
-                x = x[~x.index.duplicated(keep='last')]
-                x.index = x.Date
-                
-                # Volume
-                volume         = x['Volume']
-                volume.name    = quote
-                data['volume'] = pd.merge(data['volume'], volume, how='outer', 
-                       left_index=True, 
-                       right_index = True)
-                            
-                        
-                # Prices
-                price_close      = x["Adj Close"]
-                price_close.name = quote
-                data['prices'] = pd.merge(data['prices'], price_close, how='outer', 
-                                   left_index=True, 
-                                   right_index = True)
-                
-                # Returns
-                close           = x["Adj Close"].pct_change()
-                close.name      = quote
-                data['returns'] = pd.merge(data['returns'], close, how='outer', 
-                                   left_index=True, 
-                                   right_index = True)
-                
-                data['returns'][quote].iloc[0] = 0.0
+                series = self.readQuote(quote, folder, ohlc)
+                columns['volume'].append(series[0])
+                columns['prices'].append(series[1])
+                columns['returns'].append(series[2])
+                for field in fields if ohlc else ():
+                    fields[field].append(series[3][field].rename(quote))
                 
             except:
                 if verbose:
                     print("[-] Error for", quote, "the table will not be loaded.")
                 pass
         
-        data['returns'].fillna(0, inplace=True)
-        data['volume'].fillna(0, inplace=True)
-        data['prices'].fillna(method="backfill")
+        data = alignColumns(columns, dtype = self.dtype)
         
-        data['returns'].index = pd.to_datetime(data['returns'].index)  
-        data['volume'].index = pd.to_datetime(data['volume'].index)
-        data['prices'].index = pd.to_datetime(data['prices'].index)
+        if ohlc:
+            # One array (dates x symbols x fields): the fields of a bar are contiguous
+            index     = data["prices"].index
+            self.ohlc = np.stack([pd.concat(fields[field], axis = 1).reindex(index = index, columns = data["prices"].columns)
+                                  .to_numpy(dtype = self.dtype) for field in OHLC_FIELDS], axis = -1)
         
         return data
-
-
+    
+    
+    def loadMetadata(self, quotes, folder = "../data/financial/"):
+        """Metadata pass: reads only the dates and volumes of the quotes. The
+        results are cached in <folder>.metadata.pkl, and a file is only read 
+        again when it has been modified.
+        
+        Parameters
+        ----------
+        quotes : string
+            The list of quotes
+        folder : string
+            Folder inwhich all returns files are contained.
+            
+        Returns
+        -------
+        metadata : pd.DataFrame
+            First and last dates, number of bars and total volume of every quote.
+        calendar : pd.DatetimeIndex
+            Dates of all the quotes (index of the data).
+        dates : dict(np.array)
+            Dates with a valid price of every quote.
+        """
+        
+        cache_file = folder + ".metadata.pkl"
+        cache      = pd.read_pickle(cache_file) if os.path.isfile(cache_file) else {}
+        updated    = False
+        
+        for quote in quotes:
+            try:
+                stat = os.stat(folder + quote.strip() + ".csv")
+                key  = (stat.st_mtime_ns, stat.st_size)
+                if quote in cache and cache[quote]["key"] == key:
+                    continue
+                
+                x = pd.read_csv(folder + quote.strip() + ".csv", 
+                                usecols = lambda column: column in ("Date", "Datetime", "Adj Close", "Volume")).dropna()
+                x.index = pd.to_datetime(x["Date" if "Date" in x.columns else "Datetime"], utc = True).dt.tz_localize(None)
+                x = x[~x.index.duplicated(keep='last')]
+                
+                cache[quote] = {"key" : key, "dates" : x.index.values, "volume" : float(x["Volume"].sum())}
+                updated      = True
+            except:
+                cache.pop(quote, None)
+        
+        if updated:
+            pd.to_pickle(cache, cache_file)
+        
+        quotes   = [x for x in quotes if x in cache and len(cache[x]["dates"]) > 0]
+        calendar = pd.DatetimeIndex(np.unique(np.concatenate([cache[x]["dates"] for x in quotes])) if len(quotes) > 0 else [],
+                                    name = "Date")
+        metadata = pd.DataFrame({"first_date" : [cache[x]["dates"].min() for x in quotes],
+                                 "last_date"  : [cache[x]["dates"].max() for x in quotes],
+                                 "bars"       : [len(cache[x]["dates"]) for x in quotes],
+                                 "volume"     : [cache[x]["volume"] for x in quotes]}, index = quotes)
+        
+        return metadata, calendar, {x : cache[x]["dates"] for x in quotes}
+    
+    
+    @property
+    def index(self):
+        """Dates of the data (all columns share the same dates)."""
+        if isinstance(self.data, LazyPanel) and not self.data.complete:
+            return self.calendar
+        return self.data["returns"].index
+    
+    
+    def getPanel(self, column, symbols):
+        """Dataframe of a column containing at least the given symbols. In lazy
+        mode, only these symbols are loaded.
+        
+        Parameters
+        ----------
+        column : string
+            String indicating which data dictionnary entry to work with.
+        symbols : list
+            Symbols needed.
+        """
+        if column in OHLC_FIELDS:
+            if self.ohlc is None:
+                raise MissingColumn(column)
+            # View on the OHLC array, without copy
+            return pd.DataFrame(self.ohlc[:, :, OHLC_FIELDS.index(column)], index = self.index,
+                                columns = self.data["prices"].columns, copy = False)
+        if isinstance(self.data, LazyPanel) and not self.data.complete:
+            return self.data.panel(symbols)[column]
+        return self.data[column]
+    
+    
+    def symbolType(self):
+        """Categorical type interning the symbols: the code of a symbol is its 
+        position in quotes, unchanged when new symbols are appended. The 
+        ledgers store their symbols in this type (see 
+        selectionrules.newTransactions)."""
+        return pd.CategoricalDtype(pd.unique(pd.Series(self.quotes, dtype = object)))
+    
+    
+    def symbolCodes(self, symbols):
+        """Integer codes of symbols (-1 for unknown symbols)."""
+        return pd.Categorical(symbols, dtype = self.symbolType()).codes.astype(np.int64)
+    
+    
+    def symbolNames(self, codes):
+        """Symbols of integer codes."""
+        return self.symbolType().categories[np.asarray(codes)]
+    
+    
+    def averageVolume(self):
+        """Average volume of every symbol over all the dates (0 when a symbol 
+        is not traded). Computed from the metadata in lazy mode."""
+        if isinstance(self.data, LazyPanel) and not self.data.complete:
+            return self.metadata["volume"] / max(len(self.calendar), 1)
+        return self.data["volume"].mean(axis = 0)
+        
+        
+    def append(self, prices, volume = None):
+        """Appends new bars (ex: from a live or a replay feed). Returns are 
+        computed from the last known price of each symbol, as in load. The data
+        is kept in growable buffers, so that appending a bar does not copy the
+        history. Bars older than the last known bar are ignored; new symbols
+        are added. Feeds have no OHLC prices: self.ohlc is dropped.
+        
+        Parameters
+        ----------
+        prices : pd.Dataframe
+            Adjusted close prices of the new bars (dates x symbols).
+        volume : pd.Dataframe, optional
+            Volumes of the new bars (Default: None, volumes set to 0).
+            
+        Returns
+        -------
+        index : pd.DatetimeIndex
+            Dates of the bars appended.
+        """
+        
+        with self.profiler.phase("DataManager.append"):
+            if self.buffers is None:
+                self.buffers     = {column : FrameBuffer(self.data[column], dtype = self.dtype) 
+                                    for column in ("prices", "volume", "returns")}
+                self.last_prices = self.data["prices"].ffill().iloc[-1:].to_numpy(dtype = float).reshape(-1)
+                if len(self.last_prices) == 0:
+                    self.last_prices = np.full(len(self.data["prices"].columns), np.nan)
+            
+            prices = prices.set_axis(my_utils.toNaiveIndex(prices.index), axis = 0).sort_index()
+            if self.buffers["prices"].n > 0:
+                prices = prices[prices.index > self.data["prices"].index[-1]]
+            if prices.empty:
+                return prices.index
+            
+            # New symbols
+            new = [x for x in prices.columns if x not in self.buffers["prices"].columns]
+            if len(new) > 0:
+                self.buffers["prices"].addColumns(new, np.nan)
+                self.buffers["volume"].addColumns(new, 0.0)
+                self.buffers["returns"].addColumns(new, 0.0)
+                self.last_prices = np.append(self.last_prices, np.full(len(new), np.nan))
+                self.quotes      = self.quotes + new
+            
+            columns  = self.buffers["prices"].columns
+            values   = prices.reindex(columns = columns).to_numpy(dtype = float)
+            
+            # Returns from the last known price (0 for the first price of a symbol)
+            previous = pd.DataFrame(np.vstack([self.last_prices, values])).ffill().to_numpy()
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                returns = values / previous[:-1] - 1
+            returns[~np.isfinite(returns)] = 0.0
+            self.last_prices = previous[-1]
+            
+            if volume is not None:
+                volume = volume.set_axis(my_utils.toNaiveIndex(volume.index), axis = 0)
+                volume = volume.reindex(index = prices.index, columns = columns).fillna(0).to_numpy(dtype = float)
+            else:
+                volume = np.zeros(values.shape)
+            
+            self.buffers["prices"].append(prices.index, values)
+            self.buffers["volume"].append(prices.index, volume)
+            self.buffers["returns"].append(prices.index, returns)
+            self.data = {column : buffer.frame for column, buffer in self.buffers.items()}
+            self.ohlc = None
+            
+            # Membership of the new bars
+            if self.membership is not None and len(new) == 0:
+                self.membership["bits"] = np.vstack([self.membership["bits"], np.packbits(np.isfinite(values), axis = 1)])
+            else:
+                self.membership = None
+            
+        return prices.index
+    
+    
     def getTimeFrame(self, column, start, end = date.today()):
         """Computes cumulative returns between two dates (both start and end are
         included).
@@ -244,7 +634,146 @@ class DataManager():
             
         x = self.data[column]
         
-        return x[(x.index.date >= start) & (x.index.date <= end)]
+        return x.iloc[self.barIndex(start, column = column):self.barIndex(end, True, column)]
+    
+    
+    def barIndex(self, x, end = False, column = "returns"):
+        """Integer position of the first bar at or after a date. If the date is
+        the end (included) of a period, position of the first bar after it.
+        
+        Parameters
+        ----------
+        x : datetime.date or datetime.datetime
+            The date.
+        end : boolean, optional
+            Whether x is the end of a period (Default: False)
+        column : string, optional
+            String indicating which data dictionnary entry to work with (all
+            columns share the same dates).
+        """
+        return self.index.searchsorted(my_utils.toTimestamp(x, end))
+    
+    
+    def rebalanceDates(self, start, end):
+        """Dates at which strategies are rebalanced between two dates (both 
+        included): every day for daily bars, every bar otherwise.
+        
+        Parameters
+        ----------
+        start : datetime.date
+            Date of the first rebalancing.
+        end : datetime.date
+            Date of the last rebalancing.
+        """
+        if my_utils.isDaily(self.frequency):
+            return my_utils.daterange(start, end + timedelta(1))
+        
+        return self.index[self.barIndex(start):self.barIndex(end, True)]
+    
+    
+    def membershipIndex(self):
+        """Point-in-time membership index: packed bitmap (one row per bar, one
+        bit per symbol) of the bars with a valid price. A symbol is listed on 
+        its first valid bar, delisted after its last one, and missing on the 
+        bars without price in between. Built on first use, rebuilt if the
+        dates or symbols change.
+        
+        Returns
+        -------
+        membership : dict
+            bits (np.array of uint8, bars x ceil(symbols / 8)) and symbols 
+            (pd.Index).
+        """
+        
+        index = self.index
+        if self.membership is not None and len(self.membership["bits"]) == len(index):
+            return self.membership
+        
+        if isinstance(self.data, LazyPanel) and not self.data.complete:
+            # From the metadata, without loading the symbols
+            symbols = pd.Index(list(self.dates.keys()))
+            valid   = np.zeros((len(index), len(symbols)), dtype = bool)
+            for j, quote in enumerate(symbols):
+                valid[index.searchsorted(self.dates[quote]), j] = True
+        else:
+            symbols = self.data["prices"].columns
+            valid   = self.data["prices"].notnull().to_numpy()
+        
+        self.membership = {"bits" : np.packbits(valid, axis = 1), "symbols" : symbols}
+        return self.membership
+    
+    
+    def universeAt(self, x):
+        """Symbols tradable at a date, i.e. with a valid price on the last bar
+        at or before the date. Costs one row of the membership index.
+        
+        Parameters
+        ----------
+        x : datetime.date or datetime.datetime
+            The date.
+            
+        Returns
+        -------
+        pd.Index
+            The tradable symbols.
+        """
+        
+        membership = self.membershipIndex()
+        bar        = self.barIndex(x, True) - 1
+        if bar < 0:
+            return membership["symbols"][:0]
+        
+        valid = np.unpackbits(membership["bits"][bar], count = len(membership["symbols"])).astype(bool)
+        return membership["symbols"][valid]
+    
+    
+    def listings(self):
+        """First and last dates with a valid price, number of bars with a valid
+        price and number of missing bars in between, for every symbol."""
+        
+        membership = self.membershipIndex()
+        valid      = np.unpackbits(membership["bits"], axis = 1, count = len(membership["symbols"])).astype(bool)
+        listed     = valid.any(axis = 0)
+        first      = np.where(listed, valid.argmax(axis = 0), 0)
+        last       = np.where(listed, len(valid) - 1 - valid[::-1].argmax(axis = 0), 0)
+        bars       = valid.sum(axis = 0)
+        
+        return pd.DataFrame({"first_date" : self.index[first].where(listed),
+                             "last_date"  : self.index[last].where(listed),
+                             "bars"       : bars,
+                             "missing"    : np.where(listed, last - first + 1 - bars, 0)}, 
+                            index = membership["symbols"])
+    
+    
+    def resample(self, frequency):
+        """Converts the bars to a lower frequency: last price, total volume and
+        compounded returns of each period (and first open, highest high, lowest
+        low and last close of the OHLC prices). Periods without any price are dropped.
+        
+        Parameters
+        ----------
+        frequency : str
+            Pandas frequency string of the new bars (ex: "1H", "1D")
+        """
+        prices  = self.data["prices"].resample(frequency).last()
+        keep    = prices.notnull().any(axis = 1)
+        
+        if self.ohlc is not None:
+            # First open, highest high, lowest low and last close of each period
+            frames    = [pd.DataFrame(self.ohlc[:, :, i], index = self.index).resample(frequency) 
+                         for i in range(len(OHLC_FIELDS))]
+            self.ohlc = np.stack([getattr(frame, how)().to_numpy(dtype = self.dtype)[keep.to_numpy()]
+                                  for frame, how in zip(frames, ("first", "max", "min", "last"))], axis = -1)
+        
+        # Sums and products are accumulated in float64
+        self.data = {"prices"  : prices[keep],
+                     "volume"  : self.data["volume"].astype(float).resample(frequency).sum()[keep],
+                     "returns" : ((1 + self.data["returns"].astype(float)).resample(frequency).prod() - 1)[keep]}
+        self.data = {column : x.astype(self.dtype, copy = False) for column, x in self.data.items()}
+        
+        self.frequency     = frequency
+        self.bars_per_year = my_utils.barsPerYear(frequency, self.days_per_year)
+        return self.data
     
     
     def getCumulativeReturns(self, start, end = date.today()):
@@ -269,11 +798,139 @@ class DataManager():
         if start > end:
             raise IncoherentDateRange(start, end)
         
-        return self.getTimeFrame("returns", start, end).apply(lambda x: (1 + x).cumprod())
+        # Accumulated in float64 whatever the dtype of the data
+        return self.getTimeFrame("returns", start, end).astype(float).apply(lambda x: (1 + x).cumprod())
         
 
+
+
+
+def yahooReader():
+    """pandas datareader, with Yahoo Finance overridden by yfinance for 
+    compatibility issues. Both are slow to import and only needed to download
+    data, so they are imported on first use.
+    
+    Returns
+    -------
+    module
+        pandas_datareader.data
+    """
+    
+    from pandas_datareader import data as pdr
+    import yfinance as yf
+    
+    yf.pdr_override()
+    return pdr
+
+
+def alignColumns(columns, index = None, dtype = float):
+    """Aligns the series of every symbol on the same dates.
+    
+    Parameters
+    ----------
+    columns : dict(list(pd.Series))
+        Series of every symbol, for each column of the data.
+    index : pd.DatetimeIndex, optional
+        Dates of the data (Default: None, union of the dates of the series).
+    dtype : np.dtype, optional
+        Floating type of the dataframes (Default: float64).
+        
+    Returns
+    -------
+    data : dict(Dataframe[Date.datetime, float])
+        Dictionnary of dataframes containing financial datapoints.
+    """
+    
+    data = {}
+    for column in columns:
+        data[column] = pd.concat(columns[column], axis = 1).sort_index() if len(columns[column]) > 0 else pd.DataFrame()
+        if index is not None:
+            data[column] = data[column].reindex(index)
+        data[column].index = pd.to_datetime(data[column].index)
+        data[column].index.name = "Date"
+    
+    data['returns'].fillna(0, inplace=True)
+    data['volume'].fillna(0, inplace=True)
+    
+    return {column : x.astype(dtype, copy = False) for column, x in data.items()}
+
+
+
+class LazyPanel(Mapping):
+    """Dictionnary of dataframes (returns, volume, prices) of a lazy 
+    DataManager. Accessing a column loads every symbol at once, as a regular
+    DataManager would. panel(symbols) only loads the given symbols, aligned on
+    the dates of the DataManager.
+    
+    Attributes
+    ----------
+    data_manager : DataManager
+        The lazy DataManager.
+    folder : string
+        Folder inwhich all returns files are contained.
+    complete : boolean
+        Whether every symbol has been loaded.
+    """
+    
+    def __init__(self, data_manager, folder):
+        self.data_manager = data_manager
+        self.folder       = folder
+        self.series       = {}
+        self.frames       = None
+        self.complete     = False
+        
+    
+    def __getitem__(self, column):
+        if column not in COLUMNS:
+            raise KeyError(column)
+        if not self.complete:
+            self.frames   = self.panel(self.data_manager.quotes)
+            self.series   = {}
+            self.complete = True
+        return self.frames[column]
+    
+    
+    def __iter__(self):
+        return iter(COLUMNS)
+    
+    
+    def __len__(self):
+        return len(COLUMNS)
     
     
+    def panel(self, symbols):
+        """
+        Loads the given symbols (if not loaded yet).
+
+        Parameters
+        ----------
+        symbols : list
+            Symbols to load.
+
+        Returns
+        -------
+        dict(pd.Dataframe)
+            Columns of the data for these symbols only.
+        """
+        
+        if self.complete:
+            return {column : self.frames[column][[x for x in symbols if x in self.frames[column].columns]] 
+                    for column in COLUMNS}
+        
+        with self.data_manager.profiler.phase("LazyPanel.load"):
+            for quote in symbols:
+                if quote not in self.series:
+                    try:
+                        self.series[quote] = self.data_manager.readQuote(quote, self.folder)
+                    except:
+                        self.series[quote] = None
+        
+        loaded = [self.series[x] for x in symbols if self.series.get(x) is not None]
+        return alignColumns({"volume"  : [x[0] for x in loaded],
+                             "prices"  : [x[1] for x in loaded],
+                             "returns" : [x[2] for x in loaded]}, self.data_manager.calendar, self.data_manager.dtype)
+        
+    
 # Use example
 if __name__ == "__main__":
     dm = DataManager()
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Jun 27 11:20:42 2021
+
+This script contains ExecutionRules class, used to execute the positions of a
+ledger against the OHLC bars of the data (fills at the open, limit orders,
+stop-loss and take-profit) instead of the closes.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy`, `pandas` be installed within the Python
+environment you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * ExecutionRules - Fills of the positions against the OHLC bars.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+import numpy as np
+import pandas as pd
+
+
+class ExecutionRules():
+    """Execution of the positions against the OHLC bars of the data (requires
+    DataManager(ohlc = True)). By default, a position opened (or closed) at a
+    date is filled at the close of the previous bar, and holds the close to
+    close returns of the bars in between. Execution rules change the prices
+    and the bars of the fills:
+
+        - fill = "open": positions are opened and closed at the open of the
+          bar of the date of the transaction.
+        - limit: buy limit order at limit (%) below the previous close, valid
+          for limit_bars bars. The position is filled at the first bar whose
+          low reaches the limit (at the open if it opened below), or never.
+        - stop_loss / take_profit: the position is closed at the first bar
+          whose low (high) reaches the entry price minus stop_loss (plus
+          take_profit) %, at this price (or at the open if it opened beyond).
+          If both are reached on the same bar, the stop-loss is assumed first.
+
+    Every rule is evaluated in bulk, on the (position, bar) pairs of all the
+    positions at once. The fills change the first and last bars held and the
+    returns of these bars only (see attribution.streamReturns); when a price
+    is missing, the close to close return is kept.
+
+    Attributes
+    ----------
+    fill : str
+        "close" or "open".
+    stop_loss : float
+        Stop-loss in % of the entry price (None: no stop).
+    take_profit : float
+        Take-profit in % of the entry price (None: none).
+    limit : float
+        Limit of the buy orders in % below the previous close (None: market orders).
+    limit_bars : int
+        Number of bars a limit order is valid.
+
+    Methods
+    -------
+    apply(events, market)
+        Executes the positions of a ledger.
+    """
+
+    def __init__(self, fill = "close", stop_loss = None, take_profit = None, limit = None, limit_bars = 1):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        fill : str, optional
+            Price of the fills: "close" (of the previous bar) or "open". The default is "close".
+        stop_loss : float, optional
+            Stop-loss in % of the entry price (scale 0-1). The default is None.
+        take_profit : float, optional
+            Take-profit in % of the entry price (scale 0-1). The default is None.
+        limit : float, optional
+            Limit of the buy orders in % below the previous close (scale 0-1). The default is None.
+        limit_bars : int, optional
+            Number of bars a limit order is valid. The default is 1.
+
+        Raises
+        ------
+        ValueError
+            If fill is unknown.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        if fill not in ("close", "open"):
+            raise ValueError("[-] Unknown fill " + str(fill) + ", expected 'close' or 'open'.")
+
+        self.fill        = fill
+        self.stop_loss   = stop_loss
+        self.take_profit = take_profit
+        self.limit       = limit
+        self.limit_bars  = limit_bars
+
+
+    def apply(self, events, market):
+        """
+        Executes the positions of a ledger.
+
+        Parameters
+        ----------
+        events : dict(np.array)
+            Positions, as returned by attribution.positionEvents.
+        market : costmodels.MarketData
+            Market data of events["symbols"] (prices, returns, open, high, low).
+
+        Returns
+        -------
+        events : dict(np.array)
+            Positions filled, with their first and last bars held and the
+            corrections of the returns of these bars (entry_adjustment and
+            exit_adjustment, in fraction of the capital).
+        fills : pd.Dataframe
+            Fill of every position: entry and exit dates and prices, and the
+            reason of the exit (CLOSE, STOP_LOSS, TAKE_PROFIT, or empty while
+            the position is open). Positions whose limit order was not filled
+            have no entry.
+        """
+
+        close, opening   = market["prices"], market["open"]
+        symbol, weight   = events["symbol"], events["weight"]
+        first, end       = events["start"] - market.start, events["end"] - market.start
+        n, count         = len(close), len(weight)
+
+        previous = np.where(first > 0, close[np.maximum(first - 1, 0), symbol], np.nan)
+
+        # Entry: previous close, open, or limit order
+        filled   = np.ones(count, dtype = bool)
+        entry    = opening[first, symbol] if self.fill == "open" else previous
+        if self.limit is not None:
+            limit         = previous * (1 - self.limit)
+            pos, bar      = _pairs(first, np.minimum(first + self.limit_bars, end))
+            filled, first = _first(pos, bar, market["low"][bar, symbol[pos]] <= limit[pos], first)
+            entry         = np.fmin(opening[first, symbol], limit)
+
+        # Scheduled exit: close of the last bar held, or open of the next bar
+        closed   = events["closed"].copy()
+        last     = end - 1
+        exit     = close[last, symbol]
+        if self.fill == "open":
+            later = closed & (end < n)
+            last  = np.where(later, end, last)
+            exit  = np.where(later, opening[np.minimum(end, n - 1), symbol], exit)
+        reason   = np.where(closed, "CLOSE", "").astype(object)
+
+        # Stop-loss and take-profit, on the bars fully held
+        if self.stop_loss is not None or self.take_profit is not None:
+            stop     = entry * (1 - self.stop_loss) if self.stop_loss is not None else np.full(count, np.nan)
+            take     = entry * (1 + self.take_profit) if self.take_profit is not None else np.full(count, np.nan)
+            pos, bar = _pairs(first, np.where(filled, end, first))
+            low      = market["low"][bar, symbol[pos]] <= stop[pos]
+            high     = market["high"][bar, symbol[pos]] >= take[pos]
+            hit, at  = _first(pos, bar, low | high, last)
+
+            # The stop (take) price, or the open when the bar opened beyond it
+            p        = np.flatnonzero(hit)
+            at       = at[p]
+            gap      = (at > first[p]) | (self.fill == "close" and self.limit is None)
+            on_stop  = market["low"][at, symbol[p]] <= stop[p]
+            price    = np.where(on_stop,
+                                np.where(gap, np.fmin(opening[at, symbol[p]], stop[p]), stop[p]),
+                                np.where(gap, np.fmax(opening[at, symbol[p]], take[p]), take[p]))
+
+            last[p], exit[p], closed[p] = at, price, True
+            reason[p] = np.where(on_stop, "STOP_LOSS", "TAKE_PROFIT")
+
+        # Returns of the first and last bars held, instead of close to close
+        returns  = market["returns"]
+        single   = last == first
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            entry_return = np.where(single, exit / entry, close[first, symbol] / entry) - 1
+            exit_return  = exit / close[np.maximum(last - 1, 0), symbol] - 1
+        entry_adjustment = np.nan_to_num(weight * (entry_return - returns[first, symbol]), nan = 0.0, posinf = 0.0, neginf = 0.0)
+        exit_adjustment  = np.nan_to_num(weight * (exit_return - returns[last, symbol]), nan = 0.0, posinf = 0.0, neginf = 0.0)
+        exit_adjustment  = np.where(single | ~closed, 0.0, exit_adjustment)
+
+        dates    = market.data_manager.index[market.start:]
+        fills    = pd.DataFrame({"TR_POS"      : events["id"],
+                                 "symbol"      : events["symbols"][symbol],
+                                 "filled"      : filled,
+                                 "entry_date"  : dates[first].where(filled),
+                                 "entry_price" : np.where(filled, entry, np.nan),
+                                 "exit_date"   : dates[last].where(filled & closed),
+                                 "exit_price"  : np.where(filled & closed, exit, np.nan),
+                                 "reason"      : np.where(filled, reason, "")})
+
+        events   = {"symbols"          : events["symbols"],
+                    "id"               : events["id"][filled],
+                    "symbol"           : symbol[filled],
+                    "start"            : first[filled] + market.start,
+                    "end"              : last[filled] + 1 + market.start,
+                    "closed"           : closed[filled],
+                    "weight"           : weight[filled],
+                    "fees_coeff"       : events["fees_coeff"][filled],
+                    "close_fees_coeff" : events["close_fees_coeff"][filled],
+                    "entry_adjustment" : entry_adjustment[filled],
+                    "exit_adjustment"  : exit_adjustment[filled]}
+
+        return events, fills
+
+
+
+def _pairs(first, end):
+    """(position, bar) of every bar in [first, end) of every position, ordered
+    by position then bar."""
+    lengths = np.maximum(end - first, 0)
+    pos     = np.repeat(np.arange(len(first)), lengths)
+    offsets = np.cumsum(lengths) - lengths
+    return pos, first[pos] + np.arange(lengths.sum()) - offsets[pos]
+
+
+def _first(pos, bar, hit, default):
+    """Whether each position has a bar hit, and its first bar hit (default
+    bar otherwise)."""
+    found   = np.zeros(len(default), dtype = bool)
+    first   = default.copy()
+    p, i    = np.unique(pos[hit], return_index = True)
+    found[p] = True
+    first[p] = bar[hit][i]
+    return found, first
\ No newline at end of file
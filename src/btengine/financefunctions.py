@@ -6,10 +6,15 @@ Created on Wed Oct  7 23:12:15 2020
 """
 
 import numpy as np
-import statsmodels.api as sm
-from statsmodels import regression
-from scipy.stats import linregress
-from scipy.stats import norm
+import pandas as pd
+
+# scipy and numba are only imported when needed (they are slow to import)
+
+# Rolling kernels compiled with numba, by name (None if numba is not installed)
+_compiled = {}
+
+# Number of windows processed at once by the pure-NumPy rolling kernels
+ROLLING_CHUNK = 256
 
 def skewness(r):
     '''
@@ -60,9 +65,11 @@ def kurtosis(r):
         return exp
     
 def modVaR(returns):
+    from scipy.special import ndtri
+    
     k = kurtosis(returns)
     s = skewness(returns)
-    z = norm.ppf(0.05)
+    z = ndtri(0.05)
     
     z = (z + (z**2 - 1)*s/6 + (z**3 - 3*z)*(k-3)/24 - (2 * z**3 - 5*z)*(s**2)/36)
     
@@ -78,6 +85,8 @@ def sd_pos(returns):
         return np.sqrt( (1) * np.power(average, 2).sum() )
         
 def momentum(closes):
+    from scipy.stats import linregress
+    
     # MAJOR UPDATE: RETURNS ARE NOW IN THE FILE
     returns = np.log(closes)
     x = np.arange(len(returns))
@@ -90,26 +99,501 @@ def alpha_beta(x, y):
     
     Performs a linear regression y = alpha + beta * x and returns its coefficients.
     """
-    # Fit regression model
+    alpha, beta, _, _ = _ols(np.asarray(y, dtype = float)[:, None], 
+                             np.asarray(x, dtype = float)[:, None])
+    
+    # Returns alpha, beta
+    return alpha[0], beta[0]
+    
+def information_coefficient(returns, benchmark_returns, lag = 7):
+    """
+    Series*2 -> float
+    
+    Correlation between the excess returns and the excess returns lag periods
+    later. NaN if more than 10% of the returns are missing.
+    """
+    return regression_panel(returns.to_frame(), benchmark_returns, lag = lag)["ic"].iloc[0]
 
-    x = sm.add_constant(x)
-    model = regression.linear_model.OLS(x, y).fit()
+"""
+Panel versions: every function below works on a 2-D array (or a DataFrame) and
+computes the statistic for all the columns at once.
+"""
+
+def _float(values, dtype = None):
+    """
+    Array, dtype -> float array
     
-    x = x[:, 1]
+    Converts an array into dtype. If dtype is None, float32 arrays are kept in
+    float32 and anything else is converted to float64.
+    """
+    if dtype is None:
+        dtype = np.float32 if values.dtype == np.float32 else np.float64
+    return values.astype(dtype, copy = False)
+
+
+def _panel(r, dtype = None):
+    """
+    Series, Dataframe or array -> 2-D float array, function
     
-    # Returns alpha, beta
-    return model.params[0][0], model.params[0][1]
+    Converts the input into a 2-D float array (see _float for the dtype) and
+    returns a function which puts back a result computed on this array into
+    the type of the input.
+    """
+    if isinstance(r, pd.DataFrame):
+        def wrap(values, axis = None):
+            if axis is None:
+                return pd.DataFrame(values, index = r.index, columns = r.columns)
+            return pd.Series(values, index = r.columns if axis == 0 else r.index)
+        return _float(r.to_numpy(), dtype), wrap
+    
+    if isinstance(r, pd.Series):
+        def wrap(values, axis = None):
+            if axis is None:
+                return pd.Series(values[:, 0], index = r.index, name = r.name)
+            return values[0] if axis == 0 else pd.Series(values, index = r.index, name = r.name)
+        return _float(r.to_numpy(), dtype)[:, None], wrap
+    
+    values = _float(np.asarray(r), dtype)
+    if values.ndim == 1:
+        return values[:, None], lambda x, axis = None: x[:, 0] if axis is None else (x[0] if axis == 0 else x)
+    return values, lambda x, axis = None: x
+
+
+def _moments(x, axis):
+    """
+    Returns the mean and the central moments of order 2, 3 and 4 (population),
+    ignoring NaNs.
+    """
+    with np.errstate(invalid = "ignore"):
+        mean   = np.nanmean(x, axis = axis)
+        demean = x - np.expand_dims(mean, axis)
+        m2     = np.nanmean(demean**2, axis = axis)
+        m3     = np.nanmean(demean**3, axis = axis)
+        m4     = np.nanmean(demean**4, axis = axis)
+    return mean, m2, m3, m4
+
+
+def _skew(m2, m3):
+    # Same convention as skewness: the third moment is returned if sigma is 0
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return np.where(m2 != 0, m3 / m2**1.5, m3)
+
+
+def _kurt(m2, m4):
+    # Same convention as kurtosis: the fourth moment is returned if sigma is 0
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        return np.where(m2 != 0, m4 / m2**2, m4)
+
+
+def _modVaR(mean, m2, m3, m4):
+    from scipy.special import ndtri
+    
+    s = _skew(m2, m3)
+    k = _kurt(m2, m4)
+    z = ndtri(0.05)
+    
+    z = (z + (z**2 - 1)*s/6 + (z**3 - 3*z)*(k-3)/24 - (2 * z**3 - 5*z)*(s**2)/36)
+    
+    return - (mean + z * np.sqrt(m2))
+
+
+def skewness_panel(r, axis = 0):
+    '''
+        ARGS:
+            2-D array or Dataframe, axis along which the skewness is computed
+        RETURNS: 
+            Array or series with the calculated skewness (NaNs are ignored)
+    '''
+    x, wrap = _panel(r)
+    _, m2, m3, _ = _moments(x, axis)
+    return wrap(_skew(m2, m3), axis)
+
+
+def kurtosis_panel(r, axis = 0):
+    '''
+        ARGS:
+            2-D array or Dataframe, axis along which the kurtosis is computed
+        RETURNS: 
+            Array or series with the calculated kurtosis (NaNs are ignored)
+    '''
+    x, wrap = _panel(r)
+    _, m2, _, m4 = _moments(x, axis)
+    return wrap(_kurt(m2, m4), axis)
+
+
+def modVaR_panel(r, axis = 0):
+    '''
+        ARGS:
+            2-D array or Dataframe, axis along which the VaR is computed
+        RETURNS: 
+            Array or series with the Cornish-Fisher VaR at 5% (NaNs are ignored)
+    '''
+    x, wrap = _panel(r)
+    return wrap(_modVaR(*_moments(x, axis)), axis)
+
+
+def sd_pos_panel(r, axis = 0):
+    '''
+        ARGS:
+            2-D array or Dataframe, axis along which the semi deviation is computed
+        RETURNS: 
+            Array or series with the downside semi deviation (NaNs are ignored)
+    '''
+    x, wrap = _panel(r)
+    with np.errstate(invalid = "ignore"):
+        average  = np.nanmean(x, axis = axis)
+        below    = x < np.expand_dims(average, axis)
+        n_below  = below.sum(axis = axis)
+        squares  = np.where(below, np.expand_dims(average, axis) - x, 0)**2
+        sd       = np.where(n_below > 0, 
+                            np.sqrt(squares.sum(axis = axis) / np.maximum(n_below, 1)), 
+                            np.abs(average))
+    return wrap(sd, axis)
+
+
+def _momentum(y, axis, periods_per_year):
+    """
+    Annualized slope of the log prices regressed on time, times the R squared
+    of the regression. NaNs are ignored.
+    """
+    valid = np.isfinite(y)
+    t     = np.arange(y.shape[axis], dtype = float)
+    t     = np.expand_dims(t, tuple(i for i in range(y.ndim) if i != axis % y.ndim))
+    t     = np.where(valid, t, np.nan)
+    
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        dt    = t - np.expand_dims(np.nanmean(t, axis = axis), axis)
+        dy    = y - np.expand_dims(np.nanmean(y, axis = axis), axis)
+        sxy   = np.nansum(dt * dy, axis = axis)
+        sxx   = np.nansum(dt * dt, axis = axis)
+        syy   = np.nansum(dy * dy, axis = axis)
+        
+        slope = sxy / sxx
+        r2    = np.where(syy > 0, sxy**2 / (sxx * syy), 0.0)
+        
+        return ((1 + slope) ** periods_per_year) * r2
+
+
+def momentum_panel(closes, axis = 0, periods_per_year = 252):
+    '''
+        ARGS:
+            2-D array or Dataframe of prices (or cumulative returns), axis along
+            which the regression is made
+        RETURNS: 
+            Array or series with the annualized slope multiplied by R^2
+    '''
+    x, wrap = _panel(closes)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        y = np.log(x)
+    return wrap(_momentum(y, axis, periods_per_year), axis)
+
+
+"""
+Rolling kernels: windows are computed along the first axis of a (dates x assets)
+panel. As with pandas rolling(ndays).apply, a window containing a NaN gives a NaN.
+The kernels keep the dtype of the panel (float32 or float64) but accumulate the
+sums of every window in float64.
+"""
+
+def _windows(x, window):
+    """
+    Yields (first row, windows) where windows is a (chunk x assets x window) view
+    on x, ROLLING_CHUNK windows at a time. Nothing if the window is longer 
+    than x (the output stays NaN).
+    """
+    if window > len(x):
+        return
+    views = np.lib.stride_tricks.sliding_window_view(x, window, axis = 0)
+    for start in range(0, len(views), ROLLING_CHUNK):
+        yield start + window - 1, views[start:start + ROLLING_CHUNK]
+
+
+def _rolling_moments_numpy(x, window):
+    out = np.full((4,) + x.shape, np.nan, dtype = x.dtype)
+    for row, w in _windows(x, window):
+        mean   = w.mean(axis = -1, dtype = np.float64)
+        demean = w - mean[..., None]
+        sq     = demean**2
+        out[:, row:row + len(w)] = (mean, sq.mean(axis = -1), (sq * demean).mean(axis = -1), (sq**2).mean(axis = -1))
+    return out
+
+
+def _rolling_sd_pos_numpy(x, window):
+    out = np.full(x.shape, np.nan, dtype = x.dtype)
+    for row, w in _windows(x, window):
+        average = w.mean(axis = -1, dtype = np.float64)
+        below   = w < average[..., None]
+        n_below = below.sum(axis = -1)
+        squares = (np.where(below, average[..., None] - w, 0)**2).sum(axis = -1)
+        with np.errstate(invalid = "ignore"):
+            out[row:row + len(w)] = np.where(n_below > 0, np.sqrt(squares / np.maximum(n_below, 1)), np.abs(average))
+    return out
+
+
+def _rolling_momentum_numpy(y, window, periods_per_year):
+    out = np.full(y.shape, np.nan, dtype = y.dtype)
+    for row, w in _windows(y, window):
+        out[row:row + len(w)] = np.where(np.isfinite(w).all(axis = -1), _momentum(w, -1, periods_per_year), np.nan)
+    return out
+
+
+"""
+JIT kernels: plain Python loops, compiled with numba on first use (see _jit).
+"""
+
+def _rolling_moments_jit(x, window):
+    T, N = x.shape
+    out  = np.full((4, T, N), np.nan, x.dtype)
+    for j in range(N):
+        for t in range(window - 1, T):
+            s = 0.0
+            for k in range(t - window + 1, t + 1):
+                s += x[k, j]
+            mean = s / window
+            m2 = 0.0
+            m3 = 0.0
+            m4 = 0.0
+            for k in range(t - window + 1, t + 1):
+                d   = x[k, j] - mean
+                d2  = d * d
+                m2 += d2
+                m3 += d2 * d
+                m4 += d2 * d2
+            out[0, t, j] = mean
+            out[1, t, j] = m2 / window
+            out[2, t, j] = m3 / window
+            out[3, t, j] = m4 / window
+    return out
+
+
+def _rolling_sd_pos_jit(x, window):
+    T, N = x.shape
+    out  = np.full((T, N), np.nan, x.dtype)
+    for j in range(N):
+        for t in range(window - 1, T):
+            s = 0.0
+            for k in range(t - window + 1, t + 1):
+                s += x[k, j]
+            average = s / window
+            if average != average:
+                continue
+            n  = 0
+            ss = 0.0
+            for k in range(t - window + 1, t + 1):
+                if x[k, j] < average:
+                    n  += 1
+                    ss += (average - x[k, j])**2
+            out[t, j] = np.sqrt(ss / n) if n > 0 else abs(average)
+    return out
+
+
+def _rolling_momentum_jit(y, window, periods_per_year):
+    T, N = y.shape
+    out  = np.full((T, N), np.nan, y.dtype)
+    tm   = (window - 1) / 2
+    sxx  = window * (window**2 - 1) / 12
+    for j in range(N):
+        for t in range(window - 1, T):
+            s = 0.0
+            for k in range(t - window + 1, t + 1):
+                s += y[k, j]
+            ym  = s / window
+            sxy = 0.0
+            syy = 0.0
+            for k in range(t - window + 1, t + 1):
+                dy   = y[k, j] - ym
+                sxy += (k - t + window - 1 - tm) * dy
+                syy += dy * dy
+            if ym != ym:
+                continue
+            r2        = sxy**2 / (sxx * syy) if syy > 0 else 0.0
+            out[t, j] = ((1 + sxy / sxx) ** periods_per_year) * r2
+    return out
+
+
+def _jit(kernel):
+    """
+    Kernel compiled with numba (on the first call, numba is slow to import),
+    None if numba is not installed.
+    """
+    if kernel.__name__ not in _compiled:
+        try:
+            from numba import njit
+            _compiled[kernel.__name__] = njit(cache = True)(kernel)
+        except ImportError:
+            _compiled[kernel.__name__] = None
+    return _compiled[kernel.__name__]
+
+
+def _rolling_moments(x, window):
+    jit = _jit(_rolling_moments_jit)
+    if jit is not None:
+        return jit(np.ascontiguousarray(x), window)
+    return _rolling_moments_numpy(x, window)
+
+
+def rolling_skewness(r, window, dtype = None):
+    '''
+        ARGS:
+            2-D array or Dataframe (dates x assets), size of the rolling window,
+            optional dtype of the computation (float32 inputs stay float32)
+        RETURNS: 
+            Array or Dataframe with the rolling skewness of every column
+    '''
+    x, wrap = _panel(r, dtype)
+    _, m2, m3, _ = _rolling_moments(x, window)
+    return wrap(_skew(m2, m3))
+
+
+def rolling_kurtosis(r, window, dtype = None):
+    '''
+        ARGS:
+            2-D array or Dataframe (dates x assets), size of the rolling window,
+            optional dtype of the computation (float32 inputs stay float32)
+        RETURNS: 
+            Array or Dataframe with the rolling kurtosis of every column
+    '''
+    x, wrap = _panel(r, dtype)
+    _, m2, _, m4 = _rolling_moments(x, window)
+    return wrap(_kurt(m2, m4))
+
+
+def rolling_modVaR(r, window, dtype = None):
+    '''
+        ARGS:
+            2-D array or Dataframe (dates x assets), size of the rolling window,
+            optional dtype of the computation (float32 inputs stay float32)
+        RETURNS: 
+            Array or Dataframe with the rolling Cornish-Fisher VaR of every column
+    '''
+    x, wrap = _panel(r, dtype)
+    return wrap(_modVaR(*_rolling_moments(x, window)))
+
+
+def rolling_sd_pos(r, window, dtype = None):
+    '''
+        ARGS:
+            2-D array or Dataframe (dates x assets), size of the rolling window,
+            optional dtype of the computation (float32 inputs stay float32)
+        RETURNS: 
+            Array or Dataframe with the rolling downside semi deviation of every column
+    '''
+    x, wrap = _panel(r, dtype)
+    jit = _jit(_rolling_sd_pos_jit)
+    if jit is not None:
+        return wrap(jit(np.ascontiguousarray(x), window))
+    return wrap(_rolling_sd_pos_numpy(x, window))
+
+
+def rolling_momentum(closes, window, periods_per_year = 252, dtype = None):
+    '''
+        ARGS:
+            2-D array or Dataframe of prices (or cumulative returns), size of
+            the rolling window, optional dtype of the computation (float32
+            inputs stay float32)
+        RETURNS: 
+            Array or Dataframe with the rolling momentum of every column
+    '''
+    x, wrap = _panel(closes, dtype)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        y = np.log(x)
+    jit = _jit(_rolling_momentum_jit)
+    if jit is not None:
+        return wrap(jit(np.ascontiguousarray(y), window, periods_per_year))
+    return wrap(_rolling_momentum_numpy(y, window, periods_per_year))
+
+
+"""
+Batched regressions: every series of a panel is regressed on a benchmark in a
+single vectorized pass, using closed-form OLS sums.
+"""
+
+def _rolling_sum(x, window):
+    # Sum over the last window rows, NaN for the first window - 1 rows (all
+    # the rows if the window is longer than x)
+    out = np.full(x.shape, np.nan)
+    if window > len(x):
+        return out
+    c   = np.cumsum(x, axis = 0, dtype = np.float64)
+    out[window - 1] = c[window - 1]
+    out[window:]    = c[window:] - c[:-window]
+    return out
+
+
+def _ols(y, x, window = None):
+    """
+    Closed-form regressions y = alpha + beta * x for every column of y.
+    x is either a single column (benchmark) or has the same shape as y. Pairs
+    containing a NaN are ignored.
+    
+    Returns the arrays alpha, beta, r2 and corr (one row per date if a window
+    is given, else one value per column).
+    """
+    valid = np.isfinite(y) & np.isfinite(x)
+    n     = valid.sum(axis = 0)
+    
+    # Centering on the full sample means keeps the rolling sums accurate
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        cx = np.where(valid, x, 0).sum(axis = 0) / n
+        cy = np.where(valid, y, 0).sum(axis = 0) / n
+    dx = np.where(valid, x - cx, 0)
+    dy = np.where(valid, y - cy, 0)
+    
+    if window is None:
+        sums = [s.sum(axis = 0) for s in (valid, dx, dy, dx * dx, dx * dy, dy * dy)]
+    else:
+        sums = [_rolling_sum(s, window) for s in (valid.astype(float), dx, dy, dx * dx, dx * dy, dy * dy)]
+    n, sx, sy, sxx, sxy, syy = sums
+        
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        mx    = sx / n
+        my    = sy / n
+        sxx   = sxx - sx * mx
+        sxy   = sxy - sx * my
+        syy   = syy - sy * my
+        
+        beta  = sxy / sxx
+        alpha = (my + cy) - beta * (mx + cx)
+        r2    = sxy**2 / (sxx * syy)
+        corr  = sxy / np.sqrt(sxx * syy)
+    
+    # At least two points per regression, a full window when rolling
+    too_short = n < (2 if window is None else window)
+    return tuple(np.where(too_short, np.nan, v) for v in (alpha, beta, r2, corr))
+
+
+def regression_panel(returns, benchmark, window = None, lag = 7, max_missing = 0.1):
+    '''
+        ARGS:
+            Dataframe of returns (dates x series), Series of benchmark returns,
+            optional rolling window size, lag of the information coefficient and
+            maximum share of missing returns
+        RETURNS: 
+            Dataframe with alpha, beta, r2 and ic for every series. If window
+            is set, a dict of Dataframes (dates x series) with the same keys.
+            
+        The information coefficient is the correlation between the excess
+        returns over the benchmark and the excess returns lag periods later
+        (lag 0 correlates the excess returns with themselves).
+    '''
+    if lag < 0:
+        raise ValueError("[-] The lag of the information coefficient must be positive or 0, got " + str(lag) + ".")
     
-def information_coefficient(returns, benchmark_returns):
-    if(returns.isnull().mean() > 0.1):
-        return np.NaN
+    benchmark = benchmark.reindex(returns.index)
+    y         = returns.to_numpy(dtype = float)
+    x         = benchmark.to_numpy(dtype = float)[:, None]
     
-    returns = returns[~returns.isnull()]
-    benchmark_returns = benchmark_returns.loc[returns.index]
+    alpha, beta, r2, _ = _ols(y, x, window)
     
-    exces_rendement = (returns - benchmark_returns)
+    # Information coefficient (excess returns regressed on their lagged values)
+    excess       = y - x
+    lagged       = np.full(excess.shape, np.nan)
+    lagged[lag:] = excess[:max(len(excess) - lag, 0)]
+    _, _, _, ic  = _ols(excess, lagged, window)
     
-    _, coeff_correlation = alpha_beta(list(exces_rendement)[:-7], list(exces_rendement.shift(-7))[:-7])
+    if window is None:
+        ic = np.where(np.isnan(y).mean(axis = 0) > max_missing, np.nan, ic)
+        return pd.DataFrame({"alpha" : alpha, "beta" : beta, "r2" : r2, "ic" : ic}, index = returns.columns)
     
-    IC = (coeff_correlation * exces_rendement.std() * (exces_rendement -  exces_rendement.mean())/exces_rendement.std())
-    return IC.sum()
\ No newline at end of file
+    return {key : pd.DataFrame(value, index = returns.index, columns = returns.columns)
+            for key, value in (("alpha", alpha), ("beta", beta), ("r2", r2), ("ic", ic))}
@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Jun 23 20:41:15 2021
+
+This script contains FrameBuffer class, used to append rows to a dataframe
+without copying its history.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy`, `pandas` be installed within
+the Python environment you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * FrameBuffer - Growable (dates x columns) dataframe.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+import numpy as np
+import pandas as pd
+
+
+class FrameBuffer():
+    """Growable (dates x columns) dataframe of floats (float64 by default). Rows are written in a
+    preallocated array whose capacity doubles when it is full, and the frame
+    is a view on the filled rows: appending a row costs the same whatever the
+    length of the history.
+
+    Attributes
+    ----------
+    columns : pd.Index
+        Columns of the frame.
+    n : int
+        Number of rows.
+
+    Methods
+    -------
+    append(index, values)
+        Appends rows.
+    addColumns(columns, fill = np.nan)
+        Adds columns (copies the buffer).
+    frame
+        Dataframe of the rows appended so far (shares the memory of the buffer).
+    """
+
+    def __init__(self, frame, capacity = None, dtype = float):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        frame : pd.Dataframe
+            Initial rows (dates x columns).
+        capacity : int, optional
+            Initial capacity. The default is None (twice the initial rows).
+        dtype : np.dtype, optional
+            Floating type of the values. The default is float64.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.n       = len(frame.index)
+        self.columns = frame.columns
+        self.name    = frame.index.name
+        capacity     = max(capacity if capacity is not None else 2 * self.n, self.n, 16)
+
+        self.values  = np.full((capacity, len(self.columns)), np.nan, dtype = dtype)
+        self.dates   = np.zeros(capacity, dtype = np.int64)
+        self.values[:self.n] = frame.to_numpy(dtype = dtype)
+        self.dates[:self.n]  = pd.DatetimeIndex(frame.index).values.astype("datetime64[ns]").view("int64")
+
+
+    def grow(self, capacity):
+        """Reallocates the buffer with a larger capacity."""
+        values, dates = self.values, self.dates
+        self.values   = np.full((capacity, values.shape[1]), np.nan, dtype = values.dtype)
+        self.dates    = np.zeros(capacity, dtype = np.int64)
+        self.values[:self.n] = values[:self.n]
+        self.dates[:self.n]  = dates[:self.n]
+
+
+    def append(self, index, values):
+        """
+        Appends rows.
+
+        Parameters
+        ----------
+        index : pd.DatetimeIndex
+            Dates of the rows.
+        values : np.array
+            Values (rows x columns), in the order of columns.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        k = len(index)
+        if self.n + k > len(self.dates):
+            self.grow(max(2 * len(self.dates), self.n + k))
+
+        self.values[self.n:self.n + k] = values
+        self.dates[self.n:self.n + k]  = pd.DatetimeIndex(index).values.astype("datetime64[ns]").view("int64")
+        self.n += k
+
+
+    def addColumns(self, columns, fill = np.nan):
+        """Adds columns, filled with fill for the existing rows."""
+        columns = [x for x in columns if x not in self.columns]
+        if len(columns) == 0:
+            return
+
+        extra          = np.full((len(self.dates), len(columns)), np.nan, dtype = self.values.dtype)
+        extra[:self.n] = fill
+        self.values    = np.hstack([self.values, extra])
+        self.columns   = self.columns.append(pd.Index(columns))
+
+
+    @property
+    def frame(self):
+        """Dataframe of the rows appended so far (no copy)."""
+        index = pd.DatetimeIndex(self.dates[:self.n].view("datetime64[ns]"), name = self.name)
+        return pd.DataFrame(self.values[:self.n], index = index, columns = self.columns, copy = False)
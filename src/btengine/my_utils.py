@@ -6,13 +6,14 @@ Created on Sun May 30 00:05:15 2021
 """
 
 # Imports
-from datetime import timedelta
+from datetime import date, datetime, timedelta
 import numpy as np
+import pandas as pd
 
 
-def daterange(start_date, end_date):
+def daterange(start_date, end_date, step = timedelta(1)):
     """
-    Create a list day by day from start_date to end_date.
+    Create a list step by step (default: day by day) from start_date to end_date.
 
     Parameters
     ----------
@@ -20,9 +21,87 @@ def daterange(start_date, end_date):
         Start date of the daterange
     end_date : datetime.date
         End date of the daterange (excluded)
+    step : datetime.timedelta
+        Step between two dates (Default: 1 day)
     """
-    for n in range(int((end_date - start_date).days)):
-        yield start_date + timedelta(n)
+    for n in range(int(np.ceil((end_date - start_date) / step))):
+        yield start_date + step * n
+        
+
+def barLength(frequency):
+    """
+    Duration of a bar for a given frequency.
+
+    Parameters
+    ----------
+    frequency : str
+        Pandas frequency string (ex: "1D", "1H", "5min")
+    """
+    return pd.Timedelta(pd.tseries.frequencies.to_offset(frequency))
+
+
+def isDaily(frequency):
+    """
+    Whether bars are daily (one bar per date).
+
+    Parameters
+    ----------
+    frequency : str
+        Pandas frequency string (ex: "1D", "1H", "5min")
+    """
+    return barLength(frequency) == pd.Timedelta(days = 1)
+
+
+def barsPerYear(frequency, days_per_year = 252):
+    """
+    Number of bars in a year, used for annualization.
+
+    Parameters
+    ----------
+    frequency : str
+        Pandas frequency string (ex: "1D", "1H", "5min")
+    days_per_year : int
+        Number of trading days in a year (252 for equities, 365 for 
+        cryptocurrencies traded 24/7)
+    """
+    return days_per_year * (pd.Timedelta(days = 1) / barLength(frequency))
+
+
+def toTimestamp(x, end = False):
+    """
+    Converts a date or a datetime into a pd.Timestamp. If x is the end (included)
+    of a period, the returned timestamp is the first one after the period: dates
+    without time are considered as a whole day.
+
+    Parameters
+    ----------
+    x : datetime.date or datetime.datetime
+        Date to convert
+    end : boolean
+        Whether x is the end (included) of a period
+    """
+    if not end:
+        return pd.Timestamp(x)
+    if isinstance(x, date) and not isinstance(x, datetime):
+        return pd.Timestamp(x + timedelta(1))
+    return pd.Timestamp(x) + pd.Timedelta(1)
+
+
+
+def toNaiveIndex(index):
+    """
+    Converts an index of dates into a pd.DatetimeIndex without timezone (in UTC),
+    as used by the DataManager.
+
+    Parameters
+    ----------
+    index : pd.Index
+        Dates (or timestamps) to convert
+    """
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert("UTC").tz_localize(None)
+    return index
         
         
 def getLaggedReturns_fromPrice(x, lag):
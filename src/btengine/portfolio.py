@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Tue Jun 29 10:12:08 2021
+
+This script contains the portfolio construction functions, used to combine
+the track records of several strategies (see BacktestEngine.mergeStrategies):
+weights fixed or optimized on rolling windows (minimum variance, mean-variance,
+risk parity), and equity of the portfolio rebalanced periodically. Every
+window is solved at once with batched linear algebra.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy` be installed within the Python environment
+you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * periodStarts      - First bar of every rebalancing period.
+    * rollingMoments    - Means and covariances of the windows before the rebalancings.
+    * optimalWeights    - Weights of many windows at once.
+    * rebalancedEquity  - Equity of a portfolio rebalanced periodically.
+    * optimizePortfolio - Weights and equity of a portfolio of strategies.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+import numpy as np
+
+# Optimization methods
+METHODS = ("min_variance", "mean_variance", "risk_parity")
+
+
+def periodStarts(bars, every = None, window = 0):
+    """
+    First bar of every rebalancing period: 0, then every every bars from
+    window (bars needed by the first optimization).
+
+    Parameters
+    ----------
+    bars : int
+        Number of bars.
+    every : int, optional
+        Number of bars between two rebalancings. The default is None (never
+        rebalanced, buy and hold).
+    window : int, optional
+        First rebalancing. The default is 0.
+
+    Returns
+    -------
+    np.array
+        First bar of every period.
+    """
+
+    if every is None:
+        return np.zeros(1, dtype = int)
+    first = window if window > 0 else every
+    return np.union1d([0], np.arange(first, bars, every)).astype(int)
+
+
+def rollingMoments(returns, starts, window):
+    """
+    Means and covariances of the returns of the window bars before each start
+    (the bars of a rebalancing are not known when it is made).
+
+    Parameters
+    ----------
+    returns : np.array
+        Returns (bars x assets).
+    starts : np.array
+        Bars of the rebalancings (at least window).
+    window : int
+        Number of bars of every window.
+
+    Returns
+    -------
+    mean : np.array
+        Means (rebalancings x assets).
+    covariance : np.array
+        Covariances (rebalancings x assets x assets).
+    """
+
+    windows    = np.lib.stride_tricks.sliding_window_view(returns, window, axis = 0)[starts - window]
+    mean       = windows.mean(axis = -1)
+    centered   = windows - mean[:, :, None]
+    covariance = np.einsum("kiw,kjw->kij", centered, centered) / max(window - 1, 1)
+    return mean, covariance
+
+
+def optimalWeights(covariance, mean = None, method = "min_variance", risk_aversion = 1.0, long_only = True,
+                   iterations = 200, tolerance = 1e-10):
+    """
+    Weights (summing to 1) of many windows at once.
+
+        - min_variance: minimum variance portfolio, Σ^-1 1 / 1' Σ^-1 1.
+        - mean_variance: maximizes w'μ - risk_aversion / 2 w'Σw, fully
+          invested (closed form, minimum variance plus a tilt towards the
+          means).
+        - risk_parity: equal risk contributions w_i (Σw)_i, solved by damped
+          Newton steps on min x'Σx / 2 - sum(log x) (whose solution has
+          x_i (Σx)_i = 1), on all windows at once, then normalized.
+
+    Long only portfolios are solved with an active set method on all the
+    windows at once: at each iteration, every window removes its most
+    negative asset, or adds back the inactive asset most violating the
+    optimality conditions, and is solved again on its active assets.
+
+    Parameters
+    ----------
+    covariance : np.array
+        Covariances (windows x assets x assets).
+    mean : np.array, optional
+        Mean returns (windows x assets), for mean_variance. The default is None.
+    method : str, optional
+        One of METHODS. The default is "min_variance".
+    risk_aversion : float, optional
+        Risk aversion of mean_variance (on the returns of one bar). The default is 1.0.
+    long_only : boolean, optional
+        Whether negative weights are forbidden. The default is True.
+    iterations : int, optional
+        Maximum number of iterations (Newton steps of risk_parity, active set
+        changes otherwise). The default is 200.
+    tolerance : float, optional
+        Convergence. The default is 1e-10.
+
+    Raises
+    ------
+    ValueError
+        If the method is unknown.
+
+    Returns
+    -------
+    np.array
+        Weights (windows x assets).
+    """
+
+    if method not in METHODS:
+        raise ValueError("[-] Unknown method " + str(method) + ", expected one of " + str(METHODS) + ".")
+
+    k, n     = covariance.shape[:2]
+    identity = np.eye(n)
+    rows     = np.arange(k)
+
+    # Small ridge, so that degenerate windows (ex: a flat strategy) can be solved
+    scale      = np.trace(covariance, axis1 = 1, axis2 = 2)[:, None, None] / n
+    covariance = covariance + identity * np.maximum(scale, 1e-12) * 1e-8
+
+    if method == "risk_parity":
+        # Newton steps on min x'Σx / 2 - sum(log x), whose solution has equal
+        # risk contributions x_i (Σx)_i = 1, with steps keeping x positive
+        x = 1 / np.sqrt(np.diagonal(covariance, axis1 = 1, axis2 = 2))
+        for _ in range(iterations):
+            gradient = np.einsum("kij,kj->ki", covariance, x) - 1 / x
+            hessian  = covariance + identity * (1 / x**2)[:, :, None]
+            step     = np.linalg.solve(hessian, gradient[..., None])[..., 0]
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                bound = np.where(step > 0, x / step, np.inf).min(axis = 1)
+            x        = x - np.minimum(1.0, 0.95 * bound)[:, None] * step
+            if np.abs(step).max() <= tolerance * np.abs(x).max():
+                break
+        return x / x.sum(axis = 1, keepdims = True)
+
+    # min w'Σw / 2 - w'μ / risk_aversion subject to sum(w) = 1 (μ = 0 for min_variance)
+    target   = np.zeros((k, n)) if method == "min_variance" or mean is None else mean / risk_aversion
+    active   = np.ones((k, n), dtype = bool)
+    for _ in range(iterations):
+        # Inactive assets: identity rows and columns, nothing on the right hand side
+        system   = np.where(active[:, :, None] & active[:, None, :], covariance, identity)
+        rhs      = np.stack([active.astype(float), np.where(active, target, 0.0)], axis = -1)
+        x        = np.linalg.solve(system, rhs)
+        ones, mu = x[..., 0], x[..., 1]
+        weights  = (ones * (1 - mu.sum(axis = 1, keepdims = True)) / ones.sum(axis = 1, keepdims = True)) + mu
+        if not long_only:
+            break
+
+        # Most negative active weight, or inactive asset whose gradient is below the multiplier
+        gradient = np.einsum("kij,kj->ki", covariance, weights) - target
+        level    = np.where(active, gradient, 0.0).sum(axis = 1) / active.sum(axis = 1)
+        drop     = np.where(active, weights, 0.0).min(axis = 1) < -tolerance
+        violated = np.where(active, np.inf, gradient - level[:, None])
+        add      = ~drop & (violated.min(axis = 1) < -tolerance * np.maximum(np.abs(level), 1e-300))
+        if not (drop | add).any():
+            break
+        active[rows[drop], np.where(active, weights, np.inf)[drop].argmin(axis = 1)] = False
+        active[rows[add], violated[add].argmin(axis = 1)] = True
+
+    return np.where(active, weights, 0.0)
+
+
+def rebalancedEquity(equity, starts, weights, capital = 1.0):
+    """
+    Equity of a portfolio of strategies, rebalanced to the target weights at
+    the beginning of every period (the weights drift with the strategies
+    within a period).
+
+    Parameters
+    ----------
+    equity : np.array
+        Equity curves of the strategies (bars x strategies), all started with capital.
+    starts : np.array
+        First bar of every period (starts[0] = 0).
+    weights : np.array
+        Weights of every period (periods x strategies).
+    capital : float, optional
+        Equity of the strategies before the first bar. The default is 1.0.
+
+    Returns
+    -------
+    np.array
+        Equity of the portfolio, started with capital.
+    """
+
+    # Equity before every bar (row t is the equity before bar t)
+    before = np.vstack([np.full((1, equity.shape[1]), capital), equity])
+    period = np.searchsorted(starts, np.arange(len(equity)), side = "right") - 1
+
+    # Growth of the portfolio since the beginning of its period, then chained
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        growth = np.nansum(weights[period] * equity / before[starts[period]], axis = 1)
+    ends   = starts[1:] - 1
+    value  = capital * np.concatenate([[1.0], np.cumprod(growth[ends])])
+
+    return value[period] * growth
+
+
+def optimizePortfolio(equity, weights = None, method = "min_variance", every = None, window = 60,
+                      risk_aversion = 1.0, long_only = True, capital = 1.0):
+    """
+    Weights and equity of a portfolio of strategies: fixed weights, or
+    weights optimized every every bars on the returns of the window previous
+    bars (equally weighted until the first optimization).
+
+    Parameters
+    ----------
+    equity : np.array
+        Equity curves of the strategies (bars x strategies).
+    weights : list, optional
+        Fixed weights. The default is None (optimized with method).
+    method : str, optional
+        Optimization method (see optimalWeights). The default is "min_variance".
+    every : int, optional
+        Number of bars between two rebalancings. The default is None: fixed
+        weights are never rebalanced (buy and hold), optimized weights are
+        rebalanced every window bars.
+    window : int, optional
+        Number of bars of the optimization windows. The default is 60.
+    risk_aversion : float, optional
+        Risk aversion of mean_variance. The default is 1.0.
+    long_only : boolean, optional
+        Whether negative weights are forbidden. The default is True.
+    capital : float, optional
+        Equity of the strategies before the first bar. The default is 1.0.
+
+    Returns
+    -------
+    starts : np.array
+        First bar of every period.
+    weights : np.array
+        Weights of every period (periods x strategies).
+    value : np.array
+        Equity of the portfolio.
+    """
+
+    bars, n = equity.shape
+
+    if weights is not None:
+        starts  = periodStarts(bars, every)
+        weights = np.tile(np.asarray(weights, dtype = float), (len(starts), 1))
+    else:
+        starts  = periodStarts(bars, every if every is not None else window, window)
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            returns = equity / np.vstack([np.full((1, n), capital), equity[:-1]]) - 1
+        returns = np.nan_to_num(returns, nan = 0.0, posinf = 0.0, neginf = 0.0)
+
+        weights   = np.full((len(starts), n), 1 / n)
+        optimized = starts >= window
+        if optimized.any():
+            mean, covariance = rollingMoments(returns, starts[optimized], window)
+            weights[optimized] = optimalWeights(covariance, mean, method, risk_aversion, long_only)
+
+    return starts, weights, rebalancedEquity(equity, starts, weights, capital)
\ No newline at end of file
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Jun 19 14:05:52 2021
+
+This script contains Profiler and ProfileReport classes, used to measure where
+the time goes during a backtest.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy` be installed within the Python environment
+you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * Profiler      - Collects phase timers, latencies and counters.
+    * ProfileReport - Structured report built by a Profiler.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+from contextlib import contextmanager
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+import numpy as np
+
+
+# Bucket edges of the latency histograms (seconds, log scale from 1us to 100s)
+HISTOGRAM_EDGES = np.logspace(-6, 2, 17)
+
+
+class Profiler():
+    """Collects timing information during a backtest. A disabled profiler does
+    nothing, so that instrumented code can always call it.
+
+    Attributes
+    ----------
+    enabled : boolean
+        Whether measures are recorded.
+    capture : boolean
+        Whether cProfile and tracemalloc run during the outermost phases.
+    phases : dict
+        Wall and CPU time spent in each phase, and number of calls.
+    latencies : dict(list)
+        Individual durations recorded for each measure (ex: compute_selection).
+    counters : dict
+        Counters (ex: number of ledger operations).
+    memory : dict
+        Peak of traced memory (bytes) and tracemalloc snapshot of each 
+        outermost phase, at its highest peak (capture only).
+
+    Methods
+    -------
+    phase(name)
+        Context manager timing a phase.
+    latency(name)
+        Context manager recording the duration of a single call.
+    record(name, seconds)
+        Records a duration.
+    count(name, n = 1)
+        Increments a counter.
+    report
+        Builds a ProfileReport.
+    """
+
+    def __init__(self, enabled = True, capture = False):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        enabled : boolean, optional
+            Whether measures are recorded. The default is True.
+        capture : boolean, optional
+            Runs cProfile and tracemalloc during the outermost phases, to
+            diagnose slow strategies. The default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.enabled   = enabled
+        self.capture   = capture and enabled
+        self.phases    = {}
+        self.latencies = {}
+        self.counters  = {}
+        self.depth     = 0
+        self.profile   = cProfile.Profile() if self.capture else None
+        self.memory    = {}
+
+
+    @contextmanager
+    def phase(self, name):
+        """Times a phase (wall and CPU time). Phases can be nested."""
+
+        if not self.enabled:
+            yield
+            return
+
+        if self.capture and self.depth == 0:
+            tracemalloc.start()
+            self.profile.enable()
+
+        self.depth += 1
+        wall, cpu   = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu   = time.perf_counter() - wall, time.process_time() - cpu
+            self.depth -= 1
+
+            stats = self.phases.setdefault(name, {"calls" : 0, "wall" : 0.0, "cpu" : 0.0})
+            stats["calls"] += 1
+            stats["wall"]  += wall
+            stats["cpu"]   += cpu
+
+            if self.capture and self.depth == 0:
+                self.profile.disable()
+                peak = tracemalloc.get_traced_memory()[1]
+                if peak >= self.memory.get(name, (-1, None))[0]:
+                    self.memory[name] = (peak, tracemalloc.take_snapshot())
+                tracemalloc.stop()
+
+
+    @contextmanager
+    def latency(self, name):
+        """Records the wall time of a single call."""
+
+        if not self.enabled:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+
+    def record(self, name, seconds):
+        """Records a duration (in seconds) for a measure."""
+        if self.enabled:
+            self.latencies.setdefault(name, []).append(seconds)
+
+
+    def count(self, name, n = 1):
+        """Increments a counter."""
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+    def report(self, top = 25):
+        """
+        Builds a report of everything recorded so far.
+
+        Parameters
+        ----------
+        top : int, optional
+            Number of functions and allocation sites kept from the capture.
+            The default is 25.
+
+        Returns
+        -------
+        ProfileReport
+            The report.
+
+        """
+
+        latencies = {}
+        for name, samples in self.latencies.items():
+            samples = np.asarray(samples)
+            latencies[name] = {"count"     : len(samples),
+                               "total"     : float(samples.sum()),
+                               "mean"      : float(samples.mean()),
+                               "p50"       : float(np.percentile(samples, 50)),
+                               "p90"       : float(np.percentile(samples, 90)),
+                               "p99"       : float(np.percentile(samples, 99)),
+                               "max"       : float(samples.max()),
+                               "histogram" : np.histogram(samples, bins = HISTOGRAM_EDGES)[0].tolist()}
+
+        capture = None
+        if self.capture:
+            stream = io.StringIO()
+            pstats.Stats(self.profile, stream = stream).sort_stats("cumulative").print_stats(top)
+            capture = {"profile" : stream.getvalue()}
+            if len(self.memory) > 0:
+                # Allocation sites of the outermost phase with the highest peak
+                phase          = max(self.memory, key = lambda x: self.memory[x][0])
+                peak, snapshot = self.memory[phase]
+                capture["memory_peaks"] = {name : value[0] for name, value in self.memory.items()}
+                capture["memory_phase"] = phase
+                capture["memory_peak"]  = peak
+                capture["memory_top"]   = [str(stat) for stat in snapshot.statistics("lineno")[:top]]
+
+        return ProfileReport({name : dict(stats) for name, stats in self.phases.items()},
+                             latencies, dict(self.counters), capture)
+
+
+
+class ProfileReport():
+    """Structured report of a Profiler.
+
+    Attributes
+    ----------
+    phases : dict
+        Wall and CPU time (seconds) and number of calls of each phase.
+    latencies : dict
+        Count, total, mean, percentiles, max and histogram of each measure.
+        The histogram buckets are given by HISTOGRAM_EDGES.
+    counters : dict
+        Counters.
+    capture : dict
+        cProfile statistics and tracemalloc results (None if not captured):
+        peak of every outermost phase, and allocation sites of the phase with
+        the highest peak.
+    """
+
+    def __init__(self, phases, latencies, counters, capture = None):
+        self.phases    = phases
+        self.latencies = latencies
+        self.counters  = counters
+        self.capture   = capture
+
+
+    def toDict(self):
+        """Report as a dictionnary."""
+        return {"phases"          : self.phases,
+                "latencies"       : self.latencies,
+                "histogram_edges" : HISTOGRAM_EDGES.tolist(),
+                "counters"        : self.counters,
+                "capture"         : self.capture}
+
+
+    def toJson(self, path = None):
+        """Report as a JSON string, written to path if given."""
+        text = json.dumps(self.toDict(), indent = 2)
+        if path is not None:
+            with open(path, "w") as file:
+                file.write(text)
+        return text
+
+
+    def __str__(self):
+        lines = ["%-45s %8s %10s %10s" % ("Phase", "Calls", "Wall (s)", "CPU (s)")]
+        for name, stats in self.phases.items():
+            lines.append("%-45s %8d %10.3f %10.3f" % (name, stats["calls"], stats["wall"], stats["cpu"]))
+
+        lines.append("")
+        lines.append("%-45s %8s %10s %10s %10s" % ("Latency", "Count", "p50 (ms)", "p99 (ms)", "Max (ms)"))
+        for name, stats in self.latencies.items():
+            lines.append("%-45s %8d %10.3f %10.3f %10.3f" % (name, stats["count"], stats["p50"] * 1e3,
+                                                              stats["p99"] * 1e3, stats["max"] * 1e3))
+
+        lines.append("")
+        for name, value in self.counters.items():
+            lines.append("%-45s %8d" % (name, value))
+
+        return "\n".join(lines)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Jun 23 22:10:04 2021
+
+This script contains ReplayFeed class, used to test live trading (see
+BacktestEngine.step) by replaying the bars of a DataManager.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `pandas` be installed within the Python environment
+you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * ReplayFeed - Feeds the bars of a DataManager one step at a time.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+
+class ReplayFeed():
+    """Local feed replaying the bars of a DataManager. The bars from start_date
+    are removed from the DataManager and yielded back, bars at a time, as
+    (prices, volume) dataframes to be given to BacktestEngine.step:
+
+        feed = ReplayFeed(dm, start_date)
+        for prices, volume in feed:
+            be.step(prices, volume)
+
+    Attributes
+    ----------
+    prices : pd.Dataframe
+        Prices of the bars to replay.
+    volume : pd.Dataframe
+        Volumes of the bars to replay.
+    bars : int
+        Number of bars yielded at each step.
+    """
+
+    def __init__(self, data_manager, start_date, end_date = None, bars = 1):
+        """
+        Constructor. Truncates the data of data_manager before start_date.
+
+        Parameters
+        ----------
+        data_manager : DataManager
+            Data Manager holding the history to replay.
+        start_date : datetime.date
+            Date of the first bar replayed.
+        end_date : datetime.date, optional
+            Date of the last bar replayed (included). The default is None (last bar).
+        bars : int, optional
+            Number of bars yielded at each step. The default is 1.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        start       = data_manager.barIndex(start_date)
+        end         = data_manager.barIndex(end_date, True) if end_date is not None else None
+
+        self.prices = data_manager.data["prices"].iloc[start:end]
+        self.volume = data_manager.data["volume"].iloc[start:end]
+        self.bars   = bars
+
+        data_manager.data       = {column : x.iloc[:start] for column, x in data_manager.data.items()}
+        data_manager.buffers    = None
+        data_manager.membership = None
+
+
+    def __len__(self):
+        return len(self.prices.index)
+
+
+    def __iter__(self):
+        for a in range(0, len(self.prices.index), self.bars):
+            yield self.prices.iloc[a:a + self.bars], self.volume.iloc[a:a + self.bars]
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Jun 28 09:41:15 2021
+
+This script contains ResultCache class, a local content-addressed cache of
+the ledgers and track records of the runs, so that rerunning an unchanged
+strategy on unchanged data does not repeat the rebalancing and the attribution.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy`, `pandas` be installed within the Python
+environment you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * ResultCache - Content-addressed cache of ledgers and track records.
+    * canonical   - Canonical text of a value, for fingerprints.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+from datetime import date
+import glob
+import hashlib
+import inspect
+import os
+import pickle
+import numpy as np
+import pandas as pd
+from btengine.datamanager import COLUMNS
+from btengine.selectionrules import SelectionRules
+
+
+class ResultCache():
+    """Content-addressed cache of results. An entry is identified by a key (a
+    hash of everything the result depends on, except the data and the end
+    date, see strategyKey) and by the end date of the run. It also records a
+    fingerprint of the data up to this end date, so that:
+
+        - an identical rerun (same key, same end, same data) hits the entry;
+        - a run extended by a few days hits the entry of the shorter run if
+          the data up to its end date is unchanged, and only computes the
+          new days (see BacktestEngine.rebalance and computeReturns).
+
+    Every entry is a file <key>_<end>.pkl holding a small header (end date and
+    data fingerprint), followed by the content. The least recently used
+    entries are deleted when the cache exceeds max_size.
+
+    Attributes
+    ----------
+    folder : str
+        Folder of the cache.
+    max_size : int
+        Maximum size of the cache (in bytes).
+
+    Methods
+    -------
+    strategyKey(rule, start_date)
+        Key of the ledger of a strategy.
+    key(*parts)
+        Key of any result depending on parts.
+    dataFingerprint(data_manager, end)
+        Fingerprint of the data up to a date.
+    lookup(key, data_manager, end)
+        Latest entry of a key ending at most at end, valid for the data.
+    store(key, data_manager, end, content)
+        Adds an entry.
+    clear
+        Deletes every entry.
+    """
+
+    def __init__(self, folder = "../out/cache/", max_size = 2**30):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        folder : str, optional
+            Folder of the cache. The default is "../out/cache/".
+        max_size : int, optional
+            Maximum size of the cache (in bytes). The default is 1 GB.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.folder   = folder
+        self.max_size = max_size
+
+
+    def key(self, *parts):
+        """Key (hexadecimal hash) of a result depending on parts."""
+        return hashlib.blake2b(canonical(parts, depth = 3).encode(), digest_size = 16).hexdigest()
+
+
+    def strategyKey(self, rule, start_date):
+        """
+        Key of the ledger of a strategy: source of its classes, parameters
+        (attributes other than the data manager, when the rebalancing starts),
+        settings of the data and start date.
+
+        Parameters
+        ----------
+        rule : SelectionRules
+            The strategy.
+        start_date : datetime.date
+            Start date of the rebalancing.
+
+        Returns
+        -------
+        str
+            The key.
+        """
+
+        sources    = [source(x) for x in type(rule).__mro__ if issubclass(x, SelectionRules)]
+        parameters = {name : value for name, value in vars(rule).items() if name != "data_manager"}
+        manager    = rule.data_manager
+
+        return self.key("ledger", sources, canonical(parameters, depth = 0), manager.frequency,
+                        manager.dtype.str, pd.Timestamp(start_date))
+
+
+    def dataFingerprint(self, data_manager, end = None):
+        """
+        Fingerprint of the data up to a date (dates, symbols and values of
+        every column, and of the OHLC prices if loaded). A lazy DataManager
+        loads every symbol.
+
+        Parameters
+        ----------
+        data_manager : DataManager
+            The data.
+        end : datetime.date, optional
+            Last date (included). The default is None (all the data).
+
+        Returns
+        -------
+        str
+            The fingerprint.
+        """
+
+        rows   = len(data_manager.index) if end is None else data_manager.barIndex(end, True)
+        digest = hashlib.blake2b(digest_size = 16)
+        digest.update(data_manager.index[:rows].values.astype("datetime64[ns]").tobytes())
+        for column in COLUMNS:
+            x = data_manager.data[column]
+            digest.update(repr(list(x.columns)).encode())
+            digest.update(np.ascontiguousarray(x.to_numpy()[:rows]).tobytes())
+        if getattr(data_manager, "ohlc", None) is not None:
+            digest.update(np.ascontiguousarray(data_manager.ohlc[:rows]).tobytes())
+        return digest.hexdigest()
+
+
+    def path(self, key, end):
+        """Path of the entry of a key ending at end."""
+        return os.path.join(self.folder, key + "_" + pd.Timestamp(end).strftime("%Y%m%d%H%M%S") + ".pkl")
+
+
+    def lookup(self, key, data_manager, end):
+        """
+        Latest entry of a key whose end date is at most end and whose data
+        fingerprint matches the current data up to its end date.
+
+        Parameters
+        ----------
+        key : str
+            Key of the result.
+        data_manager : DataManager
+            The current data.
+        end : datetime.date
+            End date of the run.
+
+        Returns
+        -------
+        entry_end : pd.Timestamp
+            End date of the entry (None if there is no valid entry).
+        content : object
+            Content of the entry (None if there is no valid entry).
+        """
+
+        end   = pd.Timestamp(end)
+        paths = sorted(glob.glob(os.path.join(glob.escape(self.folder), key + "_*.pkl")), reverse = True)
+
+        for path in paths:
+            try:
+                with open(path, "rb") as file:
+                    header = pickle.load(file)
+                    if header["end"] > end or header["data"] != self.dataFingerprint(data_manager, header["end"]):
+                        continue
+                    content = pickle.load(file)
+            except (EOFError, OSError, pickle.UnpicklingError, AttributeError, ValueError, KeyError):
+                continue
+
+            # Most recently used
+            os.utime(path)
+            return header["end"], content
+
+        return None, None
+
+
+    def store(self, key, data_manager, end, content):
+        """
+        Adds an entry (replaces the entry of the same key and end date), then
+        evicts the least recently used entries above max_size.
+
+        Parameters
+        ----------
+        key : str
+            Key of the result.
+        data_manager : DataManager
+            The data the result was computed on.
+        end : datetime.date
+            End date of the run.
+        content : object
+            The result (picklable).
+
+        Returns
+        -------
+        None.
+
+        """
+
+        os.makedirs(self.folder, exist_ok = True)
+        header = {"end" : pd.Timestamp(end), "data" : self.dataFingerprint(data_manager, end)}
+        path   = self.path(key, end)
+
+        # Written aside then renamed, so that an interrupted write leaves no entry
+        with open(path + ".tmp", "wb") as file:
+            pickle.dump(header, file, protocol = pickle.HIGHEST_PROTOCOL)
+            pickle.dump(content, file, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+        self.evict()
+
+
+    def evict(self):
+        """Deletes the least recently used entries until the cache fits in max_size."""
+        entries = [(os.path.getmtime(x), os.path.getsize(x), x) for x in glob.glob(os.path.join(glob.escape(self.folder), "*.pkl"))]
+        size    = sum(x[1] for x in entries)
+        for _, length, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            os.remove(path)
+            size -= length
+
+
+    def clear(self):
+        """Deletes every entry."""
+        for path in glob.glob(os.path.join(glob.escape(self.folder), "*.pkl")):
+            os.remove(path)
+
+
+
+def source(x):
+    """Source code of a class (its name if the source is not available)."""
+    try:
+        return inspect.getsource(x)
+    except (OSError, TypeError):
+        return x.__module__ + "." + x.__qualname__
+
+
+def canonical(x, depth = 0):
+    """
+    Canonical text of a value, equal for equal values across runs: numbers,
+    strings, dates, containers, arrays and dataframes (hashed), and the
+    attributes of other objects up to depth levels (their class name below).
+
+    Parameters
+    ----------
+    x : object
+        The value.
+    depth : int, optional
+        Levels of objects whose attributes are described. The default is 0.
+
+    Returns
+    -------
+    str
+        The text.
+    """
+
+    if x is None or isinstance(x, (bool, int, float, str, bytes, np.generic)):
+        return repr(x)
+    if isinstance(x, (date, pd.Timestamp, np.datetime64)):
+        return repr(pd.Timestamp(x))
+    if isinstance(x, (list, tuple)):
+        return "[" + ", ".join(canonical(v, depth) for v in x) + "]"
+    if isinstance(x, dict):
+        return "{" + ", ".join(sorted(canonical(k) + ": " + canonical(v, depth) for k, v in x.items())) + "}"
+    if isinstance(x, np.ndarray):
+        return "array" + repr((x.shape, x.dtype.str)) + hashlib.blake2b(np.ascontiguousarray(x).tobytes(), digest_size = 16).hexdigest()
+    if isinstance(x, (pd.DataFrame, pd.Series)):
+        columns = list(x.columns) if isinstance(x, pd.DataFrame) else x.name
+        return type(x).__name__ + repr(columns) + canonical(pd.util.hash_pandas_object(x, index = True).to_numpy())
+    if depth > 0 and hasattr(x, "__dict__"):
+        return type(x).__qualname__ + canonical(vars(x), depth - 1)
+    return type(x).__qualname__
\ No newline at end of file
@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Mon Jun 21 09:12:44 2021
+
+This script contains ResultStore class, used to save the results of backtests
+(trades and track records) in a compact binary columnar format.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy`, `pandas` be installed within
+the Python environment you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * encodeFrame - Converts a dataframe into a dictionnary of numpy arrays.
+    * decodeFrame - Converts a dictionnary of numpy arrays back into a dataframe.
+    * ResultStore - Partitioned dataset of backtest results.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+from datetime import date, datetime
+import glob
+import os
+import numpy as np
+import pandas as pd
+
+
+# Kinds of encoded columns
+NUMERIC    = 0
+DATE       = 1
+DICTIONARY = 2
+
+
+def _kind(values):
+    """Encoding used for an array of values."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return DATE
+    if pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+        return NUMERIC
+
+    notnull = values[pd.notnull(values)]
+    if len(notnull) > 0 and isinstance(notnull[0], (date, datetime)):
+        return DATE
+    return DICTIONARY
+
+
+def _encode(values):
+    """Encodes an array of values, returns (kind, values, dictionnary)."""
+    values = np.asarray(values)
+    kind   = _kind(values)
+
+    if kind == DATE:
+        return kind, pd.to_datetime(values).values.astype("datetime64[ns]").view("int64"), None
+    if kind == NUMERIC:
+        return kind, values, None
+
+    codes, uniques = pd.factorize(values)
+    dtype = np.int8 if len(uniques) < 2**7 else np.int16 if len(uniques) < 2**15 else np.int32
+    return kind, codes.astype(dtype), np.char.encode(np.asarray(uniques).astype(str), "utf-8")
+
+
+def _decode(kind, values, dictionnary):
+    """Decodes an array encoded by _encode."""
+    if kind == DATE:
+        return values.view("datetime64[ns]")
+    if kind == NUMERIC:
+        return values
+
+    uniques = np.append(np.char.decode(dictionnary, "utf-8").astype(object), None)
+    return uniques[values]
+
+
+def encodeFrame(df):
+    """
+    Converts a dataframe into a dictionnary of numpy arrays. Text columns are
+    dictionary-encoded (integer codes and the list of unique values) and dates
+    are stored as int64 (nanoseconds since epoch).
+
+    Parameters
+    ----------
+    df : pd.Dataframe
+        Dataframe to encode (the index is kept).
+
+    Returns
+    -------
+    arrays : dict(np.array)
+        Arrays, to be saved with np.savez.
+    """
+
+    columns = [df.index] + [df.iloc[:, i] for i in range(df.shape[1])]
+    names   = ["" if df.index.name is None else str(df.index.name)] + [str(x) for x in df.columns]
+
+    arrays  = {"names" : np.asarray(names, dtype = str), "kinds" : np.zeros(len(names), dtype = np.int8)}
+    for i, column in enumerate(columns):
+        kind, values, dictionnary = _encode(column)
+        arrays["kinds"][i]         = kind
+        arrays["values_" + str(i)] = values
+        if dictionnary is not None:
+            arrays["dict_" + str(i)] = dictionnary
+
+    return arrays
+
+
+def decodeFrame(arrays):
+    """
+    Converts a dictionnary of numpy arrays encoded by encodeFrame back into a
+    dataframe. Dates are returned as datetime64.
+
+    Parameters
+    ----------
+    arrays : dict(np.array)
+        Arrays, as returned by encodeFrame (or loaded by np.load).
+
+    Returns
+    -------
+    pd.Dataframe
+        The dataframe.
+    """
+
+    names   = arrays["names"]
+    kinds   = arrays["kinds"]
+    columns = [_decode(kinds[i], arrays["values_" + str(i)], arrays.get("dict_" + str(i)))
+               for i in range(len(names))]
+
+    df      = pd.DataFrame({i : columns[i] for i in range(1, len(names))},
+                           index = pd.Index(columns[0], name = names[0] if names[0] != "" else None))
+    df.columns = names[1:]
+    return df
+
+
+
+class ResultStore():
+    """Saves the results of backtests in a partitioned binary dataset. Each run
+    is one partition: <folder>/<kind>/run=<run>.npz, with kind "trades" (trades
+    of every strategy of the run, with a "strategy" column) or "equity" (track
+    records of the run). Many runs (ex: a parameter sweep) can be loaded back
+    at once.
+
+    Attributes
+    ----------
+    folder : str
+        Root folder of the dataset.
+    compress : boolean
+        Whether the partitions are compressed (smaller, slower).
+
+    Methods
+    -------
+    write(kind, run, df)
+        Writes a partition.
+    read(kind, run)
+        Reads a partition.
+    runs(kind)
+        Lists the runs of a kind.
+    load(kind, runs = None)
+        Reads and concatenates many runs.
+    exportCsv(kind, run, path)
+        Exports a partition in csv format.
+    """
+
+    def __init__(self, folder = "../out/results/", compress = False):
+        """
+        Constructor.
+
+        Parameters
+        ----------
+        folder : str, optional
+            Root folder of the dataset. The default is "../out/results/".
+        compress : boolean, optional
+            Whether the partitions are compressed. The default is False.
+
+        Returns
+        -------
+        None.
+
+        """
+
+        self.folder   = folder
+        self.compress = compress
+
+
+    def path(self, kind, run):
+        """Path of a partition."""
+        return os.path.join(self.folder, kind, "run=" + str(run) + ".npz")
+
+
+    def write(self, kind, run, df):
+        """
+        Writes a dataframe as a partition, replacing it if it exists.
+
+        Parameters
+        ----------
+        kind : str
+            Kind of result ("trades" or "equity").
+        run : str
+            Name of the run.
+        df : pd.Dataframe or pd.Series
+            Results.
+
+        Returns
+        -------
+        path : str
+            Path of the partition.
+        """
+
+        path = self.path(kind, run)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+
+        if isinstance(df, pd.Series):
+            df = df.to_frame()
+
+        save = np.savez_compressed if self.compress else np.savez
+        with open(path, "wb") as file:
+            save(file, **encodeFrame(df))
+        return path
+
+
+    def read(self, kind, run):
+        """Reads a partition as a dataframe."""
+        with np.load(self.path(kind, run)) as arrays:
+            return decodeFrame(arrays)
+
+
+    def runs(self, kind):
+        """Lists the runs saved for a kind of result."""
+        files = glob.glob(os.path.join(glob.escape(os.path.join(self.folder, kind)), "run=*.npz"))
+        return sorted(os.path.basename(x)[4:-4] for x in files)
+
+
+    def load(self, kind, runs = None):
+        """
+        Reads and concatenates many runs.
+
+        Parameters
+        ----------
+        kind : str
+            Kind of result ("trades" or "equity").
+        runs : list, optional
+            Runs to load. The default is None (all runs).
+
+        Returns
+        -------
+        pd.Dataframe
+            Trades are concatenated by rows, with a "run" column. Track records
+            are concatenated by columns, with (run, strategy) columns.
+        """
+
+        runs   = self.runs(kind) if runs is None else list(runs)
+        frames = [self.read(kind, run) for run in runs]
+        if len(frames) == 0:
+            return pd.DataFrame()
+
+        if kind == "equity":
+            return pd.concat(frames, axis = 1, keys = runs, names = ["run", "strategy"])
+        return pd.concat(frames, keys = runs, names = ["run", None]).reset_index(level = 0)
+
+
+    def exportCsv(self, kind, run, path):
+        """Exports a partition in csv format."""
+        self.read(kind, run).to_csv(path)
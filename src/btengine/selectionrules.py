@@ -14,13 +14,17 @@ CHANGELOG:
     1.0.0
         - File created with main functions
         
-This script requires that `abc`, `tqdm`, `pandas` be installed within 
+This script requires that `abc`, `numpy`, `pandas` be installed within 
 the Python environment you are running this script in.
 
 This file can also be imported as a module and contains the following
 methods:
 
-    * SelectionRules - Save an object in pickle format at the desired path.
+    * SelectionRules     - Save an object in pickle format at the desired path.
+    * newTransactions    - Empty dataframe of transactions.
+    * appendTransactions - Appends transactions, keeping the types of the columns.
+    * exportTransactions - Transactions with the text labels of the positions.
+    * transactionStamp   - Date part of the labels of the positions.
     
 THIS FILE IS PROTECTED BY GNU General Public License v3.0
 ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
@@ -28,11 +32,11 @@ ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
 
 
 # imports
-from datetime import date, timedelta 
+from datetime import date, datetime, time, timedelta 
 import btengine.financefunctions as financeFunctions
+import numpy as np
 import pandas as pd
 from abc import ABC, abstractmethod
-from tqdm import tqdm
 
 
 class SelectionRules(ABC):    
@@ -48,6 +52,15 @@ class SelectionRules(ABC):
     In your own scripts, the following modules are required:
         from SelectionRules import SelectionRules
 
+    Indicators are computed in the dtype of the data manager (see 
+    DataManager.dtype).
+
+    Positions are identified by integers (TR_POS, the row of their opening
+    transaction) and symbols are stored as categories (see 
+    DataManager.symbolType): filters, joins and groupbys of the ledgers run on
+    integer arrays. Text labels are only generated when the ledgers are 
+    exported (see exportTransactions).
+
     Attributes
     ----------
     data_manager : pd.Dataframe
@@ -68,12 +81,20 @@ class SelectionRules(ABC):
         Computes the rolling annualized standard deviation over ndays
     rebalancePosition
         Rebalances a position in a dataframe of transactions.
+    rebalance_to
+        Rebalances the whole book to target weights, in one step.
     openPosition
         Opens a position in a dataframe of transactions.
     closePosition
         Closes a position in a dataframe of transactions.
     getOpenPositions
         Gets a list of open positions from a dataframe of transactions.
+    update
+        Updates the indicators of the strategy after new bars (live trading).
+    getState
+        State of the strategy saved in checkpoints (None by default).
+    setState
+        Restores the state of the strategy from a checkpoint.
     """
     
     def __init__(self, data_manager, name = "Unknown"):
@@ -104,20 +125,70 @@ class SelectionRules(ABC):
         return(transactions)
     
     
+    def update(self, index):
+        """Called by BacktestEngine.step after new bars have been appended to
+        the DataManager, before compute_selection. Strategies holding 
+        precomputed indicators should extend them for the new bars only, so 
+        that the cost of a step does not depend on the length of the history.
+
+        Parameters
+        ----------
+        index : pd.DatetimeIndex
+            Dates of the new bars.
+        """
+        
+        pass
+    
+    
+    def getState(self):
+        """State of the strategy saved with the checkpoints of a rebalancing
+        (ex: cursors of cached indicators). Must be picklable. Strategies 
+        whose selection only depends on the data and the transactions do 
+        not need to override it.
+
+        Returns
+        -------
+        state : object
+            The state (default: None).
+        """
+        
+        return None
+    
+    
+    def setState(self, state):
+        """Restores the state returned by getState when a rebalancing is resumed.
+
+        Parameters
+        ----------
+        state : object
+            The state saved in the checkpoint.
+        """
+        
+        pass
+    
+    
     def rebalancePosition(self, transactions, transaction_id, timestamp, new_weight):
         """
-        Rebalance a position in a dataframe of transactions.
+        Rebalance a position in a dataframe of transactions: the position is 
+        closed and reopened with the new weight (as a new position). Only 
+        the weight traded is charged: the closing has a fees coefficient of 0
+        and the new position a fees coefficient of |new - old weight| / new weight.
 
         Parameters
         ----------
         transactions : pd.Dataframe
             List of transactions.
-        quote : string
-            Quote to open the transaction on.
+        transaction_id : int
+            TR_POS of the position to rebalance.
         timestamp : datetime.date
-            The date of opening position.
+            The date of the rebalancing.
         new_weight : float
-            New weight of the position.
+            New weight of the position (0 closes it).
+
+        Raises
+        ------
+        ValueError
+            If the position is not in the transactions.
 
         Returns
         -------
@@ -125,38 +196,93 @@ class SelectionRules(ABC):
             List of transactions (updated).
         """
         
-        quote = transaction_id.split("_")[1]
+        position = transactions[transactions.TR_POS.values == transaction_id]
+        if position.empty:
+            raise ValueError("[-] Unknown position " + str(transaction_id) + ".")
+        position = position.iloc[0]
+        weight   = float(position.weight)
         
-        # If partial sellof
-        if transactions[transactions.TR_POS == transaction_id].weight.values[0] > new_weight:
-
-            # Closing current transaction
-            transaction = [transaction_id, quote, timestamp, 0, 'CLOSE',
-                           transactions[transactions.TR_POS == transaction_id].weight.values[0] - new_weight, 
-                           "REBALANCE"]
-            
-            transactions.loc[len(transactions)] = transaction
+        if new_weight == weight:
+            return transactions
+        if new_weight == 0:
+            return SelectionRules.closePosition(transactions, transaction_id, timestamp)
         
-            # Opening a transaction with the new weight
-            transaction    = [transaction_id + "Rb", quote, timestamp, new_weight, 'OPEN', 0.0, "REBALANCE"]
-            transactions.loc[len(transactions)] = transaction
+        rows = {"TR_POS"     : [transaction_id, len(transactions) + 1],
+                "symbol"     : [position.symbol] * 2,
+                "date"       : [timestamp] * 2,
+                "weight"     : [0, new_weight],
+                "action"     : ['CLOSE', 'OPEN'],
+                "fees_coeff" : [0.0, abs(new_weight - weight) / abs(new_weight)],
+                "label"      : ["REBALANCE"] * 2}
         
+        return appendTransactions(transactions, rows)
+    
+    
+    def rebalance_to(transactions, target_weights, timestamp, tolerance = 1e-12):
+        """
+        Rebalances the whole book to target weights, in one step: the weights
+        held on every symbol are compared to the targets, and all the closing,
+        opening and resizing transactions are appended at once.
         
-        # If reinforcement
-        elif transactions[transactions.TR_POS == transaction_id].weight.values[0] < new_weight:
+            - symbols held but not targeted (or targeted at 0) are closed (SELL);
+            - symbols targeted but not held are opened (BUY);
+            - symbols whose weight changes are closed with a fees coefficient of
+              0 and reopened with the target weight (REBALANCE, as a new 
+              position), with a fees coefficient of |target - weight| / target, 
+              so that only the weight traded is charged.
 
-            # Closing current transaction
-            transaction = [transaction_id, quote, timestamp, 0, 'CLOSE', 0.0, "REBALANCE"]
-            transactions.loc[len(transactions)] = transaction
-        
-            # Opening a transaction with the new weight
-            transaction    = [transaction_id + "Rb", quote, timestamp, 0, 'OPEN', 
-                              transactions[transactions.TR_POS == transaction_id].weight.values[0] + new_weight, "REBALANCE"]
-            
-            transactions.loc[len(transactions)] = transaction      
-            
-        return transactions
+        Parameters
+        ----------
+        transactions : pd.Dataframe
+            List of transactions.
+        target_weights : pd.Series or dict
+            Target weight of every symbol (in % of the capital).
+        timestamp : datetime.date
+            The date of the rebalancing.
+        tolerance : float, optional
+            Changes of weights ignored. The default is 1e-12.
 
+        Returns
+        -------
+        transactions : pd.Dataframe
+            List of transactions (updated).
+        """
+        
+        targets  = pd.Series(target_weights, dtype = float)
+        opens    = SelectionRules.getOpenPositions(transactions)
+        opens    = opens[opens.action == "OPEN"]
+        held     = opens.weight.astype(float).groupby(opens.symbol.values, observed = True).sum()
+        
+        symbols  = held.index.union(targets.index)
+        current  = held.reindex(symbols, fill_value = 0.0).to_numpy()
+        target   = targets.reindex(symbols, fill_value = 0.0).to_numpy()
+        changed  = np.abs(target - current) > tolerance
+        
+        # Every position of a symbol whose weight changes is closed
+        closing  = opens[opens.symbol.isin(symbols[changed])]
+        sold     = targets.reindex(closing.symbol, fill_value = 0.0).to_numpy() == 0
+        closes   = pd.DataFrame({"TR_POS"     : closing.TR_POS.values,
+                                 "symbol"     : closing.symbol.values,
+                                 "date"       : [timestamp] * len(closing),
+                                 "weight"     : 0,
+                                 "action"     : 'CLOSE',
+                                 "fees_coeff" : np.where(sold, 1.0, 0.0),
+                                 "label"      : np.where(sold, "SELL", "REBALANCE")})
+        
+        # Then reopened with its target weight
+        opening  = changed & (target != 0)
+        new      = current[opening] == 0
+        quotes   = symbols[opening].astype(str)
+        first    = len(transactions) + len(closes)
+        opens    = pd.DataFrame({"TR_POS"     : np.arange(first, first + len(quotes)),
+                                 "symbol"     : quotes,
+                                 "date"       : [timestamp] * len(quotes),
+                                 "weight"     : target[opening],
+                                 "action"     : 'OPEN',
+                                 "fees_coeff" : np.abs(target[opening] - current[opening]) / np.abs(target[opening]),
+                                 "label"      : np.where(new, "BUY", "REBALANCE")})
+        
+        return appendTransactions(transactions, pd.concat([closes, opens], ignore_index = True))
     
     
     def openPosition(transactions, quote, timestamp, weight):
@@ -180,12 +306,10 @@ class SelectionRules(ABC):
             List of transactions (updated).
         """
         
-        transaction_id = "TR_" + quote + "_" + timestamp.strftime("%Y%m%d")
-        transaction    = [transaction_id, quote, timestamp, weight, 'OPEN', 1.0, "BUY"]
-        
-        transactions.loc[len(transactions)] = transaction
+        transaction = {"TR_POS" : [len(transactions)], "symbol" : [quote], "date" : [timestamp], "weight" : [weight],
+                       "action" : ['OPEN'], "fees_coeff" : [1.0], "label" : ["BUY"]}
         
-        return transactions
+        return appendTransactions(transactions, transaction)
     
     
     def closePosition(transactions, transaction_id, timestamp):
@@ -196,12 +320,15 @@ class SelectionRules(ABC):
         ----------
         transactions : pd.Dataframe
             List of transactions.
-        quote : string
-            Quote to open the transaction on.
+        transaction_id : int
+            TR_POS of the position to close.
         timestamp : datetime.date
-            The date of opening position.
-        weight : float
-            Weight of the transaction expressed in % of your capita.
+            The date of closing position.
+
+        Raises
+        ------
+        ValueError
+            If the position is not in the transactions.
 
         Returns
         -------
@@ -209,12 +336,14 @@ class SelectionRules(ABC):
             List of transactions (updated).
         """
         
-        quote = transaction_id.split("_")[1]
-        transaction    = [transaction_id, quote, timestamp, 0, 'CLOSE', 1.0, "SELL"]
+        symbol = transactions.symbol[transactions.TR_POS.values == transaction_id]
+        if symbol.empty:
+            raise ValueError("[-] Unknown position " + str(transaction_id) + ".")
         
-        transactions.loc[len(transactions)] = transaction
+        transaction = {"TR_POS" : [transaction_id], "symbol" : [symbol.iloc[0]], "date" : [timestamp], "weight" : [0],
+                       "action" : ['CLOSE'], "fees_coeff" : [1.0], "label" : ["SELL"]}
         
-        return transactions
+        return appendTransactions(transactions, transaction)
     
     
     def getOpenPositions(transactions):
@@ -253,10 +382,10 @@ class SelectionRules(ABC):
             If the start date is superior to the end date. 
         """
                     
-        momentums = self.data_manager.getCumulativeReturns(start, end).copy(deep=True)
-        
-        for ticker in tqdm(momentums.columns):
-            momentums[ticker] = momentums[ticker].rolling(ndays).apply(financeFunctions.momentum, raw=False)
+        with self.data_manager.profiler.phase("indicator:computeMomentum"):
+            momentums = self.data_manager.getCumulativeReturns(start, end)
+            momentums = financeFunctions.rolling_momentum(momentums, ndays, self.data_manager.bars_per_year, 
+                                                         dtype = self.data_manager.dtype)
         
         momentums.index = pd.to_datetime(momentums.index)
         return momentums
@@ -275,10 +404,9 @@ class SelectionRules(ABC):
         end : datetime.date
             Date of the last datapoint.
         """
-        SD  = self.data_manager.getTimeFrame("returns", start, end).copy(deep=True)
-        
-        for ticker in tqdm(SD.columns):
-            SD[ticker]  = SD[ticker].rolling(ndays).apply(financeFunctions.sd_pos, raw=False)
+        with self.data_manager.profiler.phase("indicator:computeSD"):
+            SD  = self.data_manager.getTimeFrame("returns", start, end)
+            SD  = financeFunctions.rolling_sd_pos(SD, ndays, dtype = self.data_manager.dtype)
         
         SD.index = pd.to_datetime(SD.index)
         return SD
@@ -297,9 +425,9 @@ class SelectionRules(ABC):
             Date of the last datapoint.
             
         """
-        VaR  = self.data_manager.getTimeFrame("returns", start, end).copy(deep=True)
-        for ticker in tqdm(VaR.columns):
-            VaR[ticker]  = VaR[ticker].rolling(ndays).apply(financeFunctions.modVaR, raw=False)
+        with self.data_manager.profiler.phase("indicator:computeVaR"):
+            VaR  = self.data_manager.getTimeFrame("returns", start, end)
+            VaR  = financeFunctions.rolling_modVaR(VaR, ndays, dtype = self.data_manager.dtype)
 
         VaR.index = pd.to_datetime(VaR.index)
         return VaR
@@ -317,10 +445,102 @@ class SelectionRules(ABC):
         end : datetime.date
             Date of the last datapoint.
         """
-        vol = self.data_manager.getTimeFrame("returns", start, end).copy(deep=True)
-        
-        for ticker in tqdm(vol.columns):
-            vol[ticker] = vol[ticker].rolling(ndays).std()*252**0.5
+        with self.data_manager.profiler.phase("indicator:computeSTD"):
+            vol = self.data_manager.getTimeFrame("returns", start, end)
+            vol = vol.rolling(ndays).std()*self.data_manager.bars_per_year**0.5
+            vol = vol.astype(self.data_manager.dtype, copy = False)
             
         vol.index = pd.to_datetime(vol.index)   
-        return vol
\ No newline at end of file
+        return vol
+
+
+
+def newTransactions(data_manager = None):
+    """
+    Empty dataframe of transactions: TR_POS (int, row of the opening 
+    transaction of the position), symbol (categories of the symbols of the 
+    data manager, see DataManager.symbolType), date, weight, action 
+    (categories OPEN and CLOSE), fees_coeff and label.
+
+    Parameters
+    ----------
+    data_manager : DataManager, optional
+        Data whose symbols are interned. The default is None (symbols added
+        as they are traded).
+
+    Returns
+    -------
+    transactions : pd.Dataframe
+        Empty list of transactions.
+    """
+    
+    symbols = data_manager.symbolType() if data_manager is not None else pd.CategoricalDtype([])
+    return pd.DataFrame({"TR_POS"     : pd.Series([], dtype = np.int64),
+                         "symbol"     : pd.Series([], dtype = symbols),
+                         "date"       : pd.Series([], dtype = object),
+                         "weight"     : pd.Series([], dtype = float),
+                         "action"     : pd.Series([], dtype = pd.CategoricalDtype(["OPEN", "CLOSE"])),
+                         "fees_coeff" : pd.Series([], dtype = float),
+                         "label"      : pd.Series([], dtype = object)})
+
+
+def appendTransactions(transactions, rows):
+    """
+    Appends rows to a dataframe of transactions, converted to the types of 
+    its columns (symbols unknown to its categories are added to them).
+
+    Parameters
+    ----------
+    transactions : pd.Dataframe
+        List of transactions.
+    rows : dict or pd.Dataframe
+        Transactions to append (same columns).
+
+    Returns
+    -------
+    transactions : pd.Dataframe
+        List of transactions (updated).
+    """
+    
+    rows = pd.DataFrame(rows, columns = transactions.columns)
+    if isinstance(transactions.symbol.dtype, pd.CategoricalDtype):
+        unknown = pd.Index(pd.unique(rows.symbol.astype(str))).difference(transactions.symbol.cat.categories)
+        if len(unknown) > 0:
+            transactions = transactions.assign(symbol = transactions.symbol.cat.add_categories(unknown))
+    
+    return pd.concat([transactions, rows.astype(transactions.dtypes.to_dict())], ignore_index = True)
+
+
+def exportTransactions(transactions):
+    """
+    Dataframe of transactions with text columns, for the csv files and the
+    result store: positions are labelled TR_<symbol>_<date>_<TR_POS> (date 
+    of the opening, see transactionStamp).
+
+    Parameters
+    ----------
+    transactions : pd.Dataframe
+        List of transactions.
+
+    Returns
+    -------
+    transactions : pd.Dataframe
+        List of transactions, labelled.
+    """
+    
+    opens  = transactions[transactions.action == "OPEN"]
+    labels = pd.Series(["TR_" + str(symbol) + "_" + transactionStamp(pd.Timestamp(x)) + "_" + str(i) 
+                        for i, symbol, x in zip(opens.TR_POS, opens.symbol, opens.date)], 
+                       index = opens.TR_POS.values, dtype = object)
+    
+    return transactions.assign(TR_POS = transactions.TR_POS.map(labels), 
+                               symbol = transactions.symbol.astype(str), 
+                               action = transactions.action.astype(str))
+
+
+def transactionStamp(timestamp):
+    """Date part of the labels of the positions opened at timestamp (intraday 
+    positions are labelled down to the minute)."""
+    if isinstance(timestamp, datetime) and timestamp != datetime.combine(timestamp.date(), time()):
+        return timestamp.strftime("%Y%m%d%H%M")
+    return timestamp.strftime("%Y%m%d")
\ No newline at end of file
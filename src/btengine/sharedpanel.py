@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Fri Jun 25 14:26:51 2021
+
+This script contains SharedPanel class, used to share the data of a
+DataManager between processes without copying it.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy`, `pandas` be installed within
+the Python environment you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * SharedPanel - Dataframes stored in shared memory.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+
+
+class SharedPanel():
+    """Dataframes (dates x symbols) sharing the same dates, stored in shared
+    memory blocks. The process publishing the data owns the blocks; other
+    processes attach to them with a handle (a small picklable dictionnary)
+    and get dataframes which are views on the shared memory, without copy.
+
+    Attached dataframes must be considered as read-only. Workers are expected
+    to be started by the owner (multiprocessing), so that they share its
+    resource tracker: the blocks are freed by the owner (see close), or by the
+    tracker if the owner dies.
+
+    Attributes
+    ----------
+    handle : dict
+        Names of the blocks, shape, dtype, symbols and index name, to be sent
+        to the workers.
+    data : dict(pd.Dataframe)
+        Dataframes viewing the shared memory.
+    owner : boolean
+        Whether this process created the blocks (and must unlink them).
+
+    Methods
+    -------
+    publish(data, dtype = float)
+        Copies dataframes into shared memory.
+    attach(handle)
+        Attaches to dataframes published by another process.
+    close
+        Detaches from the shared memory (and frees it if owner).
+    """
+
+    def __init__(self, handle, blocks, owner):
+        self.handle = handle
+        self.blocks = blocks
+        self.owner  = owner
+        self.data   = self.views()
+
+
+    @classmethod
+    def publish(cls, data, dtype = float):
+        """
+        Copies dataframes sharing the same dates and symbols into shared memory.
+
+        Parameters
+        ----------
+        data : dict(pd.Dataframe)
+            Dataframes to share (ex: DataManager.data).
+        dtype : np.dtype, optional
+            Floating type of the shared arrays. The default is float64.
+
+        Returns
+        -------
+        SharedPanel
+            The panel, owner of the blocks.
+        """
+
+        first   = next(iter(data.values()))
+        shape   = (len(first.index), len(first.columns))
+        handle  = {"shape"   : shape,
+                   "dtype"   : np.dtype(dtype).str,
+                   "symbols" : list(first.columns),
+                   "name"    : first.index.name,
+                   "blocks"  : {}}
+
+        blocks  = {}
+        arrays  = {"__index__" : pd.DatetimeIndex(first.index).values.astype("datetime64[ns]").view("int64")}
+        arrays.update({column : x.reindex(index = first.index, columns = first.columns).to_numpy(dtype = dtype)
+                       for column, x in data.items()})
+
+        for column, values in arrays.items():
+            block = shared_memory.SharedMemory(create = True, size = max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype = values.dtype, buffer = block.buf)[...] = values
+            blocks[column] = block
+            handle["blocks"][column] = block.name
+
+        return cls(handle, blocks, True)
+
+
+    @classmethod
+    def attach(cls, handle):
+        """
+        Attaches to dataframes published by another process.
+
+        Parameters
+        ----------
+        handle : dict
+            Handle of the published panel.
+
+        Returns
+        -------
+        SharedPanel
+            The panel, viewing the shared memory.
+        """
+
+        blocks = {column : shared_memory.SharedMemory(name = name) for column, name in handle["blocks"].items()}
+        return cls(handle, blocks, False)
+
+
+    def views(self):
+        """Dataframes viewing the shared memory."""
+        n, m    = self.handle["shape"]
+        dates   = np.ndarray((n,), dtype = np.int64, buffer = self.blocks["__index__"].buf)
+        index   = pd.DatetimeIndex(dates.view("datetime64[ns]"), name = self.handle["name"])
+        columns = pd.Index(self.handle["symbols"])
+        dtype   = np.dtype(self.handle.get("dtype", float))
+
+        return {column : pd.DataFrame(np.ndarray((n, m), dtype = dtype, buffer = block.buf),
+                                      index = index, columns = columns, copy = False)
+                for column, block in self.blocks.items() if column != "__index__"}
+
+
+    def close(self):
+        """Detaches from the shared memory. The owner also frees it: attached
+        processes must have finished using it."""
+        self.data = None
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
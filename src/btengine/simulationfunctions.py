@@ -13,21 +13,34 @@ CHANGELOG:
     1.0.0
         - File created with main functions
         
-This script requires that `pandas`, `numpy`, `scipy.stats` be installed within 
+This script requires that `pandas`, `numpy`, `scipy.special` be installed within 
 the Python environment you are running this script in.
 
 This file can also be imported as a module and contains the following
 methods:
 
-    * SelectionRules - Save an object in pickle format at the desired path.
+    * simulate          - Lognormal (GBM) price paths of a symbol.
+    * gbm_bands         - GBM paths of a symbol reduced to their mean and ranked paths.
+    * bootstrap_indices - Bars resampled by a (stationary or circular) block bootstrap.
+    * block_bootstrap   - Paths of portfolios resampling blocks of historical returns jointly across assets.
+    * master_seed       - Master seed of a simulation.
+    * unit_seed         - Seed of a work unit, derived from the master seed.
+    * run_units         - Runs work units, in a process pool if needed.
     
 THIS FILE IS PROTECTED BY GNU General Public License v3.0
 ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
 """
 
+from concurrent.futures import ProcessPoolExecutor
+import zlib
 import numpy as np
 import pandas as pd
-from scipy.stats import norm
+
+
+# Historical returns and weights of the portfolios of the bootstrap, set once
+# per worker (see set_history)
+_history = None
+_weights = None
 
 
 def get_drift(data, return_type='log'):
@@ -50,7 +63,9 @@ def get_drift(data, return_type='log'):
         return drift
 
 
-def daily_returns(data, days, iterations, return_type='log', vol_multiplier = 1):
+def daily_returns(data, days, iterations, return_type='log', vol_multiplier = 1, dtype = np.float64, rng = None):
+    from scipy.special import ndtri
+    
     ft = get_drift(data, return_type)
     
     # Computes volatility
@@ -65,33 +80,297 @@ def daily_returns(data, days, iterations, return_type='log', vol_multiplier = 1)
         except:
             stv = ((data/data.shift(1))-1).std() * vol_multiplier
             
-    # Drifted normal distribution / Cauchy distribution
-    dr = np.exp(ft + stv * norm.ppf(np.random.rand(days, iterations)))
+    # Drifted normal distribution / Cauchy distribution (ndtri is the quantile
+    # function of the standard normal distribution, computed in dtype)
+    u  = rng.random((days, iterations)) if rng is not None else np.random.rand(days, iterations)
+    dr = np.exp((ft + stv * ndtri(u.astype(dtype))).astype(dtype))
     
     return dr
 
 
-def simulate(data, days, iterations, return_type='log', vol_multiplier = 1):
+def simulate(data, days, iterations, return_type='log', vol_multiplier = 1, dtype = np.float64, rng = None):
     """
-    Simulates
+    Simulates iterations price paths of days bars. The paths are stored in
+    dtype (ex: float32 for large simulations), but the price of each path is
+    compounded in float64. Random numbers are drawn from rng (np.random if None).
     """
     
     # Generate daily returns
-    returns = daily_returns(data, days, iterations, return_type, vol_multiplier)
+    returns = daily_returns(data, days, iterations, return_type, vol_multiplier, dtype, rng)
     
     # Create empty matrix
     price_list = np.zeros_like(returns)
     
     # Put the last actual price in the first row of matrix. 
-    price_list[0] = data.iloc[-1]
+    price         = np.full(iterations, data.iloc[-1], dtype = np.float64)
+    price_list[0] = price
     
     # Calculate the price of each day
     for t in range(1, days):
-        price_list[t] = price_list[t-1] * returns[t]
+        price         = price * returns[t]
+        price_list[t] = price
           
     return pd.DataFrame(price_list)
 
 
+def gbm_bands(data, days, iterations, ranks = (), vol_multiplier = 1, dtype = np.float64, seed = None):
+    """
+    Work unit of the GBM simulation: simulates the paths of a symbol (see
+    simulate) and reduces them to their mean and to the paths of the given
+    ranks, so that the paths are not kept in memory.
+    
+    Parameters
+    ----------
+    data : pd.Series
+        Prices of the symbol.
+    days : int
+        Number of bars simulated after the last price.
+    iterations : int
+        Number of paths.
+    ranks : list(int), optional
+        Ranks (ascending final growth) of the paths to return.
+    vol_multiplier : float, optional
+        Volatility multiplier. The default is 1.
+    dtype : np.dtype, optional
+        Floating type of the paths. The default is float64.
+    seed : np.random.SeedSequence, optional
+        Seed of the unit (see unit_seed). The default is None.
+    
+    Returns
+    -------
+    mean : np.array
+        Mean cumulative growth from the last price (days).
+    paths : list(np.array)
+        For every rank, cumulative growth of the path of this rank (days).
+    """
+    
+    y      = simulate(data, days + 1, iterations, 'log', vol_multiplier, dtype, np.random.default_rng(seed))
+    y      = y.to_numpy(dtype = float)
+    growth = y[1:] / y[:1]
+    
+    # NaN paths (no last price) are ignored by the mean and ranked last
+    valid  = np.isfinite(growth)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        mean = np.where(valid, growth, 0).sum(axis = 1) / valid.sum(axis = 1)
+    order  = np.argsort(growth[-1], kind = "stable")
+    
+    return mean, [growth[:, order[rank]] for rank in ranks]
+
+
+def bootstrap_indices(rng, n, days, iterations, block = 5, method = "stationary"):
+    """
+    Bars of the history resampled by every path, drawn in one vectorized step.
+    Both methods wrap around the end of the history.
+    
+        - circular: blocks of exactly block bars (rounded to the nearest 
+          integer), starting at random bars.
+        - stationary: blocks of random length (geometric, of mean block): at
+          each bar, a new block starts with probability 1 / block.
+    
+    Parameters
+    ----------
+    rng : np.random.Generator
+        Random generator.
+    n : int
+        Number of bars of the history.
+    days : int
+        Number of bars of every path.
+    iterations : int
+        Number of paths.
+    block : float, optional
+        (Mean) length of the blocks, at least 1. The default is 5.
+    method : str, optional
+        "stationary" or "circular". The default is "stationary".
+    
+    Returns
+    -------
+    np.array
+        Bars of the history (days x iterations).
+    """
+    
+    if not block >= 1:
+        raise ValueError("[-] The length of the blocks must be at least 1, got " + str(block) + ".")
+    
+    steps = np.arange(days)[:, None]
+    
+    if method == "circular":
+        block  = int(round(block))
+        starts = rng.integers(0, n, size = (-(-days // block), iterations))
+        return (starts[steps[:, 0] // block] + steps % block) % n
+    
+    if method == "stationary":
+        new    = rng.random((days, iterations)) < 1 / block
+        new[0] = True
+        starts = rng.integers(0, n, size = (days, iterations))
+        
+        # Step at which the block of every bar started
+        first  = np.maximum.accumulate(np.where(new, steps, 0), axis = 0)
+        return (np.take_along_axis(starts, first, axis = 0) + steps - first) % n
+    
+    raise NotImplementedError("[-] The bootstrap method " + method + " has not been implemented yet.")
+
+
+def set_history(x, weights = None):
+    """Sets the historical returns resampled by bootstrap_chunk and the 
+    weights of the portfolios (assets x portfolios) applied to the paths 
+    (worker initializer)."""
+    global _history, _weights
+    _history, _weights = x, weights
+
+
+def bootstrap_chunk(days, size, block, method, seed):
+    """
+    Work unit of block_bootstrap: size paths resampling the history given to
+    set_history, reduced to the paths of the portfolios.
+    
+    Returns
+    -------
+    total : np.array
+        Sum of the cumulative growths of the portfolios (days x portfolios).
+    final : np.array
+        Final growth of the portfolios on every path (size x portfolios).
+    """
+    
+    indices = bootstrap_indices(np.random.default_rng(seed), len(_history), days, size, block, method)
+    growth  = np.cumprod(1 + _history[indices].astype(np.float64), axis = 0) @ _weights
+    return growth.sum(axis = 1), growth[-1].astype(_history.dtype)
+
+
+def block_bootstrap(returns, days, iterations, ranks = (), block = 5, method = "stationary", seed = None,
+                    chunk_size = 1000, dtype = np.float64, workers = 1, weights = None):
+    """
+    Simulates paths of portfolios by resampling blocks of historical returns
+    jointly across assets (every asset of a path uses the same bars, which 
+    keeps their correlations and fat tails). The growth of a portfolio on a
+    path is the sum of the growths of its assets, weighted. Paths are 
+    computed in chunks of chunk_size paths, the work units, which only 
+    return the sum and the final value of their portfolios. The paths are 
+    ranked on the final value of every portfolio, so that the path of a rank
+    is one joint scenario of all its assets; these paths are then computed 
+    again from the seeds of their chunks. The results only depend on the 
+    seed and on chunk_size, not on the number of workers.
+    
+    Parameters
+    ----------
+    returns : pd.Dataframe
+        Historical returns (bars x assets).
+    days : int
+        Number of bars of every path.
+    iterations : int
+        Number of paths.
+    ranks : list(int), optional
+        Ranks (ascending final growth) of the paths to return for every portfolio.
+    block : float, optional
+        (Mean) length of the blocks. The default is 5.
+    method : str, optional
+        "stationary" or "circular" (see bootstrap_indices). The default is "stationary".
+    seed : int, optional
+        Master seed (see master_seed). The default is None.
+    chunk_size : int, optional
+        Number of paths of a work unit. The default is 1000.
+    dtype : np.dtype, optional
+        Floating type of the resampled returns. Growths are compounded in
+        float64. The default is float64.
+    workers : int, optional
+        Number of processes. The default is 1 (current process).
+    weights : np.array, optional
+        Weights of the assets in every portfolio (assets x portfolios). The
+        default is None (every asset is a portfolio).
+    
+    Returns
+    -------
+    mean : np.array
+        Mean cumulative growth of the portfolios (days x portfolios).
+    paths : list(np.array)
+        For every rank, cumulative growth of the path of this rank of every
+        portfolio (days x portfolios).
+    """
+    
+    x       = np.nan_to_num(np.asarray(returns, dtype = dtype))
+    n, m    = x.shape
+    weights = np.eye(m) if weights is None else np.asarray(weights, dtype = np.float64).reshape(m, -1)
+    seed    = master_seed(seed)
+    sizes   = [min(chunk_size, iterations - a) for a in range(0, iterations, chunk_size)]
+    units   = [(days, size, block, method, unit_seed(seed, k)) for k, size in enumerate(sizes)]
+    
+    total   = np.zeros((days, weights.shape[1]))
+    final   = []
+    for chunk_total, chunk_final in run_units(bootstrap_chunk, units, workers, set_history, (x, weights)):
+        total += chunk_total
+        final.append(chunk_final)
+    set_history(None)
+    
+    # Paths of the given ranks of every portfolio, resampled again from the 
+    # seeds of their chunks
+    order   = np.argsort(np.concatenate(final), axis = 0, kind = "stable")
+    paths   = []
+    for rank in ranks:
+        trials = order[rank]
+        chunks = trials // chunk_size
+        path   = np.empty((days, weights.shape[1]))
+        for k in np.unique(chunks):
+            portfolios = np.flatnonzero(chunks == k)
+            indices    = bootstrap_indices(np.random.default_rng(units[k][-1]), n, days, sizes[k], block, method)
+            growth     = np.cumprod(1 + x[indices[:, trials[portfolios] % chunk_size]].astype(np.float64), axis = 0)
+            path[:, portfolios] = np.einsum("dpm,mp->dp", growth, weights[:, portfolios])
+        paths.append(path)
+    
+    return total / iterations, paths
+
+
+def master_seed(seed = None):
+    """
+    Master seed of a simulation (random if seed is None), from which the seeds
+    of its work units are derived.
+    """
+    return np.random.SeedSequence(seed).entropy
+
+
+def unit_seed(seed, key):
+    """
+    Seed of a work unit: child of the master seed identified by key (int or
+    str, ex: index of a chunk, symbol). The seed of a unit does not depend on
+    the worker running it, nor on the other units.
+    """
+    if isinstance(key, str):
+        key = zlib.crc32(key.encode())
+    return np.random.SeedSequence(seed, spawn_key = (key,))
+
+
+def run_units(function, units, workers = 1, initializer = None, initargs = ()):
+    """
+    Runs function(*unit) for every unit, in a pool of workers processes if 
+    workers > 1. Results are yielded in the order of the units, as soon as 
+    they are available, so that they can be reduced on the fly.
+    
+    Parameters
+    ----------
+    function : function
+        Work function (must be importable by the workers).
+    units : list(tuple)
+        Arguments of every unit.
+    workers : int, optional
+        Number of processes. The default is 1 (current process).
+    initializer : function, optional
+        Called once in every process before the units (ex: set_history).
+    initargs : tuple, optional
+        Arguments of initializer.
+    """
+    
+    if len(units) == 0:
+        return
+    
+    if workers is None or workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for unit in units:
+            yield function(*unit)
+        return
+    
+    with ProcessPoolExecutor(workers, initializer = initializer, initargs = initargs) as pool:
+        yield from pool.map(function, *zip(*units), chunksize = max(len(units) // (4 * workers), 1))
+
+
 """
 def monte_carlo(tickers, data, days_forecast, iterations, start_date = '2000-1-1', return_type = 'log', vol_multiplier = 1):
 
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Jun 20 11:32:08 2021
+
+This script contains the functions used to generate synthetic market data, in
+the same format as the files downloaded from Yahoo Finance.
+
+@author:     Anthony
+@project:    Systematic strategies in the context of cryptocurrencies trading.
+@subproject: Backtesting Engine
+@version: 1.0.0
+
+CHANGELOG:
+    1.0.0
+        - File created with main functions
+
+This script requires that `numpy`, `pandas` be installed within
+the Python environment you are running this script in.
+
+This file can also be imported as a module and contains the following
+methods:
+
+    * generatePanel  - Generates prices and volumes for many symbols.
+    * generateMarket - Writes a synthetic market as Yahoo Finance csv files.
+
+THIS FILE IS PROTECTED BY GNU General Public License v3.0
+ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
+"""
+
+# Imports
+import os
+import numpy as np
+import pandas as pd
+import btengine.my_utils as my_utils
+
+
+def generatePanel(n_symbols = 100, n_bars = 1000, frequency = "1D", start = "2018-01-01", seed = 0,
+                  days_per_year = 365):
+    """
+    Generates prices (geometric brownian motions with random drifts and
+    volatilities) and volumes for many symbols. Symbols are listed at random
+    dates during the first half of the period, as new assets would be.
+
+    Parameters
+    ----------
+    n_symbols : int, optional
+        Number of symbols. The default is 100.
+    n_bars : int, optional
+        Number of bars. The default is 1000.
+    frequency : str, optional
+        Pandas frequency string of the bars. The default is "1D".
+    start : str, optional
+        Date of the first bar. The default is "2018-01-01".
+    seed : int, optional
+        Seed of the random generator. The default is 0.
+    days_per_year : int, optional
+        Number of trading days in a year, used to scale drifts and volatilities.
+        The default is 365.
+
+    Returns
+    -------
+    data : dict(pd.Dataframe)
+        Dataframes (dates x symbols) with keys open, high, low, close, volume.
+        Prices are NaN before the listing of a symbol.
+    """
+
+    rng     = np.random.default_rng(seed)
+    index   = pd.date_range(start, periods = n_bars, freq = frequency)
+    symbols = ["SYN" + str(i) + "-USD" for i in range(n_symbols)]
+    bars    = my_utils.barsPerYear(frequency, days_per_year)
+
+    # Annual drifts and volatilities, scaled to one bar
+    drift   = rng.normal(0.1, 0.5, n_symbols) / bars
+    vol     = rng.uniform(0.3, 1.5, n_symbols) / bars**0.5
+
+    log_returns = drift - vol**2 / 2 + vol * rng.standard_normal((n_bars, n_symbols))
+    close   = rng.uniform(0.1, 1000, n_symbols) * np.exp(np.cumsum(log_returns, axis = 0))
+    opens   = close * np.exp(vol * 0.25 * rng.standard_normal((n_bars, n_symbols)))
+    spread  = np.abs(vol * rng.standard_normal((n_bars, n_symbols)))
+    high    = np.maximum(opens, close) * (1 + spread)
+    low     = np.minimum(opens, close) / (1 + spread)
+    volume  = np.round(close * rng.lognormal(10, 1, n_symbols) * rng.lognormal(0, 0.5, (n_bars, n_symbols)))
+
+    # Listing dates
+    listed  = np.arange(n_bars)[:, None] >= rng.integers(0, max(n_bars // 2, 1), n_symbols)
+    listed[:, 0] = True
+
+    return {key : pd.DataFrame(np.where(listed, value, np.nan), index = index, columns = symbols)
+            for key, value in (("open", opens), ("high", high), ("low", low), ("close", close), ("volume", volume))}
+
+
+def generateMarket(folder, n_symbols = 100, n_bars = 1000, frequency = "1D", start = "2018-01-01", seed = 0):
+    """
+    Writes a synthetic market in folder: one csv file per symbol in the format
+    of Yahoo Finance (financial/<symbol>.csv) and the list of symbols
+    (named/quotes.csv), so that it can be loaded by a DataManager.
+
+    Parameters
+    ----------
+    folder : str
+        Output folder.
+    n_symbols : int, optional
+        Number of symbols. The default is 100.
+    n_bars : int, optional
+        Number of bars. The default is 1000.
+    frequency : str, optional
+        Pandas frequency string of the bars. The default is "1D".
+    start : str, optional
+        Date of the first bar. The default is "2018-01-01".
+    seed : int, optional
+        Seed of the random generator. The default is 0.
+
+    Returns
+    -------
+    quotes_file : str
+        Path to the list of symbols.
+    returns_folder : str
+        Folder containing the csv files.
+    """
+
+    quotes_file    = os.path.join(folder, "named", "quotes.csv")
+    returns_folder = os.path.join(folder, "financial", "")
+    os.makedirs(os.path.dirname(quotes_file), exist_ok = True)
+    os.makedirs(returns_folder, exist_ok = True)
+
+    data    = generatePanel(n_symbols, n_bars, frequency, start, seed)
+    daily   = my_utils.isDaily(frequency)
+    dates   = data["close"].index.strftime("%Y-%m-%d" if daily else "%Y-%m-%d %H:%M:%S+00:00")
+
+    for symbol in data["close"].columns:
+        x = pd.DataFrame({"Date" if daily else "Datetime" : dates,
+                          "Open"      : data["open"][symbol].values,
+                          "High"      : data["high"][symbol].values,
+                          "Low"       : data["low"][symbol].values,
+                          "Close"     : data["close"][symbol].values,
+                          "Adj Close" : data["close"][symbol].values,
+                          "Volume"    : data["volume"][symbol].values})
+        x.dropna().to_csv(returns_folder + symbol + ".csv", index = False)
+
+    pd.DataFrame({"Symbol" : data["close"].columns}).to_csv(quotes_file, index = False)
+
+    return quotes_file, returns_folder
@@ -8,21 +8,62 @@ This script contains visual clues for interpreting backtests performance
 @project:    Systematic strategies in the context of cryptocurrencies trading.
 @subproject: Backtesting Engine
 
-This script requires that `datetime` and `numpy` be installed within 
+This script requires that `datetime`, `numpy` and `matplotlib` be installed within 
 the Python environment you are running this script in.
 
 This file can also be imported as a module and contains the following
 methods:
 
+    * decimate           - Min/max decimation of a line before plotting.
     * plotReturns        - Plots returns from multiple strategies.
+    * plotReturnsAsync   - Plots returns in a background worker.
 
 THIS FILE IS PROTECTED BY GNU General Public License v3.0
 ANY INFRINGEMENT TO THE LICENSE MIGHT AND WILL RESULT IN LEGAL ACTIONS.
 """
 
 # Imports
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta
-import matplotlib.pyplot as plt  
+import numpy as np
+
+
+# Background worker used by plotReturnsAsync (created on first use)
+executor = None
+
+
+def decimate(x, y, max_points = 2000):
+    """
+    Min/max decimation of a line: the points are split into max_points / 2
+    buckets, and only the lowest and highest points of each bucket are kept (as
+    well as the first and the last points). The shape of the line is preserved.
+
+    Parameters
+    ----------
+    x : np.array
+        Abscissa of the points
+    y : np.array
+        Ordinates of the points
+    max_points : int
+        Maximum number of points kept (None to keep every point)
+    """
+    
+    n = len(y)
+    if max_points is None or n <= max_points:
+        return x, y
+    
+    buckets = max(max_points // 2 - 1, 1)
+    size    = int(np.ceil(n / buckets))
+    values  = np.concatenate([y, np.full(buckets * size - n, np.nan)]).reshape(buckets, size)
+    
+    lows    = np.argmin(np.where(np.isnan(values), np.inf, values), axis = 1)
+    highs   = np.argmax(np.where(np.isnan(values), -np.inf, values), axis = 1)
+    offsets = np.arange(buckets) * size
+    
+    keep    = np.concatenate([[0, n - 1], offsets + lows, offsets + highs])
+    keep    = np.unique(keep[keep < n])
+    
+    return x[keep], y[keep]
 
 
 def plotReturns(returns,
@@ -30,9 +71,12 @@ def plotReturns(returns,
                           "\nAuthor: Anthony Woznica"    
                           "\nNote: Backtests are limited due to Data time range. The benchmark used is the most traded cryptocurrencies.",
                 folder = "../out/",
-                name   = "Strategies Plot"):
+                name   = "Strategies Plot",
+                max_points = 2000,
+                preview    = False):
     """
-    Plots returns from multiple strategies.
+    Plots returns from multiple strategies. Long series are decimated before
+    being plotted, and the figure is released once saved.
 
     Parameters
     ----------
@@ -46,10 +90,21 @@ def plotReturns(returns,
         Folder where the image should be exported.
     name: str
         Name of the graph.
+    max_points: int
+        Maximum number of points plotted per strategy (None to plot every point).
+    preview: boolean
+        Smaller, low resolution and more decimated graph, faster to render.
     """
     
+    # matplotlib is slow to import, only runs which plot need it
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    
     data = returns
     
+    if preview:
+        max_points = min(max_points or 500, 500)
+    
     # Colors list
     colors = [(0, 0, 0), (31, 119, 180), (174, 199, 232), (255, 127, 14), (255, 187, 120),    
              (44, 160, 44), (152, 223, 138), (214, 39, 40), (255, 152, 150),    
@@ -63,33 +118,54 @@ def plotReturns(returns,
         r, g, b = colors[i]    
         colors[i] = (r / 255., g / 255., b / 255.)  
         
-    # Figure size   
-    plt.figure(figsize=(20, 9))
+    # Figure size (the figure is not managed by pyplot, so it is never kept in memory)
+    figure = Figure(figsize=(10, 4.5) if preview else (20, 9))
+    FigureCanvasAgg(figure)
     
     # Define a style for the graph 
-    ax = plt.subplot(111)    
+    ax = figure.add_subplot(111)    
     ax.spines["top"].set_visible(False)     
     ax.spines["right"].set_visible(False)    
     ax.spines["left"].set_visible(False)
     
-    plt.ylim(min(data.min()) - 0.05, max(data.max()) + 0.05)
-    plt.grid()
+    ax.set_ylim(min(data.min()) - 0.05, max(data.max()) + 0.05)
+    ax.grid()
     
-    names = data.columns.tolist() 
+    names  = data.columns.tolist() 
+    offset = min(timedelta(5), (data.index.max() - data.index.min()) / 20)
   
     # Plotting text
-    for rank, column in enumerate(names):     
-        plt.plot(data.index.values,    
-                data[column.replace("\n", " ")].values,    
-                lw=2.5, color=colors[rank])    
+    for rank, column in enumerate(names):
+        x, y = decimate(data.index.values, data[column.replace("\n", " ")].values, max_points)
+        ax.plot(x, y, lw=1.5 if preview else 2.5, color=colors[rank])    
   
-        y_pos = data[column][-1] 
+        y_pos = data[column].iloc[-1] 
 
-        plt.text(max(data.index) + timedelta(5), y_pos, column, fontsize=12, color=colors[rank])    
+        ax.text(data.index.max() + offset, y_pos, column, fontsize=12, color=colors[rank])    
     
     # Title and Subtext
-    plt.text(data.index[int(len(data.index)/2)], max(data.max()) + 0.1, name, fontsize=17, ha="center")    
-    plt.text(min(data.index), min(data.min()) - 0.15, subtext, fontsize=10)    
+    ax.text(data.index[int(len(data.index)/2)], max(data.max()) + 0.1, name, fontsize=17, ha="center")    
+    ax.text(data.index.min(), min(data.min()) - 0.15, subtext, fontsize=10)    
     
     # Saving file.
-    plt.savefig(folder + name + ".png", bbox_inches="tight", dpi=300)
\ No newline at end of file
+    figure.savefig(folder + name + ".png", bbox_inches="tight", dpi=72 if preview else 300)
+    figure.clear()
+    
+    
+def plotReturnsAsync(returns, *args, **kwargs):
+    """
+    Plots returns from multiple strategies in a background worker, so that the
+    rendering does not block the backtest. Parameters are the ones of plotReturns.
+
+    Returns
+    -------
+    concurrent.futures.Future
+        Future completed once the graph is saved.
+    """
+    
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers = 1)
+    
+    # The worker gets its own copy, the returns may change in the meantime
+    return executor.submit(plotReturns, returns.copy(), *args, **kwargs)
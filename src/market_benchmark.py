@@ -13,18 +13,32 @@ from btengine.datamanager import DataManager
 
 class MarketBenchmark(SelectionRules):
 
-    def __init__(self, dm, name = "Market"):
+    def __init__(self, dm, name = "Market", rebalance_days = None):
         """
         BE CAREFUL: THIS OBJECT DOES NOT TAKE INTO ACCOUNT NEWLY CREATED ASSETS TO REPRESENT THE MARKET.
-        IF YOU NEED TO DO SO, YOU NEED TO REBALANCE YOUR PORTOFOLIO.
+        IF YOU NEED TO DO SO, YOU NEED TO REBALANCE YOUR PORTOFOLIO: with rebalance_days, the portfolio
+        is rebalanced to equal weights on the listed assets every rebalance_days bars (see rebalance_to).
         """
         
         super().__init__(dm)
         self.name = name
+        self.rebalance_days = rebalance_days
+        self.last_rebalance = None
        
         
     def compute_selection(self, selection_date, transactions):
         
+        # Periodic rebalancing to equal weights on the assets listed on the previous bar
+        if self.rebalance_days is not None:
+            bar = self.data_manager.barIndex(selection_date)
+            if self.last_rebalance is None or bar - self.last_rebalance >= self.rebalance_days:
+                listed = self.data_manager.universeAt(self.data_manager.index[bar - 1]) if bar > 0 else []
+                if len(listed) > 0:
+                    transactions = SelectionRules.rebalance_to(transactions, {quote : 1 / len(listed) for quote in listed}, 
+                                                               selection_date)
+                    self.last_rebalance = bar
+            return transactions
+        
         open_positions     = SelectionRules.getOpenPositions(transactions)
         
         # BUY RULES TTD
@@ -38,6 +52,14 @@ class MarketBenchmark(SelectionRules):
     
         # Return the daily selection
         return transactions
+    
+    
+    def getState(self):
+        return self.last_rebalance
+    
+    
+    def setState(self, state):
+        self.last_rebalance = state
  
 
 if __name__ == '__main__':
@@ -28,7 +28,7 @@ class MostTraded(SelectionRules):
         
         # BUY RULES TTD
         # Buy market at the start of the backtest
-        for quote in self.data_manager.data["volume"].mean(axis = 0).sort_values().tail(self.n).index.to_list():
+        for quote in self.data_manager.averageVolume().sort_values().tail(self.n).index.to_list():
             if quote not in open_positions.symbol.to_list():
                 transactions   = SelectionRules.openPosition(transactions, quote, selection_date, 1 / self.n)
         
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Jun 26 16:02:37 2021
+
+Validation of the float32 compute mode (DataManager(dtype = "float32")): the
+panels, the indicators, the simulations and the backtests of the bundled data
+are computed in float32 and in float64, and the errors of float32 are reported.
+
+Usage (from the src folder):
+    python precision_report.py --ndays 14 --start 2021-01-01 --end 2021-05-28
+
+@author: Antho
+"""
+
+import argparse
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from btengine.backtestengine import BacktestEngine
+from btengine.datamanager import DataManager
+import btengine.simulationfunctions as sim
+from strategy_example import Momentum
+from market_benchmark import MarketBenchmark
+
+
+def errors(name, reference, value, floor = 1e-8):
+    """
+    Errors of value against the float64 reference.
+
+    Returns
+    -------
+    dict
+        Maximum absolute error, maximum and 99th percentile of the relative
+        error (on the values larger than floor in absolute value) and number
+        of values which are NaN in only one of the arrays.
+    """
+
+    reference = np.asarray(reference, dtype = float)
+    value     = np.asarray(value, dtype = float)
+    both      = np.isfinite(reference) & np.isfinite(value)
+    absolute  = np.abs(value - reference)[both]
+    large     = both & (np.abs(reference) > floor)
+    relative  = np.abs(value - reference)[large] / np.abs(reference[large])
+
+    return {"quantity"    : name,
+            "max_abs"     : absolute.max() if absolute.size > 0 else np.nan,
+            "max_rel"     : relative.max() if relative.size > 0 else np.nan,
+            "p99_rel"     : np.percentile(relative, 99) if relative.size > 0 else np.nan,
+            "nan_changes" : int((np.isfinite(reference) != np.isfinite(value)).sum())}
+
+
+def backtest(dm, ndays, start, end, fees):
+    """Equity curves and ledgers of a Momentum strategy and of the market."""
+    be = BacktestEngine(broker_fees = fees, capital = 800)
+    be.addSelectionRules(Momentum(dm, momentum_days = ndays, max_stocks = 25, name = "Momentum",
+                                  precalculated_folder = None))
+    be.addSelectionRules(MarketBenchmark(dm))
+    be.rebalance(start, end, showstate = False)
+    returns = be.computeReturns(start, end, plot = False, save = False)
+    return returns, be.transactions
+
+
+def precisionReport(ndays, start, end, trials, fees, seed):
+    """
+    Computes everything in float32 and float64 on the bundled data.
+
+    Returns
+    -------
+    report : pd.DataFrame
+        Errors of float32 (see errors), one row per quantity.
+    """
+
+    dms    = {dtype : DataManager(verbose = False, dtype = dtype) for dtype in ("float64", "float32")}
+    first  = dms["float64"].index[0].to_pydatetime()
+    last   = dms["float64"].index[-1].to_pydatetime()
+    rows   = []
+
+    # Panels
+    for column in ("returns", "prices", "volume"):
+        rows.append(errors("data:" + column, dms["float64"].data[column], dms["float32"].data[column]))
+
+    # Indicators
+    rules = {dtype : MarketBenchmark(dm) for dtype, dm in dms.items()}
+    for method in ("computeMomentum", "computeSD", "computeVaR", "computeSTD"):
+        reference, value = [getattr(rules[dtype], method)(ndays, first, last) for dtype in ("float64", "float32")]
+        rows.append(errors("indicator:" + method, reference, value))
+
+    # Simulations (same random numbers in both dtypes)
+    symbol = dms["float64"].averageVolume().idxmax()
+    paths  = []
+    for dtype, dm in dms.items():
+        np.random.seed(seed)
+        paths.append(sim.simulate(dm.data["prices"][symbol], ndays + 1, trials, 'log', dtype = dm.dtype))
+    rows.append(errors("simulation:" + symbol, paths[0], paths[1]))
+
+    # Backtests
+    (reference, ledgers), (value, ledgers32) = [backtest(dms[dtype], ndays, start, end, fees)
+                                                 for dtype in ("float64", "float32")]
+    for name in reference.columns:
+        row = errors("equity:" + name, reference[name], value[name])
+        a, b = ledgers[list(reference.columns).index(name)], ledgers32[list(reference.columns).index(name)]
+        row["same_ledger"] = len(a) == len(b) and (a.TR_POS.values == b.TR_POS.values).all()
+        rows.append(row)
+
+    report = pd.DataFrame(rows).set_index("quantity")
+    report.attrs["memory"] = {dtype : sum(x.memory_usage(deep = True).sum() for x in dm.data.values()) / 2**20
+                              for dtype, dm in dms.items()}
+    return report
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Errors of the float32 compute mode against float64.")
+    parser.add_argument("--ndays",  type = int,   default = 14,           help = "Window of the indicators")
+    parser.add_argument("--start",  type = str,   default = "2021-01-01", help = "Start of the backtests")
+    parser.add_argument("--end",    type = str,   default = "2021-05-28", help = "End of the backtests")
+    parser.add_argument("--trials", type = int,   default = 1000,         help = "Monte Carlo trials")
+    parser.add_argument("--fees",   type = float, default = 0.01,         help = "Broker fees")
+    parser.add_argument("--seed",   type = int,   default = 0,            help = "Seed of the simulations")
+    args = parser.parse_args()
+
+    report = precisionReport(args.ndays, date.fromisoformat(args.start), date.fromisoformat(args.end),
+                             args.trials, args.fees, args.seed)
+
+    with pd.option_context("display.width", 200, "display.max_columns", 10, "display.float_format", "{:.3e}".format):
+        print(report)
+    print("[-] Memory of the data (MB):", {k : round(v, 1) for k, v in report.attrs["memory"].items()})
\ No newline at end of file
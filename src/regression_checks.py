@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Wed Jun 30 18:05:12 2021
+
+Regression checks of the backtesting engine on a small synthetic market. Every
+check computes the same result in two ways which must agree (ex: with 1 and
+with N workers), so that an optimization cannot silently change the results.
+The script exits with code 1 if a check fails.
+
+Usage (from the src folder):
+    python regression_checks.py
+    python regression_checks.py --only workers
+
+@author: Antho
+"""
+
+import argparse
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from btengine.backtestengine import BacktestEngine
+from btengine.checkpoint import Checkpointer
+from btengine.datamanager import DataManager
+from btengine.execution import ExecutionRules
+from btengine.portfolio import optimalWeights, rollingMoments
+from btengine.profiler import Profiler
+from btengine.resultcache import ResultCache
+from btengine.simulationfunctions import block_bootstrap, bootstrap_indices, master_seed, unit_seed
+from btengine.synthetic import generateMarket
+from market_benchmark import MarketBenchmark
+from most_traded_benchmark import MostTraded
+from strategy_example import Momentum
+
+
+def differentLedgers(a, b):
+    """Number of ledgers which differ between two lists of ledgers."""
+    if len(a) != len(b):
+        return max(len(a), len(b))
+    return sum(not x.reset_index(drop = True).equals(y.reset_index(drop = True)) for x, y in zip(a, b))
+
+
+def syntheticData(folder, symbols = 30, bars = 400, seed = 0, ohlc = False):
+    """DataManager of a synthetic market generated in folder."""
+    quotes_file, returns_folder = generateMarket(folder, symbols, bars, "1D", seed = seed)
+    return DataManager(quotes_file, returns_folder = returns_folder, verbose = False, ohlc = ohlc)
+
+
+def period(data_manager, bars = 120):
+    """Start and end dates of a backtest over the last bars of the data."""
+    index = data_manager.index
+    return index[max(len(index) - bars, 0)].to_pydatetime(), index[-1].to_pydatetime()
+
+
+def runEngine(data_manager, strategies, end = None, checkpoint = None, **kwargs):
+    """Engine with the strategies (list of functions of the data manager),
+    rebalanced over the period of the data (until end if given)."""
+    be = BacktestEngine(capital = 800, broker_fees = 0.01, folder = tempfile.gettempdir() + "/", **kwargs)
+    for strategy in strategies:
+        be.addSelectionRules(strategy(data_manager))
+    start, last = period(data_manager)
+    be.rebalance(start, end if end is not None else last, showstate = False, checkpoint = checkpoint)
+
+    # Comparisons of runs without any transaction would always agree
+    for rules, transactions in zip(be.selectionRules, be.transactions):
+        if len(transactions) == 0:
+            raise ValueError("[-] " + rules.name + " made no transaction on the synthetic market.")
+    return be
+
+
+def checkWorkers(data_manager):
+    """Forecast bands computed with 1 and with 2 workers, from the same seed."""
+    results = []
+    for method in ("gbm", "stationary"):
+        bands = []
+        for workers in (1, 2):
+            be = runEngine(data_manager, [MostTraded])
+            be.computeReturns(*period(data_manager), plot = False, save = False)
+            bands.append(be.forward_backtesting(days_to_forecast = 10, simulation_trials = 200, method = method,
+                                                seed = 7, chunk_size = 50, workers = workers))
+        difference = np.nanmax(np.abs(bands[0].to_numpy(dtype = float) - bands[1].to_numpy(dtype = float)))
+        results.append(("workers:" + method, bands[0].shape == bands[1].shape and difference == 0, difference))
+    return results
+
+
+def checkBootstrap(data_manager, days = 10, iterations = 230, chunk_size = 50, seed = 7):
+    """Bootstrapped paths of the given ranks of portfolios, against all the
+    paths of the portfolios, ranked on their final growth."""
+    returns = data_manager.data["returns"].to_numpy(dtype = float)[-200:, :6]
+    weights = np.random.default_rng(seed).random((6, 3))
+    ranks   = (20, iterations // 2, iterations - 20)
+    
+    results = []
+    for method in ("stationary", "circular"):
+        mean, paths = block_bootstrap(returns, days, iterations, ranks, 5, method, seed, chunk_size, weights = weights)
+        
+        # Every path of every chunk, from the seeds of the chunks
+        complete = []
+        for k, first in enumerate(range(0, iterations, chunk_size)):
+            rng     = np.random.default_rng(unit_seed(master_seed(seed), k))
+            indices = bootstrap_indices(rng, len(returns), days, min(chunk_size, iterations - first), 5, method)
+            complete.append(np.cumprod(1 + returns[indices], axis = 0) @ weights)
+        complete = np.concatenate(complete, axis = 1)
+        order    = np.argsort(complete[-1], axis = 0, kind = "stable")
+        
+        expected   = [complete[:, order[rank], np.arange(weights.shape[1])] for rank in ranks]
+        difference = max(np.abs(mean - complete.mean(axis = 1)).max(),
+                         max(np.abs(x - y).max() for x, y in zip(paths, expected)))
+        results.append(("bootstrap:" + method, difference <= 1e-9, difference))
+    return results
+
+
+def momentum(data_manager):
+    """Momentum strategy, computed on the data (nothing precalculated)."""
+    return Momentum(data_manager, momentum_days = 14, max_stocks = 10, name = "Momentum", precalculated_folder = None)
+
+
+def checkExecution(data_manager):
+    """Track records without execution rules and with fills at the closes."""
+    returns = []
+    for execution in (None, ExecutionRules(fill = "close")):
+        be = runEngine(data_manager, [momentum, MostTraded], execution = execution)
+        returns.append(be.computeReturns(*period(data_manager), plot = False, save = False))
+    difference = np.nanmax(np.abs(returns[0].to_numpy(dtype = float) - returns[1].to_numpy(dtype = float)))
+    return [("execution:close", returns[0].shape == returns[1].shape and difference <= 1e-9, difference)]
+
+
+def checkCache(data_manager, folder):
+    """Ledgers and track records of a run without cache, and of a rerun 
+    loaded from the cache."""
+    cache = ResultCache(folder + "/cache/")
+    runs  = []
+    
+    # Without cache, then stored in the cache, then loaded from it
+    for cached in (None, cache, cache):
+        profiler = Profiler()
+        be       = runEngine(data_manager, [momentum, MostTraded], cache = cached, profiler = profiler)
+        returns  = be.computeReturns(*period(data_manager), plot = False, save = False)
+        runs.append((be.transactions, returns, profiler.report().counters))
+
+    hits       = runs[2][2].get("cache:hit:ledger", 0)
+    different  = differentLedgers(runs[0][0], runs[2][0])
+    difference = np.nanmax(np.abs(runs[0][1].to_numpy(dtype = float) - runs[2][1].to_numpy(dtype = float)))
+    return [("cache:hits", hits == 2, hits),
+            ("cache:ledgers", different == 0, different),
+            ("cache:returns", runs[0][1].shape == runs[2][1].shape and difference <= 1e-9, difference)]
+
+
+def referenceWeights(covariance, mean, risk_aversion, long_only):
+    """Weights maximizing w'mean - risk_aversion / 2 w'Σw (fully invested),
+    solved by scipy (SLSQP)."""
+    from scipy.optimize import minimize
+    
+    n      = len(mean)
+    scale  = np.trace(covariance) / n
+    result = minimize(lambda w: (risk_aversion / 2 * w @ covariance @ w - w @ mean) / scale, np.full(n, 1 / n),
+                      jac = lambda w: (risk_aversion * covariance @ w - mean) / scale, method = "SLSQP",
+                      bounds = [(0, None)] * n if long_only else None,
+                      constraints = [{"type" : "eq", "fun" : lambda w: w.sum() - 1, "jac" : lambda w: np.ones(n)}],
+                      options = {"ftol" : 1e-15, "maxiter" : 1000})
+    return result.x
+
+
+def checkPortfolio(data_manager, window = 60, risk_aversion = 5.0):
+    """Minimum variance and mean-variance weights of rolling windows of 
+    returns, against the weights found by scipy."""
+    # The 8 first symbols listed, from the bar where they are all listed (the
+    # covariances of symbols not listed yet are singular)
+    returns          = data_manager.data["returns"].to_numpy(dtype = float)
+    listing          = np.argmax(returns != 0, axis = 0)
+    symbols          = np.argsort(listing, kind = "stable")[:8]
+    returns          = returns[listing[symbols].max():, symbols]
+    starts           = np.arange(window, len(returns), window)
+    mean, covariance = rollingMoments(returns, starts, window)
+    
+    results = []
+    for method in ("min_variance", "mean_variance"):
+        for long_only in (True, False):
+            weights    = optimalWeights(covariance, mean, method, risk_aversion, long_only)
+            targets    = np.zeros_like(mean) if method == "min_variance" else mean
+            reference  = np.array([referenceWeights(c, m, risk_aversion, long_only) for c, m in zip(covariance, targets)])
+            difference = np.abs(weights - reference).max()
+            results.append(("portfolio:" + method + (":long_only" if long_only else ""), difference <= 1e-5, difference))
+    return results
+
+
+def checkCheckpoint(data_manager, folder):
+    """Ledgers of an uninterrupted rebalancing, and of a rebalancing 
+    interrupted halfway then resumed from its checkpoints."""
+    strategies = [momentum, MostTraded, lambda x: MarketBenchmark(x, rebalance_days = 20)]
+    start, end = period(data_manager)
+    middle     = data_manager.index[data_manager.barIndex(start) + 50].to_pydatetime()
+    checkpoint = Checkpointer(folder + "/checkpoint.pkl", every = 7)
+    
+    complete   = runEngine(data_manager, strategies)
+    runEngine(data_manager, strategies, end = middle, checkpoint = checkpoint)
+    frames     = len(checkpoint.read()[1])
+    resumed    = runEngine(data_manager, strategies, checkpoint = checkpoint)
+    
+    different  = differentLedgers(complete.transactions, resumed.transactions)
+    
+    # Checkpoints written every 7 dates and on the last one, with the profiler
+    # counting the ledger operations or not
+    dates      = list(data_manager.rebalanceDates(start, middle))
+    expected   = [pd.Timestamp(x) for n, x in enumerate(dates) if (n + 1) % 7 == 0 or n == len(dates) - 1]
+    written    = []
+    for enabled in (False, True):
+        profiled = Checkpointer(folder + "/profiled_" + str(enabled) + ".pkl", every = 7)
+        runEngine(data_manager, strategies, end = middle, checkpoint = profiled, profiler = Profiler(enabled = enabled))
+        written.append([x["date"] for x in profiled.read()[1]])
+    missing    = sum(len(set(expected) - set(x)) for x in written)
+    
+    return [("checkpoint:resumed", frames > 0, frames),
+            ("checkpoint:ledgers", different == 0, different),
+            ("checkpoint:profiled", missing == 0 and written[0] == written[1] == expected, missing)]
+
+
+# Checks, by name: function of the folder of the synthetic market
+CHECKS = {"workers"    : lambda folder: checkWorkers(syntheticData(folder)),
+          "bootstrap"  : lambda folder: checkBootstrap(syntheticData(folder)),
+          "execution"  : lambda folder: checkExecution(syntheticData(folder, ohlc = True)),
+          "cache"      : lambda folder: checkCache(syntheticData(folder), folder),
+          "portfolio"  : lambda folder: checkPortfolio(syntheticData(folder)),
+          "checkpoint" : lambda folder: checkCheckpoint(syntheticData(folder), folder)}
+
+
+def runChecks(names):
+    """
+    Runs checks on a synthetic market.
+
+    Returns
+    -------
+    results : list
+        Name, success and measure (difference, number of cache hits...) of 
+        every comparison.
+    """
+
+    results = []
+    for name in names:
+        folder = tempfile.mkdtemp()
+        try:
+            results += CHECKS[name](folder)
+        finally:
+            shutil.rmtree(folder, ignore_errors = True)
+    return results
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description = "Regression checks of the backtesting engine on synthetic data.")
+    parser.add_argument("--only", nargs = "+", choices = list(CHECKS), default = list(CHECKS), help = "Checks to run")
+    args = parser.parse_args()
+
+    results = runChecks(args.only)
+
+    print("%-35s %8s %12s" % ("Check", "Result", "Measure"))
+    for name, passed, measure in results:
+        print("%-35s %8s %12.3g" % (name, "OK" if passed else "FAILED", measure))
+
+    if not all(x[1] for x in results):
+        sys.exit(1)
@@ -7,6 +7,9 @@ Created on Sun May 30 00:17:28 2021
 
 from btengine.backtestengine import BacktestEngine
 from btengine.selectionrules import SelectionRules
+from btengine.my_utils import toTimestamp
+from btengine.framebuffer import FrameBuffer
+from btengine.financefunctions import rolling_momentum
 import pandas as pd
 from datetime import timedelta, date
 import os
@@ -14,36 +17,62 @@ from btengine.datamanager import DataManager
 
 class Momentum(SelectionRules):
 
-    def __init__(self, dm, momentum_days = 90, max_stocks = 8, name = "Momentum-90D"):
+    def __init__(self, dm, momentum_days = 90, max_stocks = 8, name = "Momentum-90D", 
+                 precalculated_folder = "../data/precalculated/"):
         super().__init__(dm)
         self.name       = name
         self.md         = momentum_days
         self.max_stocks = max_stocks
+        self.buffer     = None
         
-        # Loading precomputed data
-        if os.path.isfile("../data/precalculated/momentum_" + str(momentum_days) + ".pkl"):
-            self.momentums = pd.read_pickle("../data/precalculated/momentum_" + str(momentum_days) + ".pkl")
+        # Loading precomputed data (always computed if there is no folder), 
+        # computed over all the dates of the data
+        first, last = dm.index[0].to_pydatetime(), dm.index[-1].to_pydatetime()
+        if precalculated_folder is None:
+            self.momentums  = self.computeMomentum(momentum_days, first, last)
+        elif os.path.isfile(precalculated_folder + "momentum_" + str(momentum_days) + ".pkl"):
+            self.momentums = pd.read_pickle(precalculated_folder + "momentum_" + str(momentum_days) + ".pkl")
         else:
-            self.momentums  = self.computeMomentum(momentum_days)
-            self.momentums.to_pickle("../data/precalculated/momentum_" + str(momentum_days) + ".pkl")
+            self.momentums  = self.computeMomentum(momentum_days, first, last)
+            self.momentums.to_pickle(precalculated_folder + "momentum_" + str(momentum_days) + ".pkl")
+        
+        
+    def update(self, index):
+        
+        # Momentums of the new bars, computed on the last momentum_days bars only
+        returns   = self.data_manager.data["returns"]
+        momentums = (1 + returns.iloc[-(self.md + len(index) - 1):].astype(float)).cumprod()
+        momentums = rolling_momentum(momentums, self.md, self.data_manager.bars_per_year, 
+                                     dtype = self.data_manager.dtype).iloc[-len(index):]
+        if len(self.momentums.index) > 0:
+            momentums = momentums[momentums.index > self.momentums.index[-1]]
+        
+        if self.buffer is None:
+            self.buffer = FrameBuffer(self.momentums, dtype = self.data_manager.dtype)
+        self.buffer.addColumns(momentums.columns)
+        self.buffer.append(momentums.index, momentums.reindex(columns = self.buffer.columns).to_numpy(dtype = float))
+        self.momentums = self.buffer.frame
         
         
     def compute_selection(self, selection_date, transactions):
         
-        # Sums Momentums
-        momentum_scores_daily  = self.momentums[self.momentums.index.date == selection_date - timedelta(1)].dropna(1, how="any")
+        # Sums Momentums (last bar before the selection date with a momentum)
+        i = self.momentums.index.searchsorted(toTimestamp(selection_date)) - 1
+        momentum_scores_daily  = self.momentums.iloc[i:i + 1].dropna(axis=1, how="any") if i >= 0 else self.momentums.iloc[0:0]
 
-        i = 2
-        while (momentum_scores_daily.empty) and (selection_date - timedelta(i) > self.momentums.index[0].date()):
-            momentum_scores_daily  = self.momentums [self.momentums.index.date  == selection_date - timedelta(i)].dropna(1, how="any")
-            i += 1
+        while (momentum_scores_daily.empty) and (i > 1):
+            i -= 1
+            momentum_scores_daily  = self.momentums.iloc[i:i + 1].dropna(axis=1, how="any")
 
         if not momentum_scores_daily.empty:
             
-            investible = self.data_manager.data["returns"][self.data_manager.data["returns"].index.date == selection_date - timedelta(1)].dropna(axis=1, how='all')
+            # Symbols with a price on the last bar before the selection date (none
+            # before the first bar)
+            bar        = self.data_manager.barIndex(selection_date) - 1
+            investible = self.data_manager.universeAt(self.data_manager.index[bar]) if bar >= 0 else []
             
             
-            momentum_scores_daily = momentum_scores_daily[investible.columns.to_list()].dropna(1)
+            momentum_scores_daily = momentum_scores_daily[[x for x in investible if x in momentum_scores_daily.columns]].dropna(axis=1)
             momentum_scores_daily = momentum_scores_daily.loc[:, momentum_scores_daily.ge(0.001).all()].T
 
             momentum_scores_daily["f1"] = momentum_scores_daily[momentum_scores_daily.columns[0]]
@@ -84,7 +113,7 @@ class Momentum(SelectionRules):
             open_positions     = SelectionRules.getOpenPositions(transactions)
             
             for index, row in open_positions.iterrows():
-                if momentum_scores_daily[momentum_scores_daily.index == row["symbol"]].empty and row["symbol"] in investible.columns.to_list():                    
+                if momentum_scores_daily[momentum_scores_daily.index == row["symbol"]].empty and row["symbol"] in investible:                    
                     transactions   = SelectionRules.closePosition(transactions, row.TR_POS, selection_date)
                 
                 